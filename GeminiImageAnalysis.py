@@ -1,16 +1,96 @@
 # Generating a UI with gradio
 import gradio as gr
 from dotenv import load_dotenv
-from google.genai import Client
+from google.genai import Client, types
+from concurrent.futures import ThreadPoolExecutor, as_completed
+import asyncio
+import csv
+import io
+import json
 import os
+import tempfile
+import threading
+import time
+
+from image_preprocessing import prepare_image
 
 load_dotenv()
 GOOGLE_API_KEY = os.getenv('GOOGLE_API_KEY')
 
-def genai_response(my_file, user_input, api_key=None):
+GEMINI_MODEL = 'gemini-2.0-flash'
+
+# Batch mode: images analyzed at once, and where result files are written
+BATCH_WORKERS = int(os.getenv('GEMINI_BATCH_WORKERS', '8'))
+BATCH_OUTPUT_DIR = os.getenv('GEMINI_BATCH_OUTPUT_DIR', tempfile.gettempdir())
+BATCH_PREVIEW_ROWS = 20
+BATCH_UPDATE_SECONDS = 0.5
+
+# Gradio queue: events handled at once per handler, and how many may wait before new ones are rejected
+CONCURRENCY_LIMIT = int(os.getenv('GRADIO_CONCURRENCY_LIMIT', '16'))
+BATCH_CONCURRENCY_LIMIT = int(os.getenv('GRADIO_BATCH_CONCURRENCY_LIMIT', '2'))
+MAX_QUEUE_SIZE = int(os.getenv('GRADIO_MAX_QUEUE_SIZE', '64'))
+
+# Files uploaded to the Gemini Files API are deleted server-side after 48 hours;
+# stop reusing a handle a little before that
+FILE_TTL_SECONDS = 48 * 3600
+EXPIRY_MARGIN_SECONDS = 10 * 60
+
+_clients = {}        # api key -> Client, so follow-up questions reuse one connection pool
+_uploads = {}        # (api key, prepared image sha256) -> (uploaded file, reuse-until timestamp)
+_cache_lock = threading.Lock()
+
+def get_client(api_key):
+    """Return a Client per API key, created once"""
+    with _cache_lock:
+        client = _clients.get(api_key)
+        if client is None:
+            client = Client(api_key=api_key)
+            _clients[api_key] = client
+        return client
+
+def _expires_at(uploaded_file):
+    """When the server will delete the file, from its metadata or the default TTL"""
+    expiration = getattr(uploaded_file, 'expiration_time', None)
+    if expiration is not None:
+        return expiration.timestamp()
+    return time.time() + FILE_TTL_SECONDS
+
+def get_uploaded_file(client, api_key, prepared):
+    """Upload the prepared image once per content hash and reuse the handle until it expires"""
+    key = (api_key, prepared.digest)
+    now = time.time()
+    with _cache_lock:
+        cached = _uploads.get(key)
+        if cached is not None and cached[1] > now:
+            return cached[0]
+
+    uploaded_file = client.files.upload(file=io.BytesIO(prepared.data),
+                                        config={'mime_type': prepared.mime_type})
+    with _cache_lock:
+        # Drop expired handles while we're here so the cache doesn't grow forever
+        for stale in [k for k, (_, until) in _uploads.items() if until <= now]:
+            del _uploads[stale]
+        _uploads[key] = (uploaded_file, _expires_at(uploaded_file) - EXPIRY_MARGIN_SECONDS)
+    return uploaded_file
+
+def image_part(client, api_key, path):
+    """Small images go inline with the request; larger ones are uploaded once and referenced"""
+    prepared = prepare_image(path)
+    if prepared.inline:
+        return types.Part.from_bytes(data=prepared.data, mime_type=prepared.mime_type)
+    return get_uploaded_file(client, api_key, prepared)
+
+def analyze_image(client, api_key, path, question):
+    image = image_part(client, api_key, path)
+    response = client.models.generate_content(model=GEMINI_MODEL, contents=[image, question])
+    return response.text
+
+async def genai_response(my_file, user_input, api_key=None):
+    """Stream the answer to a question about one image, yielding the text so far"""
     # Handle quit conditions
     if user_input and user_input.lower() in ['quit', 'q', 'exit']:
-        return "# GoodBye..."
+        yield "# GoodBye..."
+        return
     
     # Use provided API key or default to environment variable
     if not api_key or api_key.strip() == "":
@@ -18,35 +98,151 @@ def genai_response(my_file, user_input, api_key=None):
     
     # Basic validation
     if not api_key:
-        return "**Error:** Please provide a valid Google API key."
+        yield "**Error:** Please provide a valid Google API key."
+        return
     
     if not my_file:
-        return "**Error:** Please upload an image file."
+        yield "**Error:** Please upload an image file."
+        return
     
     if not user_input or user_input.strip() == "":
-        return "**Error:** Please enter a question about the image."
+        yield "**Error:** Please enter a question about the image."
+        return
     
+    text = ""
     try:
-        client = Client(api_key=api_key)
-        uploaded_file = client.files.upload(file=my_file)
-        response = client.models.generate_content(
-            model='gemini-2.0-flash',
-            contents=[uploaded_file, user_input]
-        )
-        return response.text
+        client = get_client(api_key)
+        # Preprocessing is CPU-bound and the upload is a blocking call; keep both off the event loop
+        image = await asyncio.to_thread(image_part, client, api_key, my_file)
+        stream = await client.aio.models.generate_content_stream(model=GEMINI_MODEL, contents=[image, user_input])
+        async for chunk in stream:
+            if chunk.text:
+                text += chunk.text
+                yield text
+        if not text:
+            yield "_The model returned no text._"
     
     except Exception as e:
-        return f"**Error:** {str(e)}"
-
-view = gr.Interface(
-    fn=genai_response,
-    inputs=[
-        gr.Image(label="Upload an image...", type="filepath"),
-        gr.Textbox(label="User Query", placeholder="Ask something about the image..."),
-        gr.Textbox(label="API Key (optional)", placeholder="Leave empty to use default", type="password")
-    ],
-    outputs=gr.Markdown(label="AI Response"),
-    title="🖼️ Gemini Image Analysis",
-    description="Upload an image and ask questions about it using Google's Gemini AI.",
-    theme=gr.themes.Soft()
-).launch(share=True, debug=True)
\ No newline at end of file
+        yield (text + "\n\n" if text else "") + f"**Error:** {str(e)}"
+
+def _analyze_row(client, api_key, path, question):
+    """One batch result row; failures are recorded rather than stopping the batch"""
+    start = time.perf_counter()
+    try:
+        text, status = analyze_image(client, api_key, path, question), 'ok'
+    except Exception as e:
+        text, status = str(e), 'error'
+    return {'image': path, 'status': status, 'response': text,
+            'seconds': round(time.perf_counter() - start, 2)}
+
+def _row_writer(f, output_format):
+    """Write one row per call and flush, so partial results survive an interrupted batch"""
+    if output_format == 'csv':
+        writer = csv.DictWriter(f, fieldnames=['image', 'status', 'response', 'seconds'])
+        writer.writeheader()
+        write = writer.writerow
+    else:
+        write = lambda row: f.write(json.dumps(row, ensure_ascii=False) + "\n")
+
+    def write_row(row):
+        write(row)
+        f.flush()
+    return write_row
+
+def _batch_markdown(rows, total, errors, finished):
+    state = "Done" if finished else "Running"
+    lines = [f"**{state}:** {len(rows)}/{total} images, {errors} errors", "",
+             "| Image | Status | Response |", "|---|---|---|"]
+    for row in rows[-BATCH_PREVIEW_ROWS:]:
+        response = row['response'].replace("\n", " ").replace("|", "\\|")
+        if len(response) > 200:
+            response = response[:200] + "..."
+        lines.append(f"| {os.path.basename(row['image'])} | {row['status']} | {response} |")
+    if len(rows) > BATCH_PREVIEW_ROWS:
+        lines.append(f"\n_Showing the latest {BATCH_PREVIEW_ROWS} results; all of them are in the output file._")
+    return "\n".join(lines)
+
+def batch_response(files, user_input, api_key=None, output_format='jsonl'):
+    """Analyze many uploaded images with one question, streaming (markdown, output file) as results arrive
+
+    Only uploads are accepted: the app is shared publicly and may run on the
+    server's API key, so it must never read paths chosen by a visitor.
+    """
+    if not api_key or api_key.strip() == "":
+        api_key = GOOGLE_API_KEY
+    if not api_key:
+        yield "**Error:** Please provide a valid Google API key.", None
+        return
+    if not user_input or user_input.strip() == "":
+        yield "**Error:** Please enter a question about the images.", None
+        return
+    paths = list(files or [])
+    if not paths:
+        yield "**Error:** Please upload one or more images.", None
+        return
+
+    client = get_client(api_key)
+    output_path = os.path.join(BATCH_OUTPUT_DIR, f"gemini-batch-{time.strftime('%Y%m%d-%H%M%S')}.{output_format}")
+    rows, errors = [], 0
+    last_update = 0.0
+    pool = ThreadPoolExecutor(max_workers=BATCH_WORKERS)
+    try:
+        with open(output_path, 'w', newline='', encoding='utf-8') as f:
+            write_row = _row_writer(f, output_format)
+            futures = [pool.submit(_analyze_row, client, api_key, path, user_input) for path in paths]
+            for future in as_completed(futures):
+                row = future.result()
+                write_row(row)
+                rows.append(row)
+                errors += row['status'] != 'ok'
+                # Re-rendering the table on every row would swamp the browser on large batches
+                now = time.monotonic()
+                if now - last_update >= BATCH_UPDATE_SECONDS:
+                    last_update = now
+                    yield _batch_markdown(rows, len(paths), errors, False), output_path
+        yield _batch_markdown(rows, len(paths), errors, True), output_path
+    finally:
+        # Stopping the event in the UI closes this generator; don't keep calling the API
+        pool.shutdown(wait=False, cancel_futures=True)
+
+def build_app(concurrency_limit=CONCURRENCY_LIMIT, batch_concurrency_limit=BATCH_CONCURRENCY_LIMIT,
+              max_queue_size=MAX_QUEUE_SIZE):
+    """Build the tabbed Gradio app with its queue configured; call .launch() on the result"""
+    view = gr.Interface(
+        fn=genai_response,
+        inputs=[
+            gr.Image(label="Upload an image...", type="filepath"),
+            gr.Textbox(label="User Query", placeholder="Ask something about the image..."),
+            gr.Textbox(label="API Key (optional)", placeholder="Leave empty to use default", type="password")
+        ],
+        outputs=gr.Markdown(label="AI Response"),
+        title="🖼️ Gemini Image Analysis",
+        description="Upload an image and ask questions about it using Google's Gemini AI.",
+        concurrency_limit=concurrency_limit,
+    )
+
+    # Each batch already fans out to BATCH_WORKERS threads, so few batches run at once
+    batch_view = gr.Interface(
+        fn=batch_response,
+        inputs=[
+            gr.File(label="Upload images...", file_count="multiple", file_types=["image"], type="filepath"),
+            gr.Textbox(label="User Query", placeholder="Ask the same question about every image..."),
+            gr.Textbox(label="API Key (optional)", placeholder="Leave empty to use default", type="password"),
+            gr.Radio(["jsonl", "csv"], value="jsonl", label="Output format")
+        ],
+        outputs=[gr.Markdown(label="Results"), gr.File(label="Results file")],
+        title="🗂️ Batch Image Analysis",
+        description=f"Ask one question about many images; up to {BATCH_WORKERS} are analyzed at a time.",
+        concurrency_limit=batch_concurrency_limit,
+    )
+
+    app = gr.TabbedInterface(
+        [view, batch_view],
+        ["Single image", "Batch"],
+        title="🖼️ Gemini Image Analysis",
+        theme=gr.themes.Soft()
+    )
+    return app.queue(default_concurrency_limit=concurrency_limit, max_size=max_queue_size)
+
+if __name__ == "__main__":
+    build_app().launch(share=True, debug=True)
@@ -0,0 +1,159 @@
+import logging
+import os
+import random
+import threading
+import time
+from dataclasses import dataclass, asdict
+from typing import Dict, List, Optional, Sequence
+
+from metrics import CallMetrics, add_hook
+
+'''
+Cost- and latency-aware provider selection.
+
+HealthTable keeps an exponentially weighted moving average (EWMA) of each
+provider's latency, time to first token, generation speed and error rate.
+It is fed by a metrics hook on every successful call and by the router on
+every failed attempt. AdaptiveSelector uses it to order a router's providers
+per request:
+
+- providers whose window is too small for the prompt go last;
+- providers predicted to answer within the latency SLO come first, cheapest first;
+- providers without fresh measurements come next, so they get probed;
+- providers predicted to miss the SLO come last, fastest first.
+'''
+
+logger = logging.getLogger(__name__)
+
+@dataclass
+class ProviderHealth:
+    '''Rolling measurements for one provider'''
+    latency: Optional[float] = None        # seconds per successful call
+    ttft: Optional[float] = None           # seconds to first streamed token
+    sec_per_token: Optional[float] = None  # generation seconds per completion token (streams)
+    error_rate: float = 0.0                # share of recent attempts that failed
+    samples: int = 0
+    updated_at: float = 0.0                # time.monotonic() of the last update
+
+    def predicted_latency(self, output_tokens: int) -> Optional[float]:
+        """Expected seconds for a reply of output_tokens, allowing for retries"""
+        if self.ttft is not None and self.sec_per_token is not None:
+            base = self.ttft + output_tokens * self.sec_per_token
+        else:
+            base = self.latency
+        if base is None:
+            return None
+        # A failed attempt costs roughly one more call
+        return base / (1.0 - min(self.error_rate, 0.9))
+
+class HealthTable:
+    """EWMA health per provider name, shared by every router in the process"""
+
+    def __init__(self, alpha: float = 0.2):
+        self.alpha = alpha
+        self._health: Dict[str, ProviderHealth] = {}
+        self._lock = threading.Lock()
+
+    def _ewma(self, old: Optional[float], new: float) -> float:
+        return new if old is None else old + self.alpha * (new - old)
+
+    def observe(self, metrics: CallMetrics) -> None:
+        """Metrics hook: fold one successful call into the provider's averages"""
+        # Cache hits and coalesced waits say nothing about the provider; failures arrive via record_failure
+        if metrics.cache_hit or metrics.coalesced or metrics.error:
+            return
+        with self._lock:
+            health = self._health.setdefault(metrics.provider, ProviderHealth())
+            health.latency = self._ewma(health.latency, metrics.latency)
+            if metrics.ttft is not None:
+                health.ttft = self._ewma(health.ttft, metrics.ttft)
+                if metrics.completion_tokens:
+                    generation = max(metrics.latency - metrics.ttft, 0.0)
+                    health.sec_per_token = self._ewma(health.sec_per_token, generation / metrics.completion_tokens)
+            health.error_rate = self._ewma(health.error_rate, 0.0)
+            health.samples += 1
+            health.updated_at = time.monotonic()
+
+    def record_failure(self, provider: str) -> None:
+        """Count one failed attempt against the provider"""
+        with self._lock:
+            health = self._health.setdefault(provider, ProviderHealth())
+            health.error_rate = self._ewma(health.error_rate, 1.0)
+            health.updated_at = time.monotonic()
+
+    def get(self, provider: str) -> Optional[ProviderHealth]:
+        with self._lock:
+            health = self._health.get(provider)
+            return ProviderHealth(**asdict(health)) if health is not None else None
+
+    def snapshot(self) -> Dict[str, Dict]:
+        with self._lock:
+            return {name: asdict(health) for name, health in self._health.items()}
+
+_table = HealthTable()
+add_hook(_table.observe)
+
+def health_table() -> HealthTable:
+    """The process-wide table every router reports to"""
+    return _table
+
+@dataclass
+class SelectionPolicy:
+    '''What AdaptiveSelector optimizes for'''
+    latency_slo: float = float(os.getenv('ROUTER_LATENCY_SLO', '5.0'))  # seconds per reply
+    expected_output_tokens: int = 512   # reply length assumed for latency and cost estimates
+    reserve_tokens: int = 1024          # window left free for the reply
+    min_samples: int = 3                # measurements needed before a prediction is trusted
+    stale_after: float = 600.0          # seconds before old measurements stop counting
+    explore: float = 0.05               # chance of probing an unmeasured provider first
+
+class AdaptiveSelector:
+    """Orders a router's providers per request from observed latency, errors and price"""
+
+    def __init__(self, policy: Optional[SelectionPolicy] = None, table: Optional[HealthTable] = None):
+        self.policy = policy or SelectionPolicy()
+        self.table = table or _table
+
+    def cost(self, config, prompt_tokens: int) -> float:
+        """Estimated USD for one request; unpriced providers count as free"""
+        input_price = getattr(config, 'input_cost_per_mtok', None) or 0.0
+        output_price = getattr(config, 'output_cost_per_mtok', None) or 0.0
+        return (prompt_tokens * input_price + self.policy.expected_output_tokens * output_price) / 1_000_000
+
+    def _prediction(self, config) -> Optional[float]:
+        health = self.table.get(config.name)
+        if health is None or health.samples < self.policy.min_samples:
+            return None
+        if time.monotonic() - health.updated_at > self.policy.stale_after:
+            return None
+        return health.predicted_latency(self.policy.expected_output_tokens)
+
+    def __call__(self, configs: Sequence, prompt_tokens: int) -> List:
+        policy = self.policy
+        needed = prompt_tokens + policy.reserve_tokens
+        fits = [c for c in configs if getattr(c, 'max_context_tokens', needed) >= needed]
+        # Kept as a last resort, largest window first
+        too_small = sorted((c for c in configs if c not in fits),
+                           key=lambda c: getattr(c, 'max_context_tokens', 0), reverse=True)
+
+        meeting, unknown, slow = [], [], []
+        for config in fits:
+            predicted = self._prediction(config)
+            if predicted is None:
+                unknown.append(config)
+            elif predicted <= policy.latency_slo:
+                meeting.append((self.cost(config, prompt_tokens), predicted, config))
+            else:
+                slow.append((predicted, self.cost(config, prompt_tokens), config))
+
+        meeting.sort(key=lambda item: item[:2])
+        slow.sort(key=lambda item: item[:2])
+        ordered = [c for *_, c in meeting] + unknown + [c for *_, c in slow]
+        # Occasionally try an unmeasured provider first so the table tracks providers that recover
+        if unknown and meeting and random.random() < policy.explore:
+            probe = random.choice(unknown)
+            ordered.remove(probe)
+            ordered.insert(0, probe)
+        ordered += too_small
+        logger.debug(f"Provider order for ~{prompt_tokens} prompt tokens: {[c.name for c in ordered]}")
+        return ordered
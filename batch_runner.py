@@ -0,0 +1,141 @@
+import argparse
+import asyncio
+import json
+import logging
+import os
+import time
+from typing import Dict, Iterator, List, Optional, Set
+
+from dotenv import load_dotenv
+
+from client_registry import run_and_close
+from mainV02 import AsyncAIModelManager, ModelConfig, configured_fallbacks
+
+'''
+Batch completions over a JSONL prompt file.
+
+Each input line is {"id": ..., "prompt": "..."} or {"id": ..., "messages": [...]}.
+Prompts are read lazily, run with bounded concurrency on one event loop, and
+each result is appended to the output JSONL as soon as it finishes. Re-running
+with the same output file skips every id that already has a successful
+result, so a crashed run resumes where it stopped.
+
+    python batch_runner.py prompts.jsonl results.jsonl --model 5 --concurrency 16
+'''
+
+logger = logging.getLogger(__name__)
+
+def completed_ids(output_path: str) -> Set[str]:
+    """Ids that already have a successful result in the output file"""
+    done = set()
+    if not os.path.exists(output_path):
+        return done
+    with open(output_path, encoding='utf-8') as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                # A crash can leave a half-written last line; that id simply runs again
+                continue
+            if record.get('error') is None and 'id' in record:
+                done.add(str(record['id']))
+    return done
+
+def iter_prompts(input_path: str, skip: Set[str], system_prompt: Optional[str] = None) -> Iterator[Dict]:
+    """Stream (id, messages) records from the input file, skipping finished ids"""
+    with open(input_path, encoding='utf-8') as f:
+        for line_no, line in enumerate(f, 1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError as e:
+                logger.error(f"Skipping line {line_no}: invalid JSON ({e})")
+                continue
+            record_id = str(record.get('id', line_no))
+            if record_id in skip:
+                continue
+            messages = record.get('messages')
+            if messages is None:
+                messages = [{'role': 'user', 'content': record.get('prompt', '')}]
+                if system_prompt:
+                    messages.insert(0, {'role': 'system', 'content': system_prompt})
+            yield {'id': record_id, 'messages': messages}
+
+async def _run_one(manager: AsyncAIModelManager, record: Dict) -> Dict:
+    start = time.perf_counter()
+    try:
+        response = await manager.complete(record['messages'])
+        error = None
+    except Exception as e:
+        response, error = None, str(e)
+    return {
+        'id': record['id'],
+        'model': manager.config.model_name,
+        'response': response,
+        'error': error,
+        'latency': round(time.perf_counter() - start, 3),
+    }
+
+async def run_batch(input_path: str, output_path: str, config: ModelConfig,
+                    concurrency: int = 8, system_prompt: Optional[str] = None,
+                    fallbacks: Optional[List[ModelConfig]] = None) -> Dict[str, int]:
+    """Run every pending prompt and append results; returns run counters"""
+    if concurrency < 1:
+        raise ValueError(f"concurrency must be at least 1, got {concurrency}")
+    skip = completed_ids(output_path)
+    if skip:
+        logger.info(f"Resuming: {len(skip)} ids already completed")
+    manager = AsyncAIModelManager(config, fallbacks=fallbacks)
+    stats = {'skipped': len(skip), 'completed': 0, 'failed': 0}
+    start = time.perf_counter()
+    pending: Set[asyncio.Task] = set()
+
+    with open(output_path, 'a', encoding='utf-8') as out:
+        def write(tasks) -> None:
+            for task in tasks:
+                result = task.result()
+                out.write(json.dumps(result, ensure_ascii=False) + '\n')
+                stats['failed' if result['error'] else 'completed'] += 1
+            out.flush()
+            total = stats['completed'] + stats['failed']
+            if total and total % 100 == 0:
+                logger.info(f"{total} done, {total / (time.perf_counter() - start):.1f} prompts/s")
+
+        for record in iter_prompts(input_path, skip, system_prompt):
+            # Keep at most `concurrency` requests in flight and never read further ahead
+            if len(pending) >= concurrency:
+                finished, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                write(finished)
+            pending.add(asyncio.create_task(_run_one(manager, record)))
+        if pending:
+            finished, _ = await asyncio.wait(pending)
+            write(finished)
+
+    elapsed = time.perf_counter() - start
+    logger.info(f"Batch finished in {elapsed:.1f}s: {stats}")
+    return stats
+
+def main():
+    """Command line entry point for batch mode"""
+    parser = argparse.ArgumentParser(description="Run a JSONL file of prompts through a model")
+    parser.add_argument("input", help="JSONL file with id and prompt/messages per line")
+    parser.add_argument("output", help="JSONL file results are appended to (also used to resume)")
+    parser.add_argument("--model", default='1', choices=list(AsyncAIModelManager.MODELS),
+                        help="Model key from the menu")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--system", default=None, help="System prompt for plain 'prompt' records")
+    parser.add_argument("--no-failover", action="store_true", help="Only use the selected model")
+    args = parser.parse_args()
+    if args.concurrency < 1:
+        parser.error("--concurrency must be at least 1")
+
+    load_dotenv()
+    config = AsyncAIModelManager.MODELS[args.model]
+    fallbacks = None if args.no_failover else configured_fallbacks(config)
+    stats = asyncio.run(run_and_close(run_batch(args.input, args.output, config, args.concurrency, args.system, fallbacks)))
+    print(json.dumps(stats))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,250 @@
+import argparse
+import asyncio
+import json
+import logging
+import os
+import resource
+import statistics
+import threading
+import time
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Callable, Dict, List, Optional
+
+from client_registry import pool_stats, run_and_close
+from mainV02 import AIModelManager, AsyncAIModelManager, ModelConfig
+from mock_openai_server import MockServer, MockSettings
+
+'''
+Offline benchmark of the client side against mock_openai_server.
+
+Drives AIModelManager (blocking and streaming), AsyncAIModelManager, the
+notebook-style main.OpenAIConfig and the Streamlit reply handler under
+concurrent load, and reports throughput, p50/p95/p99 latency, time to first
+token, peak Python memory and connection reuse. No API keys needed.
+
+    python benchmark.py --requests 200 --concurrency 16 --error-rate 0.05
+'''
+
+logger = logging.getLogger(__name__)
+
+MOCK_KEY_ENV = 'MOCK_API_KEY'
+
+@dataclass
+class ScenarioResult:
+    '''Latency samples and counters for one benchmark scenario'''
+    name: str
+    latencies: List[float] = field(default_factory=list)
+    ttfts: List[float] = field(default_factory=list)
+    errors: int = 0
+    elapsed: float = 0.0
+    peak_memory_kb: Optional[float] = None
+    _lock: threading.Lock = field(default_factory=threading.Lock, repr=False, compare=False)
+
+    def record(self, latency: float, ttft: Optional[float] = None) -> None:
+        """Add one successful request; safe to call from worker threads"""
+        with self._lock:
+            self.latencies.append(latency)
+            if ttft is not None:
+                self.ttfts.append(ttft)
+
+    def fail(self) -> None:
+        with self._lock:
+            self.errors += 1
+
+    @staticmethod
+    def _percentile(samples: List[float], pct: float) -> Optional[float]:
+        if not samples:
+            return None
+        if len(samples) == 1:
+            return samples[0]
+        return statistics.quantiles(samples, n=100, method='inclusive')[pct - 1]
+
+    def summary(self) -> Dict:
+        count = len(self.latencies)
+        return {
+            'scenario': self.name,
+            'requests': count,
+            'errors': self.errors,
+            'throughput_rps': round(count / self.elapsed, 2) if self.elapsed else None,
+            'p50_ms': self._ms(self._percentile(self.latencies, 50)),
+            'p95_ms': self._ms(self._percentile(self.latencies, 95)),
+            'p99_ms': self._ms(self._percentile(self.latencies, 99)),
+            'ttft_p50_ms': self._ms(self._percentile(self.ttfts, 50)),
+            'peak_memory_kb': round(self.peak_memory_kb, 1) if self.peak_memory_kb is not None else None,
+        }
+
+    @staticmethod
+    def _ms(value: Optional[float]) -> Optional[float]:
+        return round(value * 1000, 1) if value is not None else None
+
+# Set from --no-memory; the memory pass runs every scenario a second time
+MEASURE_MEMORY = True
+
+def _measure(name: str, run: Callable[[ScenarioResult], None]) -> ScenarioResult:
+    """Time run() on its own, then repeat it under tracemalloc for peak memory
+
+    tracemalloc slows every allocation down, so it never wraps the timed pass.
+    """
+    result = ScenarioResult(name)
+    start = time.perf_counter()
+    try:
+        run(result)
+    finally:
+        result.elapsed = time.perf_counter() - start
+    if MEASURE_MEMORY:
+        tracemalloc.start()
+        try:
+            run(ScenarioResult(name))
+        finally:
+            result.peak_memory_kb = tracemalloc.get_traced_memory()[1] / 1024
+            tracemalloc.stop()
+    return result
+
+def _threaded(result: ScenarioResult, requests: int, concurrency: int, call: Callable[[int], Optional[float]]) -> None:
+    """Run call(i) requests times on a thread pool; call returns its TTFT or None"""
+    def one(i: int) -> None:
+        start = time.perf_counter()
+        try:
+            ttft = call(i)
+        except Exception as e:
+            logger.debug(f"Request {i} failed: {e}")
+            result.fail()
+            return
+        result.record(time.perf_counter() - start, ttft)
+
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(one, range(requests)))
+
+def scenario_manager(config: ModelConfig, requests: int, concurrency: int, turns: int) -> ScenarioResult:
+    """One AIModelManager per conversation, blocking get_response"""
+    def call(i: int) -> None:
+        manager = AIModelManager(config)
+        manager.context = [{'role': 'system', 'content': "You are a benchmark assistant."}]
+        for turn in range(turns):
+            manager.get_response(f"Question {i}.{turn}")
+    return _measure('manager.get_response', lambda r: _threaded(r, requests, concurrency, call))
+
+def scenario_manager_stream(config: ModelConfig, requests: int, concurrency: int, turns: int) -> ScenarioResult:
+    """One AIModelManager per conversation, streaming; records time to first token"""
+    def call(i: int) -> float:
+        manager = AIModelManager(config)
+        manager.context = [{'role': 'system', 'content': "You are a benchmark assistant."}]
+        ttft = None
+        for turn in range(turns):
+            start = time.perf_counter()
+            for _ in manager.stream_response(f"Question {i}.{turn}"):
+                if ttft is None:
+                    ttft = time.perf_counter() - start
+        return ttft
+    return _measure('manager.stream_response', lambda r: _threaded(r, requests, concurrency, call))
+
+def scenario_async(config: ModelConfig, requests: int, concurrency: int, turns: int) -> ScenarioResult:
+    """AsyncAIModelManager sessions on one event loop"""
+    async def run_all(result: ScenarioResult) -> None:
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def one(i: int) -> None:
+            async with semaphore:
+                start = time.perf_counter()
+                try:
+                    manager = AsyncAIModelManager(config)
+                    manager.context = [{'role': 'system', 'content': "You are a benchmark assistant."}]
+                    for turn in range(turns):
+                        await manager.get_response(f"Question {i}.{turn}")
+                except Exception as e:
+                    logger.debug(f"Request {i} failed: {e}")
+                    result.fail()
+                    return
+                result.record(time.perf_counter() - start)
+
+        await asyncio.gather(*(one(i) for i in range(requests)))
+    return _measure('async_manager.get_response', lambda r: asyncio.run(run_and_close(run_all(r))))
+
+def scenario_openai_config(config: ModelConfig, requests: int, concurrency: int, turns: int) -> ScenarioResult:
+    """The notebook-style main.OpenAIConfig path"""
+    from main import OpenAIConfig
+
+    def call(i: int) -> None:
+        model = OpenAIConfig(os.environ[MOCK_KEY_ENV], config.model_name, config.base_url)
+        client = model.Model()
+        for turn in range(turns):
+            model.context.append({'role': 'user', 'content': f"Question {i}.{turn}"})
+            model.context.append({'role': 'assistant', 'content': model.Response(model.context, client)})
+    return _measure('main.OpenAIConfig.Response', lambda r: _threaded(r, requests, concurrency, call))
+
+def scenario_streamlit_handler(config: ModelConfig, requests: int, concurrency: int, turns: int) -> Optional[ScenarioResult]:
+    """streamlit_app.stream_reply with a no-op renderer; skipped without streamlit"""
+    try:
+        from streamlit_app import stream_reply
+    except ImportError:
+        logger.warning("streamlit is not installed, skipping the Streamlit handler scenario")
+        return None
+
+    def call(i: int) -> float:
+        manager = AIModelManager(config)
+        manager.context = [{'role': 'system', 'content': "You are a benchmark assistant."}]
+        first = []
+        start = time.perf_counter()
+        for turn in range(turns):
+            stream_reply(manager, f"Question {i}.{turn}",
+                         lambda text: first or first.append(time.perf_counter() - start))
+        return first[0] if first else None
+    return _measure('streamlit_app.stream_reply', lambda r: _threaded(r, requests, concurrency, call))
+
+SCENARIOS = {
+    'manager': scenario_manager,
+    'stream': scenario_manager_stream,
+    'async': scenario_async,
+    'openai_config': scenario_openai_config,
+    'streamlit': scenario_streamlit_handler,
+}
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the chat clients against a local mock API")
+    parser.add_argument("--requests", type=int, default=100, help="Conversations per scenario")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--turns", type=int, default=3, help="Turns per conversation (exercises context handling)")
+    parser.add_argument("--ttft", type=float, default=0.05)
+    parser.add_argument("--tokens-per-sec", type=float, default=1000.0)
+    parser.add_argument("--response-tokens", type=int, default=32)
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of requests answered with 429")
+    parser.add_argument("--scenarios", nargs="+", default=list(SCENARIOS), choices=list(SCENARIOS))
+    parser.add_argument("--json", action="store_true", help="Print results as JSON lines")
+    parser.add_argument("--no-memory", action="store_true", help="Skip the second, tracemalloc-instrumented pass")
+    args = parser.parse_args()
+
+    global MEASURE_MEMORY
+    MEASURE_MEMORY = not args.no_memory
+
+    settings = MockSettings(args.ttft, args.tokens_per_sec, args.response_tokens, args.error_rate)
+    os.environ.setdefault(MOCK_KEY_ENV, 'mock-key')
+    with MockServer(settings) as server:
+        config = ModelConfig(name="Mock", api_key_env=MOCK_KEY_ENV, model_name="mock-model",
+                             base_url=server.base_url)
+        results = []
+        for name in args.scenarios:
+            result = SCENARIOS[name](config, args.requests, args.concurrency, args.turns)
+            if result is not None:
+                results.append(result.summary())
+
+    max_rss_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    if args.json:
+        for summary in results:
+            print(json.dumps(summary))
+        print(json.dumps({'pool': pool_stats(), 'max_rss_mb': round(max_rss_mb, 1)}))
+        return
+
+    columns = ['scenario', 'requests', 'errors', 'throughput_rps', 'p50_ms', 'p95_ms', 'p99_ms',
+               'ttft_p50_ms', 'peak_memory_kb']
+    print(" | ".join(f"{c:>14}" if c != 'scenario' else f"{c:<28}" for c in columns))
+    for summary in results:
+        print(" | ".join(f"{str(summary[c]):>14}" if c != 'scenario' else f"{summary[c]:<28}" for c in columns))
+    print(f"\nConnection pool: {pool_stats()}")
+    print(f"Max RSS: {max_rss_mb:.1f} MB")
+
+if __name__ == "__main__":
+    # Per-request INFO logs would dominate the timings
+    logging.getLogger().setLevel(logging.WARNING)
+    main()
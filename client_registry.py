@@ -0,0 +1,215 @@
+import asyncio
+import logging
+import threading
+import weakref
+from dataclasses import dataclass, asdict
+from typing import TYPE_CHECKING, Dict, Optional, Tuple
+
+# The SDKs are imported when the first client is built, so importing this
+# module (e.g. on the Streamlit welcome page) stays cheap
+if TYPE_CHECKING:
+    import httpx
+    from openai import AsyncOpenAI, OpenAI
+
+'''
+Process-wide registry of OpenAI-compatible clients.
+
+Every AIModelManager for the same provider (same base_url and api_key) gets
+the same client, and therefore the same keep-alive connection pool, instead
+of paying DNS + TCP + TLS setup again on every "Start Chat".
+'''
+
+logger = logging.getLogger(__name__)
+
+@dataclass
+class PoolSettings:
+    '''Tunable keep-alive pool settings for the shared httpx clients'''
+    max_connections: int = 100
+    max_keepalive_connections: int = 20
+    keepalive_expiry: float = 60.0
+    timeout: float = 60.0
+    connect_timeout: float = 10.0
+    http2: bool = False
+
+    def limits(self) -> 'httpx.Limits':
+        import httpx
+        return httpx.Limits(
+            max_connections=self.max_connections,
+            max_keepalive_connections=self.max_keepalive_connections,
+            keepalive_expiry=self.keepalive_expiry,
+        )
+
+    def timeouts(self) -> 'httpx.Timeout':
+        import httpx
+        return httpx.Timeout(self.timeout, connect=self.connect_timeout)
+
+@dataclass
+class PoolStats:
+    '''Counters for client reuse and connection reuse'''
+    client_hits: int = 0        # a manager got an already-built client
+    clients_created: int = 0    # a new client (and pool) had to be built
+    requests: int = 0           # HTTP requests sent through shared pools
+    new_connections: int = 0    # TCP connections actually opened
+    tls_handshakes: int = 0     # TLS handshakes actually performed
+
+    @property
+    def reused_connections(self) -> int:
+        return max(self.requests - self.new_connections, 0)
+
+class ClientRegistry:
+    """Caches one sync and one async client per (base_url, api_key)"""
+
+    def __init__(self, settings: PoolSettings = None):
+        self.settings = settings or PoolSettings()
+        self._clients: Dict[Tuple[str, str], 'OpenAI'] = {}
+        # Async pools are bound to the loop that uses them, so keep one set per loop
+        self._async_clients: 'weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, Dict[Tuple[str, str], AsyncOpenAI]]' = weakref.WeakKeyDictionary()
+        self._no_loop_clients: Dict[Tuple[str, str], 'AsyncOpenAI'] = {}
+        self._lock = threading.Lock()
+        self._stats = PoolStats()
+
+    def configure(self, settings: PoolSettings) -> None:
+        """Apply new pool settings; existing clients are closed and rebuilt lazily"""
+        self.close()
+        self.settings = settings
+
+    @staticmethod
+    def _key(base_url: str, api_key: str) -> Tuple[str, str]:
+        return (base_url.rstrip('/'), api_key)
+
+    # httpcore reports connection lifecycle through the "trace" request
+    # extension; we attach it from a request hook so every request is counted.
+    def _count(self, event: str) -> None:
+        with self._lock:
+            if event == "connection.connect_tcp.complete":
+                self._stats.new_connections += 1
+            elif event == "connection.start_tls.complete":
+                self._stats.tls_handshakes += 1
+
+    def _on_request(self, request: 'httpx.Request') -> None:
+        with self._lock:
+            self._stats.requests += 1
+        request.extensions["trace"] = lambda event, info: self._count(event)
+
+    async def _on_async_request(self, request: 'httpx.Request') -> None:
+        with self._lock:
+            self._stats.requests += 1
+
+        async def trace(event, info):
+            self._count(event)
+        request.extensions["trace"] = trace
+
+    def get_client(self, base_url: str, api_key: str) -> 'OpenAI':
+        """Return the shared sync client for a provider, creating it once"""
+        import httpx
+        from openai import OpenAI
+
+        key = self._key(base_url, api_key)
+        with self._lock:
+            client = self._clients.get(key)
+            if client is not None:
+                self._stats.client_hits += 1
+                return client
+            http_client = httpx.Client(
+                limits=self.settings.limits(),
+                timeout=self.settings.timeouts(),
+                http2=self.settings.http2,
+                event_hooks={'request': [self._on_request]},
+            )
+            client = OpenAI(api_key=api_key, base_url=base_url, http_client=http_client)
+            self._clients[key] = client
+            self._stats.clients_created += 1
+            logger.info(f"Created pooled client for {key[0]}")
+            return client
+
+    @staticmethod
+    def _running_loop() -> Optional[asyncio.AbstractEventLoop]:
+        try:
+            return asyncio.get_running_loop()
+        except RuntimeError:
+            return None
+
+    def get_async_client(self, base_url: str, api_key: str) -> 'AsyncOpenAI':
+        """Return the shared async client for a provider on the running loop"""
+        import httpx
+        from openai import AsyncOpenAI
+
+        key = self._key(base_url, api_key)
+        loop = self._running_loop()
+        with self._lock:
+            if loop is None:
+                clients = self._no_loop_clients
+            else:
+                clients = self._async_clients.setdefault(loop, {})
+            client = clients.get(key)
+            if client is not None:
+                self._stats.client_hits += 1
+                return client
+            http_client = httpx.AsyncClient(
+                limits=self.settings.limits(),
+                timeout=self.settings.timeouts(),
+                http2=self.settings.http2,
+                event_hooks={'request': [self._on_async_request]},
+            )
+            client = AsyncOpenAI(api_key=api_key, base_url=base_url, http_client=http_client)
+            clients[key] = client
+            self._stats.clients_created += 1
+            logger.info(f"Created pooled async client for {key[0]}")
+            return client
+
+    async def aclose(self) -> None:
+        """Close the running loop's async clients; await this before the loop shuts down"""
+        loop = self._running_loop()
+        with self._lock:
+            clients = self._async_clients.pop(loop, {}) if loop is not None else {}
+        for client in clients.values():
+            try:
+                await client.close()
+            except Exception as e:
+                logger.warning(f"Failed to close async client: {e}")
+
+    def stats(self) -> Dict[str, int]:
+        """Snapshot of the pool counters"""
+        with self._lock:
+            snapshot = asdict(self._stats)
+            snapshot['reused_connections'] = self._stats.reused_connections
+            return snapshot
+
+    def close(self) -> None:
+        """Close every sync client; async clients are only dropped, since closing them needs their loop
+
+        Code that owns an event loop should await aclose_async_clients()
+        (or run its entry point through run_and_close) before the loop ends.
+        """
+        with self._lock:
+            for client in self._clients.values():
+                try:
+                    client.close()
+                except Exception as e:
+                    logger.warning(f"Failed to close client: {e}")
+            self._clients.clear()
+            self._async_clients.clear()
+            self._no_loop_clients.clear()
+
+# Default process-wide registry
+registry = ClientRegistry()
+
+def get_client(base_url: str, api_key: str) -> 'OpenAI':
+    return registry.get_client(base_url, api_key)
+
+def get_async_client(base_url: str, api_key: str) -> 'AsyncOpenAI':
+    return registry.get_async_client(base_url, api_key)
+
+def pool_stats() -> Dict[str, int]:
+    return registry.stats()
+
+async def aclose_async_clients() -> None:
+    """Close the async clients created on the running loop"""
+    await registry.aclose()
+
+async def run_and_close(coro):
+    """Await coro, then close the async clients it opened; wrap asyncio.run() entry points with it"""
+    try:
+        return await coro
+    finally:
+        await registry.aclose()
@@ -0,0 +1,175 @@
+import asyncio
+import logging
+from dataclasses import dataclass
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+
+'''
+Token-budgeted context window for long conversations.
+
+ContextWindow.fit() keeps the leading system prompt, then drops (or, with a
+summarizer, folds into a running summary) the oldest turns until the
+conversation fits the model's budget. Token counts are cached per message,
+so each turn only tokenizes the messages that are new since the last call.
+'''
+
+logger = logging.getLogger(__name__)
+
+# Loaded on first use: tiktoken is optional and its encoding is slow to load
+_ENCODING = None
+_ENCODING_LOADED = False
+
+def _encoding():
+    global _ENCODING, _ENCODING_LOADED
+    if not _ENCODING_LOADED:
+        _ENCODING_LOADED = True
+        try:
+            import tiktoken # Optional: exact-ish BPE counts; falls back to a character heuristic
+            _ENCODING = tiktoken.get_encoding("cl100k_base")
+        except Exception:
+            _ENCODING = None
+    return _ENCODING
+
+SUMMARY_PREFIX = "Summary of the earlier conversation: "
+
+# Per-message framing overhead used by OpenAI-style chat formats
+MESSAGE_OVERHEAD = 4
+
+def count_tokens(text: str) -> int:
+    """Count tokens in text, approximately when tiktoken is not installed"""
+    if not text:
+        return 0
+    encoding = _encoding()
+    if encoding is not None:
+        return len(encoding.encode(text, disallowed_special=()))
+    # Roughly four characters per token for English text
+    return max(1, len(text) // 4)
+
+@dataclass
+class ContextPolicy:
+    '''Budget and trimming rules for a conversation'''
+    max_tokens: int
+    reserve_tokens: int = 1024   # left free for the model's reply
+    keep_recent: int = 2         # newest messages that are never dropped
+    summarize: bool = False      # fold dropped turns into a summary instead of discarding them
+    # Once over budget, trim down to this share of it. Trimming then happens every few turns
+    # instead of every turn, and in between the prompt prefix stays identical for provider caching.
+    trim_ratio: float = 0.75
+
+    @property
+    def budget(self) -> int:
+        return max(self.max_tokens - self.reserve_tokens, 0)
+
+@dataclass
+class _TrimPlan:
+    '''What fit() keeps and drops, before any summary is written'''
+    system: List[Dict[str, str]]
+    summary: Optional[Dict[str, str]]
+    turns: List[Dict[str, str]]
+    dropped: List[Dict[str, str]]
+    total: int
+    to_summarize: Optional[List[Dict[str, str]]]   # None when dropped turns are discarded
+
+class ContextWindow:
+    """Fits a message list to a ContextPolicy with incremental token counts"""
+
+    def __init__(self, policy: ContextPolicy, summarizer: Optional[Callable[[List[Dict[str, str]]], str]] = None):
+        self.policy = policy
+        self.summarizer = summarizer
+        # id(message) -> (message, content it was counted with, tokens)
+        self._counts: Dict[int, Tuple[dict, str, int]] = {}
+
+    def message_tokens(self, message: Dict[str, str]) -> int:
+        """Token count for one message, reusing the cached count when unchanged"""
+        content = message.get('content') or ''
+        cached = self._counts.get(id(message))
+        if cached is not None and cached[0] is message and cached[1] is content:
+            return cached[2]
+        tokens = count_tokens(content) + MESSAGE_OVERHEAD
+        self._counts[id(message)] = (message, content, tokens)
+        return tokens
+
+    def total_tokens(self, messages: List[Dict[str, str]]) -> int:
+        return sum(self.message_tokens(m) for m in messages)
+
+    def fit(self, messages: List[Dict[str, str]]) -> List[Dict[str, str]]:
+        """Return messages trimmed to the budget; the input list is returned as-is when it fits"""
+        plan = self._plan(messages)
+        if plan is None:
+            return messages
+        text = None
+        if plan.to_summarize is not None:
+            try:
+                text = self.summarizer(plan.to_summarize)
+            except Exception as e:
+                logger.warning(f"Summarizing old turns failed, dropping them instead: {e}")
+        return self._assemble(plan, text)
+
+    async def afit(self, messages: List[Dict[str, str]],
+                   summarizer: Optional[Callable[[List[Dict[str, str]]], Awaitable[str]]] = None) -> List[Dict[str, str]]:
+        """fit() for async callers; summarizer is a coroutine function used instead of self.summarizer"""
+        plan = self._plan(messages)
+        if plan is None:
+            return messages
+        text = None
+        if plan.to_summarize is not None:
+            try:
+                text = await summarizer(plan.to_summarize) if summarizer is not None \
+                    else await asyncio.to_thread(self.summarizer, plan.to_summarize)
+            except Exception as e:
+                logger.warning(f"Summarizing old turns failed, dropping them instead: {e}")
+        return self._assemble(plan, text)
+
+    def _plan(self, messages: List[Dict[str, str]]) -> Optional[_TrimPlan]:
+        """Decide what to drop; None when messages already fit"""
+        total = self.total_tokens(messages)
+        if total <= self.policy.budget:
+            self._forget_missing(messages)
+            return None
+
+        head = 0
+        while head < len(messages) and messages[head].get('role') == 'system' \
+                and not self._is_summary(messages[head]):
+            head += 1
+        system = messages[:head]
+        summary = messages[head] if head < len(messages) and self._is_summary(messages[head]) else None
+        turns = messages[head + (1 if summary else 0):]
+
+        dropped = []
+        protected = min(self.policy.keep_recent, len(turns))
+        target = int(self.policy.budget * self.policy.trim_ratio)
+        while total > target and len(turns) > protected:
+            message = turns.pop(0)
+            dropped.append(message)
+            total -= self.message_tokens(message)
+        # Never start the kept history on an assistant reply
+        while len(turns) > protected and turns[0].get('role') == 'assistant':
+            message = turns.pop(0)
+            dropped.append(message)
+            total -= self.message_tokens(message)
+
+        to_summarize = None
+        if dropped and self.policy.summarize and self.summarizer is not None:
+            to_summarize = ([summary] if summary is not None else []) + dropped
+        return _TrimPlan(system, summary, turns, dropped, total, to_summarize)
+
+    def _assemble(self, plan: _TrimPlan, summary_text: Optional[str]) -> List[Dict[str, str]]:
+        summary = plan.summary
+        if summary_text is not None:
+            summary = {'role': 'system', 'content': SUMMARY_PREFIX + summary_text}
+        elif plan.to_summarize is None and summary is not None and plan.total > self.policy.budget:
+            summary = None
+
+        fitted = plan.system + ([summary] if summary is not None else []) + plan.turns
+        logger.info(f"Context trimmed: dropped {len(plan.dropped)} messages, ~{self.total_tokens(fitted)} tokens kept")
+        self._forget_missing(fitted)
+        return fitted
+
+    @staticmethod
+    def _is_summary(message: Dict[str, str]) -> bool:
+        return message.get('role') == 'system' and (message.get('content') or '').startswith(SUMMARY_PREFIX)
+
+    def _forget_missing(self, messages: List[Dict[str, str]]) -> None:
+        """Drop cached counts for messages that are no longer in the conversation"""
+        if len(self._counts) > 2 * len(messages) + 16:
+            live = {id(m) for m in messages}
+            self._counts = {k: v for k, v in self._counts.items() if k in live}
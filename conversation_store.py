@@ -0,0 +1,153 @@
+import logging
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from typing import Dict, List, Optional
+
+'''
+Persistent conversation store on SQLite (WAL mode).
+
+Every turn is one appended row, so saving a message costs one small insert
+instead of rewriting the conversation. Managers write each turn as it
+happens and read back only the recent turns they need, which lets a session
+resume after a process restart without keeping the full history in memory.
+Clearing a chat moves the session's start marker forward; rows are never
+updated or deleted.
+'''
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS sessions (
+    id TEXT PRIMARY KEY,
+    model TEXT,
+    start_seq INTEGER NOT NULL DEFAULT 0,
+    next_seq INTEGER NOT NULL DEFAULT 0,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS turns (
+    session_id TEXT NOT NULL,
+    seq INTEGER NOT NULL,
+    role TEXT NOT NULL,
+    content TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    PRIMARY KEY (session_id, seq)
+);
+"""
+
+class ConversationStore:
+    """Append-only per-turn storage of conversations"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._local = threading.local()
+        conn = self._conn()
+        conn.executescript(SCHEMA)
+
+    def _conn(self) -> sqlite3.Connection:
+        # One connection per thread; Streamlit serves each browser session on its own thread
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def create_session(self, model: Optional[str] = None, session_id: Optional[str] = None) -> str:
+        """Create a session (or keep an existing one with this id) and return its id"""
+        session_id = session_id or uuid.uuid4().hex
+        now = time.time()
+        self._conn().execute(
+            "INSERT OR IGNORE INTO sessions (id, model, created_at, updated_at) VALUES (?, ?, ?, ?)",
+            (session_id, model, now, now),
+        )
+        return session_id
+
+    def session(self, session_id: str) -> Optional[Dict]:
+        row = self._conn().execute(
+            "SELECT id, model, start_seq, next_seq, created_at, updated_at FROM sessions WHERE id = ?",
+            (session_id,),
+        ).fetchone()
+        if row is None:
+            return None
+        keys = ('id', 'model', 'start_seq', 'next_seq', 'created_at', 'updated_at')
+        return dict(zip(keys, row))
+
+    def append(self, session_id: str, role: str, content: str) -> int:
+        """Append one turn and return its sequence number"""
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute("SELECT next_seq FROM sessions WHERE id = ?", (session_id,)).fetchone()
+            if row is None:
+                raise KeyError(f"Unknown conversation session {session_id}")
+            seq = row[0]
+            now = time.time()
+            conn.execute(
+                "INSERT INTO turns (session_id, seq, role, content, created_at) VALUES (?, ?, ?, ?, ?)",
+                (session_id, seq, role, content or '', now),
+            )
+            conn.execute("UPDATE sessions SET next_seq = ?, updated_at = ? WHERE id = ?", (seq + 1, now, session_id))
+            conn.execute("COMMIT")
+            return seq
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    def reset(self, session_id: str) -> None:
+        """Start the conversation over; earlier turns stay on disk but are no longer loaded"""
+        self._conn().execute(
+            "UPDATE sessions SET start_seq = next_seq, updated_at = ? WHERE id = ?", (time.time(), session_id))
+
+    def count(self, session_id: str, role: Optional[str] = None) -> int:
+        """Number of active turns, optionally of one role"""
+        query = ("SELECT COUNT(*) FROM turns t JOIN sessions s ON s.id = t.session_id "
+                 "WHERE t.session_id = ? AND t.seq >= s.start_seq")
+        params: tuple = (session_id,)
+        if role:
+            query += " AND t.role = ?"
+            params += (role,)
+        return self._conn().execute(query, params).fetchone()[0]
+
+    def recent(self, session_id: str, limit: int = 50, before_seq: Optional[int] = None,
+               roles: tuple = ('user', 'assistant')) -> List[Dict]:
+        """The newest active turns in chronological order, for lazy page-by-page display"""
+        placeholders = ",".join("?" * len(roles))
+        query = (f"SELECT t.seq, t.role, t.content FROM turns t JOIN sessions s ON s.id = t.session_id "
+                 f"WHERE t.session_id = ? AND t.seq >= s.start_seq AND t.role IN ({placeholders})")
+        params: tuple = (session_id, *roles)
+        if before_seq is not None:
+            query += " AND t.seq < ?"
+            params += (before_seq,)
+        query += " ORDER BY t.seq DESC LIMIT ?"
+        params += (limit,)
+        rows = self._conn().execute(query, params).fetchall()
+        return [{'seq': seq, 'role': role, 'content': content} for seq, role, content in reversed(rows)]
+
+    def load_context(self, session_id: str, recent: int = 200) -> List[Dict[str, str]]:
+        """Context to resume a session: the system prompt plus the most recent turns"""
+        system = self.recent(session_id, limit=1, roles=('system',))
+        # The system prompt is written first, so the newest system row is the active prompt
+        turns = self.recent(session_id, limit=recent)
+        return [{'role': m['role'], 'content': m['content']} for m in system + turns]
+
+    def list_sessions(self, limit: int = 20) -> List[Dict]:
+        rows = self._conn().execute(
+            "SELECT id, model, updated_at FROM sessions ORDER BY updated_at DESC LIMIT ?", (limit,)
+        ).fetchall()
+        return [{'id': sid, 'model': model, 'updated_at': updated} for sid, model, updated in rows]
+
+_default_store: Optional[ConversationStore] = None
+_default_lock = threading.Lock()
+
+def default_store() -> ConversationStore:
+    """Process-wide store at CONVERSATION_DB (default conversations.db)"""
+    global _default_store
+    with _default_lock:
+        if _default_store is None:
+            _default_store = ConversationStore(os.getenv('CONVERSATION_DB', 'conversations.db'))
+        return _default_store
@@ -0,0 +1,121 @@
+import argparse
+import asyncio
+import logging
+import time
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Sequence
+
+from dotenv import load_dotenv
+
+from client_registry import run_and_close
+from mainV02 import AsyncAIModelManager, ModelConfig
+
+'''
+Send the same conversation to several models at once.
+
+fan_out() waits for every model and returns each answer with its latency,
+for side-by-side evaluation in max(latency) instead of sum(latency).
+race() returns the first successful answer and cancels the slower calls,
+e.g. Groq vs Cerebras for latency-sensitive traffic.
+'''
+
+logger = logging.getLogger(__name__)
+
+@dataclass
+class FanOutResult:
+    '''Outcome of one model's completion in a fan-out'''
+    model: str
+    content: Optional[str] = None
+    latency: float = 0.0
+    error: Optional[str] = None
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None
+
+async def _run_one(config: ModelConfig, messages: List[Dict[str, str]]) -> FanOutResult:
+    start = time.perf_counter()
+    try:
+        manager = AsyncAIModelManager(config)
+        content = await manager.complete(messages)
+        return FanOutResult(config.name, content, time.perf_counter() - start)
+    except asyncio.CancelledError:
+        raise
+    except Exception as e:
+        logger.error(f"{config.name} failed in fan-out: {e}")
+        return FanOutResult(config.name, None, time.perf_counter() - start, str(e))
+
+async def afan_out(configs: Sequence[ModelConfig], messages: List[Dict[str, str]],
+                   timeout: Optional[float] = None) -> List[FanOutResult]:
+    """Query every model concurrently and return all results in config order"""
+    tasks = [asyncio.create_task(_run_one(config, messages)) for config in configs]
+    done, pending = await asyncio.wait(tasks, timeout=timeout)
+    for task in pending:
+        task.cancel()
+    results = []
+    for config, task in zip(configs, tasks):
+        if task in done:
+            results.append(task.result())
+        else:
+            results.append(FanOutResult(config.name, None, timeout or 0.0, "Timed out"))
+    return results
+
+async def arace(configs: Sequence[ModelConfig], messages: List[Dict[str, str]],
+                timeout: Optional[float] = None) -> FanOutResult:
+    """Return the first successful result and cancel the rest
+
+    If every model fails, the last failure is returned.
+    """
+    tasks = {asyncio.create_task(_run_one(config, messages)) for config in configs}
+    last = FanOutResult("none", None, 0.0, "No models given")
+    deadline = time.monotonic() + timeout if timeout else None
+    try:
+        while tasks:
+            remaining = deadline - time.monotonic() if deadline else None
+            if remaining is not None and remaining <= 0:
+                return FanOutResult("none", None, timeout, "Timed out")
+            done, tasks = await asyncio.wait(tasks, timeout=remaining, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                result = task.result()
+                if result.ok:
+                    return result
+                last = result
+        return last
+    finally:
+        for task in tasks:
+            task.cancel()
+
+def fan_out(configs: Sequence[ModelConfig], messages: List[Dict[str, str]],
+            timeout: Optional[float] = None) -> List[FanOutResult]:
+    """Blocking wrapper around afan_out"""
+    return asyncio.run(run_and_close(afan_out(configs, messages, timeout)))
+
+def race(configs: Sequence[ModelConfig], messages: List[Dict[str, str]],
+         timeout: Optional[float] = None) -> FanOutResult:
+    """Blocking wrapper around arace"""
+    return asyncio.run(run_and_close(arace(configs, messages, timeout)))
+
+def main():
+    """Ask several models the same question from the command line"""
+    parser = argparse.ArgumentParser(description="Send one prompt to several models concurrently")
+    parser.add_argument("prompt")
+    parser.add_argument("--models", nargs="+", default=list(AsyncAIModelManager.MODELS),
+                        help="Model keys from the menu (default: all)")
+    parser.add_argument("--race", action="store_true", help="Return only the fastest successful answer")
+    parser.add_argument("--timeout", type=float, default=None)
+    args = parser.parse_args()
+
+    load_dotenv()
+    configs = [AsyncAIModelManager.MODELS[key] for key in args.models]
+    messages = [{'role': 'user', 'content': args.prompt}]
+
+    if args.race:
+        results = [race(configs, messages, args.timeout)]
+    else:
+        results = fan_out(configs, messages, args.timeout)
+    for result in results:
+        print(f"\n=== {result.model} ({result.latency:.2f}s) ===")
+        print(result.content if result.ok else f"Error: {result.error}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,129 @@
+import hashlib
+import io
+import logging
+import mimetypes
+import os
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Tuple
+
+'''
+Shrink images before sending them to Gemini.
+
+prepare_image() downsamples to the largest size the model actually uses,
+re-encodes as JPEG (or WebP when there is transparency) at a quality tier,
+and drops EXIF/ICC/text metadata. Results small enough to go inline are
+sent as bytes in the request instead of via a separate Files API upload.
+Pillow is optional; without it the original file is sent unchanged.
+'''
+
+try:
+    from PIL import Image, ImageOps
+except ImportError: # Pillow not installed: images are sent as-is
+    Image = None
+
+logger = logging.getLogger(__name__)
+
+# Gemini scales images down to fit 3072x3072 before tiling, so larger pixels are wasted upload
+MAX_SIDE = 3072
+
+# (max side, JPEG/WebP quality) per detail level
+QUALITY_TIERS = {
+    'high': (MAX_SIDE, 90),
+    'medium': (1536, 80),
+    'low': (768, 70),
+}
+
+# Images at or under this size are sent inline with the request instead of uploaded
+INLINE_MAX_BYTES = int(os.getenv('GEMINI_INLINE_MAX_BYTES', str(1024 * 1024)))
+
+@dataclass
+class PreparedImage:
+    '''Image bytes ready to send, plus what preprocessing did'''
+    data: bytes
+    mime_type: str
+    digest: str              # sha256 of the prepared bytes
+    original_size: int
+    size: Tuple[int, int]    # (width, height) after resizing, (0, 0) when unknown
+
+    @property
+    def inline(self) -> bool:
+        return len(self.data) <= INLINE_MAX_BYTES
+
+# Image.info keys that carry metadata rather than pixels or encoding hints
+_METADATA_KEYS = ('exif', 'xmp', 'XML:com.adobe.xmp', 'icc_profile', 'comment', 'photoshop')
+
+def _has_metadata(image) -> bool:
+    """Whether the file carries EXIF, XMP, ICC, comments or PNG text that re-encoding would strip"""
+    if any(image.info.get(key) for key in _METADATA_KEYS):
+        return True
+    if getattr(image, 'text', None):
+        return True
+    return bool(image.getexif())
+
+def _unchanged(raw: bytes, path: str) -> PreparedImage:
+    mime_type = mimetypes.guess_type(path)[0] or 'application/octet-stream'
+    return PreparedImage(raw, mime_type, hashlib.sha256(raw).hexdigest(), len(raw), (0, 0))
+
+def _encode(raw: bytes, path: str, detail: str) -> PreparedImage:
+    max_side, quality = QUALITY_TIERS[detail]
+    with Image.open(io.BytesIO(raw)) as image:
+        # Decided on the original, before resizing and transposing change both
+        original_fits = max(image.size) <= max_side
+        has_metadata = _has_metadata(image)
+        # Apply the EXIF rotation before the EXIF block is dropped
+        image = ImageOps.exif_transpose(image)
+        image.thumbnail((max_side, max_side), Image.LANCZOS)
+
+        has_alpha = image.mode in ('RGBA', 'LA') or (image.mode == 'P' and 'transparency' in image.info)
+        buffer = io.BytesIO()
+        if has_alpha:
+            image.convert('RGBA').save(buffer, format='WEBP', quality=quality, method=4)
+            mime_type = 'image/webp'
+        else:
+            image.convert('RGB').save(buffer, format='JPEG', quality=quality, optimize=True)
+            mime_type = 'image/jpeg'
+        size = image.size
+
+    data = buffer.getvalue()
+    if len(data) >= len(raw) and original_fits and not has_metadata:
+        # Already small, clean and well compressed; re-encoding would only lose quality
+        return _unchanged(raw, path)
+    logger.info(f"Prepared {os.path.basename(path)}: {len(raw) // 1024} KB -> {len(data) // 1024} KB, {size[0]}x{size[1]}")
+    return PreparedImage(data, mime_type, hashlib.sha256(data).hexdigest(), len(raw), size)
+
+# Recently prepared images by (path, size, mtime, detail), so follow-up questions skip the re-encode
+_prepared: 'OrderedDict[tuple, PreparedImage]' = OrderedDict()
+_PREPARED_MAX_ENTRIES = 32
+_prepared_lock = threading.Lock()
+
+def prepare_image(path: str, detail: str = 'high') -> PreparedImage:
+    """Resize, recompress and strip metadata from the image at path"""
+    if detail not in QUALITY_TIERS:
+        raise ValueError(f"Unknown detail level {detail!r}, expected one of {list(QUALITY_TIERS)}")
+    stat = os.stat(path)
+    key = (path, stat.st_size, stat.st_mtime_ns, detail)
+    with _prepared_lock:
+        prepared = _prepared.get(key)
+        if prepared is not None:
+            _prepared.move_to_end(key)
+            return prepared
+
+    with open(path, 'rb') as f:
+        raw = f.read()
+
+    if Image is None:
+        prepared = _unchanged(raw, path)
+    else:
+        try:
+            prepared = _encode(raw, path, detail)
+        except Exception as e:
+            logger.warning(f"Could not preprocess {path}, sending original: {e}")
+            prepared = _unchanged(raw, path)
+
+    with _prepared_lock:
+        _prepared[key] = prepared
+        while len(_prepared) > _PREPARED_MAX_ENTRIES:
+            _prepared.popitem(last=False)
+    return prepared
@@ -1,7 +1,8 @@
 # Imports 
 import os # for getting environment variable
 from dotenv import load_dotenv # for loading the local .env file environment variables
-from openai import OpenAI # For creating AI model with openai
+from client_registry import get_client # For reusing one pooled client per provider
+from provider_registry import default_registry # For the list of models, loaded from providers.toml
 
 # Creating a basic class for model creation, with openai
 '''
@@ -17,10 +18,8 @@ class OpenAIConfig:
         ]
 
     def Model(self):
-        model = OpenAI(
-            api_key = self.api_key,
-            base_url = self.base_url
-        )
+        # shared client, so repeated calls reuse the same connection pool
+        model = get_client(self.base_url, self.api_key)
         return model
     
     def Response(self, msg, client):
@@ -60,114 +59,33 @@ class OpenAIConfig:
 # Asking user to chose from multiple models
 def choose_model():
     load_dotenv()
-    user_model = input("1. Gemini\n2. Sambanove\n3. Cerebras\n4. Nebius\n5. Groq\n\nModel(select any number: )")
-
-    # '''GEMINI MODEL'''
-    if user_model == '1':
-        # gemini_model = self.Model()
-        gemini_model = OpenAIConfig(
-            os.getenv('GOOGLE_API_KEY'),
-            'gemini-2.0-flash',
-            "https://generativelanguage.googleapis.com/v1beta/openai/",
-        )
-        client = gemini_model.Model()
-        gemini_model.context = gemini_model.set_sys_prompt()
-        print(gemini_model.context)
-        while True:
-            user_input = input("You: ")
-            if user_input.lower() == 'quit':
-                break
-
-            gemini_model.context.append({'role':"user", 'content': user_input})
-            res = gemini_model.Response(gemini_model.context,client)
-            print(f"AI: {res}")
-            gemini_model.context.append({'role':'system', 'content': res})
-
-    # '''SAMBANOVA CLOUD'''
-    elif user_model == '2':
-        sambanova_model = OpenAIConfig(
-            os.getenv('SAMBANOVA_API_KEY'),
-            "Llama-4-Maverick-17B-128E-Instruct",
-            "https://api.sambanova.ai/v1",
-        )
-
-        client = sambanova_model.Model()
-        sambanova_model.context = sambanova_model.set_sys_prompt()
-        print(sambanova_model.context)
-
-        while True:
-            user_input = input("You: ")
-            if user_input.lower() == 'quit':
-                break
-            sambanova_model.context.append({'role':'user', 'content':user_input})
-
-            res = sambanova_model.Response(sambanova_model.context, client)
-            print(f"AI: {res}")
-            sambanova_model.context.append({'role':'system', 'content':res})
-
-    # Cerebras Model
-    elif user_model == '3':
-        cerebras_model = OpenAIConfig(
-            os.getenv('CEREBRAS_API_KEY'),
-            "llama-4-scout-17b-16e-instruct",
-            "https://api.cerebras.ai/v1",
-        )
-
-        client = cerebras_model.Model()
-        cerebras_model.context = cerebras_model.set_sys_prompt()
-        print(cerebras_model.context)
-
-        while True:
-            user_input = input("You: ")
-            if user_input == 'quit':
-                break
-            cerebras_model.context.append({'role':'user', 'content':user_input})
-
-            res = cerebras_model.Response(cerebras_model.context, client)
-            print(f"AI: {res}")
-            cerebras_model.context.append({'role': 'system', 'content': res})
-
-    elif user_model == '4':
-        nebius_model = OpenAIConfig(
-            os.getenv('NEBIUS_API_KEY'),
-            "meta-llama/Meta-Llama-3.1-70B-Instruct",
-            "https://api.studio.nebius.com/v1/",
-        )
-
-        client = nebius_model.Model()
-        nebius_model.context = nebius_model.set_sys_prompt()
-        print(nebius_model.context)
-
-        while True:
-            user_input = input("You: ")
-            if user_input == 'quit':
-                break
-            nebius_model.context.append({'role':'user', 'content':user_input})
-
-            res = nebius_model.Response(nebius_model.context, client)
-            print(f"AI: {res}")
-            nebius_model.context.append({'role': 'system', 'content': res})
-
-    elif user_model == '5':
-        groq_model = OpenAIConfig(
-            os.getenv('GROQ_API_KEY'),
-            "qwen-qwq-32b",
-            "https://api.groq.com/openai/v1",
-        )      
-
-        client = groq_model.Model()
-        groq_model.context = groq_model.set_sys_prompt()
-        print(groq_model.context)
-
-        while True:
-            user_input = input("You: ")
-            if user_input == 'quit':
-                break
-            groq_model.context.append({'role':'user', 'content':user_input})
-
-            res = groq_model.Response(groq_model.context, client)
-            print(f"AI: {res}")
-            groq_model.context.append({'role': 'system', 'content': res})
+    # The model list lives in providers.toml; see provider_registry.py
+    models = default_registry()
+    menu = "\n".join(f"{key}. {config.name}" for key, config in models.items())
+    user_model = input(f"{menu}\n\nModel(select any number: )")
+    config = models.get(user_model.strip())
+    if config is None:
+        print(f"Unknown model '{user_model}'")
+        return
+
+    model = OpenAIConfig(
+        os.getenv(config.api_key_env),
+        config.model_name,
+        config.base_url,
+    )
+    client = model.Model()
+    model.context = model.set_sys_prompt()
+    print(model.context)
+
+    while True:
+        user_input = input("You: ")
+        if user_input.lower() == 'quit':
+            break
+        model.context.append({'role':'user', 'content':user_input})
+
+        res = model.Response(model.context, client)
+        print(f"AI: {res}")
+        model.context.append({'role': 'assistant', 'content': res})
 
 
 if __name__ == '__main__':
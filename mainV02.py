@@ -1,3 +1,5 @@
+import asyncio # Purpose: Run many conversations concurrently on a single event loop.
+from collections import deque # Purpose: Bounded history of per-call metrics.
 import os # Purpose: Interact with the operating system, access environment variables, file paths, etc.
 import logging # Purpose: Track events, errors, and debug information in applications.
 '''
@@ -7,7 +9,8 @@ Track application behavior and errors
 Debug issues in production
 Better than print() statements for production code
 '''
-from typing import Dict, List, Optional # Purpose: Add type annotations to make code more readable and catch errors early.
+import time # Purpose: Time how long coalesced requests waited.
+from typing import TYPE_CHECKING, AsyncIterator, Dict, Iterator, List, Optional, Tuple # Purpose: Add type annotations to make code more readable and catch errors early.
 '''
 Why We Use It:
 
@@ -16,11 +19,25 @@ IDEs can provide better autocomplete
 Catch type-related bugs before runtime
 Improves code maintainability
 '''
-from dataclasses import dataclass # Purpose: Automatically generate special methods for classes that primarily store data.
-
 from dotenv import load_dotenv # Purpose: Load environment variables from a .env file into the application.
 
-from openai import OpenAI # Purpose: Official Python client for OpenAI API (and compatible APIs).
+# Purpose: Official Python client for OpenAI API (and compatible APIs).
+# Only needed for type hints here; client_registry imports it when the first client is built.
+if TYPE_CHECKING:
+    from openai import AsyncOpenAI, OpenAI
+
+from client_registry import get_async_client, get_client # Purpose: Reuse one pooled client per provider.
+from response_cache import ResponseCache, cache_key # Purpose: Serve identical requests without calling the provider.
+from semantic_cache import SemanticCache, shared_semantic_cache # Purpose: Serve reworded repeats of earlier questions.
+from context_window import ContextPolicy, ContextWindow # Purpose: Keep long conversations inside the model's token budget.
+from routing import AsyncProviderRouter, ProviderRouter, RetryPolicy, RoutingError # Purpose: Retries, circuit breakers and failover across providers.
+from metrics import CallMetrics, record as record_metrics # Purpose: Per-call latency and token usage.
+from conversation_store import ConversationStore # Purpose: Persist turns so sessions survive restarts.
+from provider_registry import ModelConfig, default_registry # Purpose: Provider list loaded from config, not code.
+from adaptive_routing import AdaptiveSelector # Purpose: Pick the provider per request from latency, errors and price.
+from prompt_builder import canonical_messages, message, system_prompt # Purpose: Byte-stable prompts so providers can reuse cached prefixes.
+from warmup import start_warmup # Purpose: Open provider connections before the first message.
+from single_flight import shared_async_flight, shared_flight # Purpose: Share one upstream call between identical concurrent requests.
 
 # Configure logging
 '''
@@ -34,79 +51,53 @@ Why to use it:
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-@dataclass
-class ModelConfig:
-    '''Configuration for AI models'''
-    name: str
-    api_key_env: str
-    model_name: str
-    base_url: str
-
-# # Without dataclass (manual implementation)
-# class ModelConfigManual:
-#     def __init__(self, name: str, api_key_env: str, model_name: str, base_url: str):
-#         self.name = name
-#         self.api_key_env = api_key_env
-#         self.model_name = model_name
-#         self.base_url = base_url
-    
-#     def __repr__(self):
-#         return f"ModelConfig(name='{self.name}', api_key_env='{self.api_key_env}', ...)"
-    
-#     def __eq__(self, other):
-#         if not isinstance(other, ModelConfig):
-#             return False
-#         return (self.name == other.name and 
-#                 self.api_key_env == other.api_key_env and ...)
-
 class AIModelManager:
     """Manages AI model configurations and interactions"""
 
-    # Model configuration stored as class attributes
-    MODELS = {
-        '1': ModelConfig( 
-            name="Gemini",
-            api_key_env='GOOGLE_API_KEY',
-            model_name='gemini-2.5-flash-preview-05-20',
-            base_url="https://generativelanguage.googleapis.com/v1beta/openai/"
-        ),
-        '2': ModelConfig(
-            name="Sambanova",
-            api_key_env='SAMBANOVA_API_KEY',
-            model_name="Llama-4-Maverick-17B-128E-Instruct",
-            base_url="https://api.sambanova.ai/v1"
-        ),
-        '3': ModelConfig(
-            name="Cerebras",
-            api_key_env='CEREBRAS_API_KEY',
-            model_name="llama-4-scout-17b-16e-instruct",
-            base_url="https://api.cerebras.ai/v1"
-        ),
-        '4': ModelConfig(
-            name="Nebius",
-            api_key_env='NEBIUS_API_KEY',
-            model_name="meta-llama/Meta-Llama-3.1-70B-Instruct",
-            base_url="https://api.studio.nebius.com/v1/"
-        ),
-        '5': ModelConfig(
-            name="Groq",
-            api_key_env='GROQ_API_KEY',
-            model_name="qwen-qwq-32b",
-            base_url="https://api.groq.com/openai/v1"
-        )
-    }
+    # Providers come from providers.toml (or PROVIDERS_FILE) and reload when the file changes
+    MODELS = default_registry()
 
     SYSTEM_PROMPTS = {
-        '1': "You are a very snarky assistant.",
-        '2': "You are a very polite assistant.",
+        '1': system_prompt('snarky'),
+        '2': system_prompt('polite'),
         '3': None  # Custom prompt will be set
     }
 
-    def __init__(self, config: ModelConfig):
+    def __init__(self, config: ModelConfig, cache: Optional[ResponseCache] = None,
+                 context_policy: Optional[ContextPolicy] = None,
+                 fallbacks: Optional[List[ModelConfig]] = None,
+                 retry_policy: Optional[RetryPolicy] = None,
+                 store: Optional[ConversationStore] = None,
+                 session_id: Optional[str] = None,
+                 selector: Optional[AdaptiveSelector] = None,
+                 semantic_cache: Optional[SemanticCache] = None,
+                 coalesce: bool = True):
         self.config = config
         self.api_key = self._get_api_key()
         self.client = self._create_client()
         self.context = []
+        # With a store every turn is persisted, and an existing session_id is resumed
+        self.store = store
+        self.session_id = None
+        if store is not None:
+            self.session_id = store.create_session(model=config.name, session_id=session_id)
+            self.context = store.load_context(self.session_id)
+        self.cache = cache
+        # Consulted after an exact-cache miss, for reworded versions of earlier questions
+        self.semantic_cache = semantic_cache
+        # Identical requests already in flight (from any manager in the process) share one upstream call
+        self.coalesce = coalesce
+        policy = context_policy or ContextPolicy(max_tokens=config.max_context_tokens)
+        self.context_window = ContextWindow(policy, summarizer=self._summarize_turns)
+        # Selected model first, then any fallbacks in order of preference (or as the selector ranks them)
+        self.selector = selector
+        self.router = self._create_router([config] + list(fallbacks or []), retry_policy)
+        # Metrics of this session's recent calls, newest last (shown in the Streamlit sidebar)
+        self.call_metrics: deque = deque(maxlen=500)
+
+    def _create_router(self, configs: List[ModelConfig], retry_policy: Optional[RetryPolicy]) -> ProviderRouter:
+        """Create the router that retries and fails over across providers"""
+        return ProviderRouter(configs, retry_policy, selector=self.selector)
     
     def _get_api_key(self) -> str:
         '''Get API key from environment variables'''
@@ -115,10 +106,11 @@ class AIModelManager:
             raise ValueError(f"API key {self.config.api_key_env} not found in environment variables")
         return api_key
     
-    def _create_client(self) -> OpenAI:
+    def _create_client(self) -> 'OpenAI':
         """Create OpenAI client"""
         try: 
-            return OpenAI(api_key=self.api_key,base_url=self.config.base_url)
+            # Shared per provider so every manager reuses one keep-alive pool
+            return get_client(self.config.base_url, self.api_key)
         except Exception as e:
             logger.error(f"Failed to create client: {e}")
             raise
@@ -137,32 +129,204 @@ class AIModelManager:
                 break
             elif choice == '3':
                 custom_behavior = input("Enter custom behavior (single word):").strip()
-                if custom_behavior:
-                    prompt = f"You are a very {custom_behavior} assistant"
+                if any(c.isalnum() for c in custom_behavior):
+                    prompt = system_prompt(custom_behavior)
                     break
                 else:
                     print("Please enter a valid behavior.")
             else:
                 print("Please select 1, 2, or 3.")
-            self.context = [{'role': 'system', 'content': prompt}]
-            logger.info(f"System prompt set: {prompt}")
+        self.reset_context(prompt)
+        logger.info(f"System prompt set: {prompt}")
 
-    def get_response(self, message: str) -> Optional[str]:
-        """Get response from AI model"""
-        self.context.append({'role':'user', "content": message})
+    def reset_context(self, system_prompt: str) -> None:
+        """Start a fresh conversation with the given system prompt"""
+        self.context = []
+        if self.store is not None:
+            self.store.reset(self.session_id)
+        self._append('system', system_prompt)
+
+    def add_turns(self, turns: List[Dict[str, str]]) -> None:
+        """Append earlier turns (e.g. history sent by an API client) without calling the model"""
+        for turn in turns:
+            self._append(turn['role'], turn.get('content'))
+
+    def _append(self, role: str, content: str) -> None:
+        """Add a turn to the context and, when persisting, to the store"""
+        turn = message(role, content)
+        self.context.append(turn)
+        if self.store is not None:
+            self.store.append(self.session_id, role, turn['content'])
 
+    @staticmethod
+    def _summary_request(messages: List[Dict[str, str]]) -> List[Dict[str, str]]:
+        transcript = "\n".join(f"{m['role']}: {m['content']}" for m in messages)
+        return [
+            message('system', "Summarize this conversation in a few sentences, keeping facts the user may refer back to."),
+            message('user', transcript),
+        ]
+
+    def _summarize_turns(self, messages: List[Dict[str, str]]) -> str:
+        """Summarize old turns with the model itself, used when the context policy summarizes
+
+        Goes through the router like any completion, so it gets retries,
+        failover, rate limiting and metrics.
+        """
         try:
-            response = self.client.chat.completions.create(
-                model = self.config.model_name,
-                messages = self.context
-            )
-
-            ai_response = response.choices[0].message.content
-            self.context.append({'role':'assistant', 'content': ai_response})
-            return ai_response
-        except Exception as e:
+            return self.router.complete(self._summary_request(messages))
+        finally:
+            self._collect_metrics()
+
+    def _fit_context(self) -> None:
+        """Trim the stored context to the model's token budget before sending it"""
+        self.context = self.context_window.fit(self.context)
+
+    def complete(self, messages: List[Dict[str, str]]) -> str:
+        """One-shot completion for the given messages; does not touch self.context
+
+        Raises RoutingError when every provider failed.
+        """
+        try:
+            return self._call(canonical_messages(messages))[0]
+        finally:
+            self._collect_metrics()
+
+    def _flight_key(self, messages: List[Dict[str, str]], key: Optional[str], use_cache: bool) -> Optional[str]:
+        """Key identical in-flight requests share, None when this call must reach the provider itself"""
+        if not (use_cache and self.coalesce):
+            return None
+        return key or cache_key(self.config, messages)
+
+    def _record_coalesced(self, stream: bool, started: float) -> None:
+        """Metrics for a request answered by an identical request's upstream call"""
+        metrics = CallMetrics(provider=self.config.name, model=self.config.model_name, stream=stream,
+                              latency=time.perf_counter() - started, coalesced=True)
+        record_metrics(metrics)
+        self.call_metrics.append(metrics)
+
+    @staticmethod
+    def _deltas(chunks: Iterator) -> Iterator[str]:
+        """Text deltas of a stream of chat completion chunks"""
+        for chunk in chunks:
+            if chunk.choices and chunk.choices[0].delta.content:
+                yield chunk.choices[0].delta.content
+
+    def _call(self, messages: List[Dict[str, str]], key: Optional[str] = None,
+              use_cache: bool = True) -> Tuple[str, bool]:
+        """Complete messages, sharing the call with identical requests in flight; returns (response, shared)"""
+        flight_key = self._flight_key(messages, key, use_cache)
+        if flight_key is None:
+            return self.router.complete(messages), False
+        started = time.perf_counter()
+        response, shared = shared_flight().do(flight_key, lambda: self.router.complete(messages))
+        if shared:
+            self._record_coalesced(False, started)
+        return response, shared
+
+    def _stream(self, messages: List[Dict[str, str]], key: Optional[str] = None,
+                use_cache: bool = True) -> Tuple[Iterator[str], bool]:
+        """Stream text deltas, sharing the stream with identical requests in flight; returns (deltas, shared)"""
+        flight_key = self._flight_key(messages, key, use_cache)
+        if flight_key is None:
+            return self._deltas(self.router.stream(messages)), False
+        started = time.perf_counter()
+        deltas, shared = shared_flight().stream(flight_key, lambda: self._deltas(self.router.stream(messages)))
+        return (self._recorded(deltas, started) if shared else deltas), shared
+
+    def _recorded(self, deltas: Iterator[str], started: float) -> Iterator[str]:
+        yield from deltas
+        self._record_coalesced(True, started)
+
+    def _cache_lookup(self, use_cache: bool) -> Tuple[Optional[str], Optional[str]]:
+        """Return (key, cached response) for the current context, key is None when caching is off"""
+        if not use_cache or (self.cache is None and self.semantic_cache is None):
+            return None, None
+        key = cache_key(self.config, self.context)
+        cached = self.cache.get(key) if self.cache is not None else None
+        if cached is None and self.semantic_cache is not None:
+            cached = self.semantic_cache.lookup(self.config, self.context)
+        if cached is not None:
+            metrics = CallMetrics(provider=self.config.name, model=self.config.model_name, cache_hit=True)
+            record_metrics(metrics)
+            self.call_metrics.append(metrics)
+        return key, cached
+
+    def _cache_store(self, key: Optional[str], response: Optional[str]) -> None:
+        """Cache a complete answer to the current context (before it is appended)"""
+        if key is None or response is None:
+            return
+        if self.cache is not None:
+            self.cache.set(key, response)
+        if self.semantic_cache is not None:
+            self.semantic_cache.store(self.config, self.context, response)
+
+    def _collect_metrics(self) -> None:
+        """Keep the metrics of the routed call that just finished"""
+        if self.router.last_metrics is not None:
+            self.call_metrics.append(self.router.last_metrics)
+            self.router.last_metrics = None
+
+    def get_response(self, message: str, use_cache: bool = True) -> Optional[str]:
+        """Get response from AI model
+
+        Raises RoutingError, with one structured CompletionError per attempt,
+        when every provider failed.
+        """
+        self._append('user', message)
+        self._fit_context()
+
+        key, cached = self._cache_lookup(use_cache)
+        if cached is not None:
+            self._append('assistant', cached)
+            return cached
+
+        try:
+            ai_response, shared = self._call(list(self.context), key, use_cache)
+        except RoutingError as e:
             logger.error(f"Error getting response: {e}")
-            return f"Error: {e}"
+            raise
+        finally:
+            self._collect_metrics()
+
+        if not shared:
+            self._cache_store(key, ai_response)
+        self._append('assistant', ai_response)
+        return ai_response
+
+    def stream_response(self, message: str, use_cache: bool = True) -> Iterator[str]:
+        """Stream response from AI model, yielding text deltas as they arrive
+
+        Raises RoutingError when every provider failed, or when the stream
+        broke after text was already yielded.
+        """
+        self._append('user', message)
+        self._fit_context()
+        chunks = []
+
+        key, cached = self._cache_lookup(use_cache)
+        if cached is not None:
+            self._append('assistant', cached)
+            yield cached
+            return
+
+        try:
+            deltas, shared = self._stream(list(self.context), key, use_cache)
+            for delta in deltas:
+                chunks.append(delta)
+                yield delta
+        except RoutingError as e:
+            logger.error(f"Error streaming response: {e}")
+            self._collect_metrics()
+            if chunks:
+                # Keep what the user already saw, but never cache a partial answer
+                self._append('assistant', "".join(chunks))
+            raise
+
+        self._collect_metrics()
+        ai_response = "".join(chunks)
+        if not shared:
+            self._cache_store(key, ai_response)
+        self._append('assistant', ai_response)
     
     def chat_loop(self) -> None:
         """Main chat interaction loop"""
@@ -180,9 +344,13 @@ class AIModelManager:
                 if not user_input:
                     print("Please enter a message.")
                     continue
-                response = self.get_response(user_input)
-                print(f"AI: {response}")
+                print("AI: ", end="", flush=True)
+                for delta in self.stream_response(user_input):
+                    print(delta, end="", flush=True)
+                print()
 
+            except RoutingError as e:
+                print(f"\nError: {e}")
             except KeyboardInterrupt:
                 print("\n\nChat interrupted. Goodbye!")
                 break
@@ -190,21 +358,211 @@ class AIModelManager:
                 logger.error(f"Unexpected error in chat loop: {e}")
                 print(f"An error occurred: {e}")
 
+class AsyncAIModelManager(AIModelManager):
+    """Async counterpart of AIModelManager built on AsyncOpenAI
+
+    Lets a single process drive many conversations concurrently on one
+    event loop instead of blocking one thread per chat.
+    """
+
+    def _create_router(self, configs: List[ModelConfig], retry_policy: Optional[RetryPolicy]) -> AsyncProviderRouter:
+        """Create the async router that retries and fails over across providers"""
+        return AsyncProviderRouter(configs, retry_policy, selector=self.selector)
+
+    def _create_client(self) -> 'AsyncOpenAI':
+        """Get the pooled AsyncOpenAI client for the running event loop"""
+        try:
+            return get_async_client(self.config.base_url, self.api_key)
+        except Exception as e:
+            logger.error(f"Failed to create async client: {e}")
+            raise
+
+    async def complete(self, messages: List[Dict[str, str]]) -> str:
+        """One-shot completion for the given messages; does not touch self.context
+
+        Raises RoutingError when every provider failed.
+        """
+        try:
+            return (await self._acall(canonical_messages(messages)))[0]
+        finally:
+            self._collect_metrics()
+
+    async def stream_complete(self, messages: List[Dict[str, str]]) -> AsyncIterator[str]:
+        """One-shot streamed completion, yielding text deltas; does not touch self.context"""
+        deltas, _ = self._astream(canonical_messages(messages))
+        try:
+            async for delta in deltas:
+                yield delta
+        finally:
+            self._collect_metrics()
+
+    @staticmethod
+    async def _adeltas(chunks: AsyncIterator) -> AsyncIterator[str]:
+        """Text deltas of an async stream of chat completion chunks"""
+        async for chunk in chunks:
+            if chunk.choices and chunk.choices[0].delta.content:
+                yield chunk.choices[0].delta.content
+
+    async def _acall(self, messages: List[Dict[str, str]], key: Optional[str] = None,
+                     use_cache: bool = True) -> Tuple[str, bool]:
+        """Async _call: coalesced with identical requests in flight on this event loop"""
+        flight_key = self._flight_key(messages, key, use_cache)
+        if flight_key is None:
+            return await self.router.complete(messages), False
+        started = time.perf_counter()
+        response, shared = await shared_async_flight().do(flight_key, lambda: self.router.complete(messages))
+        if shared:
+            self._record_coalesced(False, started)
+        return response, shared
+
+    def _astream(self, messages: List[Dict[str, str]], key: Optional[str] = None,
+                 use_cache: bool = True) -> Tuple[AsyncIterator[str], bool]:
+        """Async _stream: coalesced with identical requests in flight on this event loop"""
+        flight_key = self._flight_key(messages, key, use_cache)
+        if flight_key is None:
+            return self._adeltas(self.router.stream(messages)), False
+        started = time.perf_counter()
+        deltas, shared = shared_async_flight().stream(flight_key, lambda: self._adeltas(self.router.stream(messages)))
+        return (self._arecorded(deltas, started) if shared else deltas), shared
+
+    async def _arecorded(self, deltas: AsyncIterator[str], started: float) -> AsyncIterator[str]:
+        async for delta in deltas:
+            yield delta
+        self._record_coalesced(True, started)
+
+    async def _asummarize_turns(self, messages: List[Dict[str, str]]) -> str:
+        """Async _summarize_turns, through the async router"""
+        try:
+            return await self.router.complete(self._summary_request(messages))
+        finally:
+            self._collect_metrics()
+
+    async def _afit_context(self) -> None:
+        """Trim the context, summarizing through the async router when the policy asks for it"""
+        self.context = await self.context_window.afit(self.context, self._asummarize_turns)
+
+    async def get_response(self, message: str, use_cache: bool = True) -> Optional[str]:
+        """Get response from AI model without blocking the event loop"""
+        self._append('user', message)
+        await self._afit_context()
+
+        key, cached = self._cache_lookup(use_cache)
+        if cached is not None:
+            self._append('assistant', cached)
+            return cached
+
+        try:
+            ai_response, shared = await self._acall(list(self.context), key, use_cache)
+        except RoutingError as e:
+            logger.error(f"Error getting response: {e}")
+            raise
+        finally:
+            self._collect_metrics()
+
+        if not shared:
+            self._cache_store(key, ai_response)
+        self._append('assistant', ai_response)
+        return ai_response
+
+    async def stream_response(self, message: str, use_cache: bool = True) -> AsyncIterator[str]:
+        """Stream response from AI model, yielding text deltas as they arrive"""
+        self._append('user', message)
+        await self._afit_context()
+        chunks = []
+
+        key, cached = self._cache_lookup(use_cache)
+        if cached is not None:
+            self._append('assistant', cached)
+            yield cached
+            return
+
+        try:
+            deltas, shared = self._astream(list(self.context), key, use_cache)
+            async for delta in deltas:
+                chunks.append(delta)
+                yield delta
+        except RoutingError as e:
+            logger.error(f"Error streaming response: {e}")
+            self._collect_metrics()
+            if chunks:
+                self._append('assistant', "".join(chunks))
+            raise
+
+        self._collect_metrics()
+        ai_response = "".join(chunks)
+        if not shared:
+            self._cache_store(key, ai_response)
+        self._append('assistant', ai_response)
+
+    async def chat_loop(self) -> None:
+        """Main chat interaction loop, reading input off the event loop"""
+        print(f"\n=== {self.config.name} Chat Started ===")
+        print("Type 'quit' to exit")
+
+        while True:
+            try:
+                user_input = (await asyncio.to_thread(input, "\nYou: ")).strip()
+
+                if user_input.lower() in ['quit', 'exit']:
+                    print("Goodbye!")
+                    break
+
+                if not user_input:
+                    print("Please enter a message.")
+                    continue
+                print("AI: ", end="", flush=True)
+                async for delta in self.stream_response(user_input):
+                    print(delta, end="", flush=True)
+                print()
+
+            except RoutingError as e:
+                print(f"\nError: {e}")
+            except (KeyboardInterrupt, asyncio.CancelledError):
+                print("\n\nChat interrupted. Goodbye!")
+                break
+            except Exception as e:
+                logger.error(f"Unexpected error in chat loop: {e}")
+                print(f"An error occurred: {e}")
+
+def configured_fallbacks(config: ModelConfig) -> List[ModelConfig]:
+    """Other models in menu order whose API keys are set, used for failover"""
+    return [
+        candidate for candidate in AIModelManager.MODELS.values()
+        if candidate is not config and os.getenv(candidate.api_key_env)
+    ]
+
+# Menu entry that lets AdaptiveSelector pick the provider for every request
+AUTO_CHOICE = '0'
+
+def auto_manager_configs() -> Tuple[ModelConfig, List[ModelConfig]]:
+    """(primary, fallbacks) over every provider with a key, largest context window first
+
+    The primary's window sets the context budget; the selector still sends
+    short prompts to whichever provider is fastest and cheapest.
+    """
+    configured = sorted(
+        (c for c in AIModelManager.MODELS.values() if os.getenv(c.api_key_env)),
+        key=lambda c: c.max_context_tokens, reverse=True)
+    if not configured:
+        raise ValueError("Auto mode needs at least one provider API key in the environment")
+    return configured[0], configured[1:]
+
 def display_model_menu() -> None:
     """Display available models"""
     print("\n=== Available AI Models ===")
+    print(f"{AUTO_CHOICE}, Auto (fastest affordable provider per request)")
     for key, config in AIModelManager.MODELS.items():
         print(f"{key}, {config.name}")
     
 def get_model_choice() -> str:
     """Get user's model choice with validation"""
     while True:
-        choice = input(f"\nSelect model (1-{len(AIModelManager.MODELS)}):").strip()
+        choice = input(f"\nSelect model ({AUTO_CHOICE}-{len(AIModelManager.MODELS)}):").strip()
 
-        if choice in AIModelManager.MODELS:
+        if choice == AUTO_CHOICE or choice in AIModelManager.MODELS:
             return choice
         else:
-            print(f"Please select a number between 1 and {len(AIModelManager.MODELS)}")
+            print(f"Please select a number between {AUTO_CHOICE} and {len(AIModelManager.MODELS)}")
 
 
 
@@ -214,15 +572,25 @@ def main():
         # load environment variables
         load_dotenv()
 
+        # Connect to every configured provider while the user reads the menus
+        start_warmup(c for c in AIModelManager.MODELS.values() if os.getenv(c.api_key_env))
+
         # Display menu and get user choice
         display_model_menu()
         model_choice = get_model_choice()
         
-        # Get selected model configuration
-        seleacted_config = AIModelManager.MODELS[model_choice]
+        # Create model manager for the selected model, or for all of them in auto mode
+        if model_choice == AUTO_CHOICE:
+            primary, fallbacks = auto_manager_configs()
+            model_manager = AIModelManager(primary, fallbacks=fallbacks, selector=AdaptiveSelector(),
+                                           semantic_cache=shared_semantic_cache())
+        else:
+            seleacted_config = AIModelManager.MODELS[model_choice]
+            start_warmup([seleacted_config])
+            model_manager = AIModelManager(seleacted_config, fallbacks=configured_fallbacks(seleacted_config),
+                                           semantic_cache=shared_semantic_cache())
 
-        # Create model manager and start chat
-        model_manager = AIModelManager(seleacted_config)
+        # Start chat
         model_manager.set_system_prompt()
         model_manager.chat_loop()
     except KeyboardInterrupt:
@@ -1,58 +1,19 @@
 import os
 import logging
 from typing import Dict, List, Optional
-from dataclasses import dataclass
 from dotenv import load_dotenv
 from openai import OpenAI
+from provider_registry import ModelConfig, default_registry
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-@dataclass
-class ModelConfig:
-    """Configuration for AI models"""
-    name: str
-    api_key_env: str
-    model_name: str
-    base_url: str
-
 class AIModelManager:
     """Manages AI model configurations and interactions"""
     
-    # Model configurations stored as class attribute
-    MODELS = {
-        '1': ModelConfig(
-            name="Gemini",
-            api_key_env='GOOGLE_API_KEY',
-            model_name='gemini-2.0-flash',
-            base_url="https://generativelanguage.googleapis.com/v1beta/openai/"
-        ),
-        '2': ModelConfig(
-            name="Sambanova",
-            api_key_env='SAMBANOVA_API_KEY',
-            model_name="Llama-4-Maverick-17B-128E-Instruct",
-            base_url="https://api.sambanova.ai/v1"
-        ),
-        '3': ModelConfig(
-            name="Cerebras",
-            api_key_env='CEREBRAS_API_KEY',
-            model_name="llama-4-scout-17b-16e-instruct",
-            base_url="https://api.cerebras.ai/v1"
-        ),
-        '4': ModelConfig(
-            name="Nebius",
-            api_key_env='NEBIUS_API_KEY',
-            model_name="meta-llama/Meta-Llama-3.1-70B-Instruct",
-            base_url="https://api.studio.nebius.com/v1/"
-        ),
-        '5': ModelConfig(
-            name="Groq",
-            api_key_env='GROQ_API_KEY',
-            model_name="qwen-qwq-32b",
-            base_url="https://api.groq.com/openai/v1"
-        )
-    }
+    # Providers come from providers.toml (or PROVIDERS_FILE) and reload when the file changes
+    MODELS = default_registry()
     
     SYSTEM_PROMPTS = {
         '1': "You are a very snarky assistant.",
@@ -0,0 +1,174 @@
+import logging
+import threading
+from collections import defaultdict
+from dataclasses import dataclass, asdict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, List, Optional, Tuple
+
+'''
+Per-call latency and token-usage metrics.
+
+The routers emit one CallMetrics per completion (streamed or not) and the
+managers emit one for every cache hit or coalesced request. Metrics go to a process-wide
+MetricsRecorder, which keeps per-provider aggregates, calls any registered
+hooks, and renders everything in the Prometheus text format.
+'''
+
+logger = logging.getLogger(__name__)
+
+# Histogram buckets in seconds, covering fast TTFTs through slow long completions
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+@dataclass
+class CallMetrics:
+    '''Measurements for one completion call'''
+    provider: str
+    model: str
+    stream: bool = False
+    latency: float = 0.0                  # seconds from request to last token
+    ttft: Optional[float] = None          # seconds to first streamed token
+    prompt_tokens: Optional[int] = None
+    completion_tokens: Optional[int] = None
+    cached_prompt_tokens: Optional[int] = None  # prompt tokens served from the provider's prefix cache
+    retries: int = 0                      # failed attempts before this result
+    cache_hit: bool = False
+    coalesced: bool = False               # answered by an identical request already in flight
+    error: Optional[str] = None
+
+    @property
+    def tokens_per_sec(self) -> Optional[float]:
+        """Completion tokens per second of generation time (after the first token when streaming)"""
+        if not self.completion_tokens:
+            return None
+        generation = self.latency - (self.ttft or 0.0)
+        if generation <= 0:
+            generation = self.latency
+        return self.completion_tokens / generation if generation > 0 else None
+
+    def to_dict(self) -> Dict:
+        data = asdict(self)
+        data['tokens_per_sec'] = self.tokens_per_sec
+        return data
+
+class _Histogram:
+    def __init__(self, buckets: Tuple[float, ...] = LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.total = 0
+        self.sum = 0.0
+
+    def observe(self, value: float) -> None:
+        self.total += 1
+        self.sum += value
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+
+class MetricsRecorder:
+    """Aggregates CallMetrics per provider and fans them out to hooks"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._hooks: List[Callable[[CallMetrics], None]] = []
+        self._counters: Dict[Tuple[str, str], float] = defaultdict(float)
+        self._latency: Dict[str, _Histogram] = defaultdict(_Histogram)
+        self._ttft: Dict[str, _Histogram] = defaultdict(_Histogram)
+
+    def add_hook(self, hook: Callable[[CallMetrics], None]) -> None:
+        """Call hook(metrics) after every recorded call"""
+        with self._lock:
+            self._hooks.append(hook)
+
+    def remove_hook(self, hook: Callable[[CallMetrics], None]) -> None:
+        with self._lock:
+            if hook in self._hooks:
+                self._hooks.remove(hook)
+
+    def record(self, metrics: CallMetrics) -> None:
+        with self._lock:
+            provider = metrics.provider
+            status = 'error' if metrics.error else 'ok'
+            self._counters[('requests_total', f'provider="{provider}",status="{status}"')] += 1
+            self._counters[('retries_total', f'provider="{provider}"')] += metrics.retries
+            if metrics.cache_hit:
+                self._counters[('cache_hits_total', f'provider="{provider}"')] += 1
+            elif metrics.coalesced:
+                self._counters[('coalesced_total', f'provider="{provider}"')] += 1
+            else:
+                if not metrics.error:
+                    self._latency[provider].observe(metrics.latency)
+                if metrics.ttft is not None:
+                    self._ttft[provider].observe(metrics.ttft)
+            if metrics.prompt_tokens:
+                self._counters[('prompt_tokens_total', f'provider="{provider}"')] += metrics.prompt_tokens
+            if metrics.completion_tokens:
+                self._counters[('completion_tokens_total', f'provider="{provider}"')] += metrics.completion_tokens
+            if metrics.cached_prompt_tokens:
+                self._counters[('cached_prompt_tokens_total', f'provider="{provider}"')] += metrics.cached_prompt_tokens
+            hooks = list(self._hooks)
+
+        logger.debug(f"Completion metrics: {metrics.to_dict()}")
+        for hook in hooks:
+            try:
+                hook(metrics)
+            except Exception as e:
+                logger.warning(f"Metrics hook {hook!r} failed: {e}")
+
+    def to_prometheus(self, prefix: str = "llm") -> str:
+        """Render all metrics in the Prometheus text exposition format"""
+        lines = []
+        with self._lock:
+            by_name: Dict[str, List[Tuple[str, float]]] = defaultdict(list)
+            for (name, labels), value in sorted(self._counters.items()):
+                by_name[name].append((labels, value))
+            for name, samples in by_name.items():
+                lines.append(f"# TYPE {prefix}_{name} counter")
+                for labels, value in samples:
+                    lines.append(f"{prefix}_{name}{{{labels}}} {value:g}")
+            for name, histograms in (('request_latency_seconds', self._latency),
+                                     ('time_to_first_token_seconds', self._ttft)):
+                if not histograms:
+                    continue
+                lines.append(f"# TYPE {prefix}_{name} histogram")
+                for provider, hist in sorted(histograms.items()):
+                    for bound, count in zip(hist.buckets, hist.counts):
+                        lines.append(f'{prefix}_{name}_bucket{{provider="{provider}",le="{bound}"}} {count}')
+                    lines.append(f'{prefix}_{name}_bucket{{provider="{provider}",le="+Inf"}} {hist.total}')
+                    lines.append(f'{prefix}_{name}_sum{{provider="{provider}"}} {hist.sum:.6f}')
+                    lines.append(f'{prefix}_{name}_count{{provider="{provider}"}} {hist.total}')
+        return "\n".join(lines) + "\n"
+
+# Default process-wide recorder
+recorder = MetricsRecorder()
+
+def record(metrics: CallMetrics) -> None:
+    recorder.record(metrics)
+
+def add_hook(hook: Callable[[CallMetrics], None]) -> None:
+    recorder.add_hook(hook)
+
+def prometheus_text() -> str:
+    return recorder.to_prometheus()
+
+def start_metrics_server(port: int = 9464, host: str = "127.0.0.1") -> ThreadingHTTPServer:
+    """Serve /metrics for Prometheus scraping from a background thread"""
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.rstrip('/') != '/metrics':
+                self.send_error(404)
+                return
+            body = prometheus_text().encode('utf-8')
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/plain; version=0.0.4')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            logger.debug(format % args)
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    threading.Thread(target=server.serve_forever, name="metrics-server", daemon=True).start()
+    logger.info(f"Prometheus metrics on http://{host}:{port}/metrics")
+    return server
@@ -0,0 +1,168 @@
+import argparse
+import json
+import logging
+import random
+import threading
+import time
+import uuid
+from dataclasses import dataclass
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Optional
+
+'''
+Local stand-in for an OpenAI-compatible chat completions API.
+
+Answers /v1/chat/completions (streaming and non-streaming) and /v1/models
+with canned text, after a configurable time-to-first-token and at a
+configurable token rate, and can inject 429s. Used by benchmark.py so the
+client side can be measured without API keys or network.
+
+    python mock_openai_server.py --port 8800 --ttft 0.2 --tokens-per-sec 200
+'''
+
+logger = logging.getLogger(__name__)
+
+WORDS = ("lorem ipsum dolor sit amet consectetur adipiscing elit sed do eiusmod "
+         "tempor incididunt ut labore et dolore magna aliqua").split()
+
+@dataclass
+class MockSettings:
+    '''Behaviour of the mock server'''
+    ttft: float = 0.1               # seconds before the first token
+    tokens_per_sec: float = 500.0   # generation speed after the first token
+    response_tokens: int = 64       # tokens per answer
+    error_rate: float = 0.0         # fraction of requests answered with 429
+    retry_after: float = 0.05       # seconds advertised in Retry-After on 429s
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive, so connection reuse is measurable
+    settings: MockSettings = MockSettings()
+
+    def log_message(self, format, *args):
+        logger.debug(format % args)
+
+    def _send_json(self, status: int, payload: dict, headers: Optional[dict] = None) -> None:
+        body = json.dumps(payload).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _write_chunk(self, data: bytes) -> None:
+        self.wfile.write(f"{len(data):X}\r\n".encode() + data + b"\r\n")
+        self.wfile.flush()
+
+    def do_GET(self):
+        if self.path.rstrip('/').endswith('/models'):
+            self._send_json(200, {'object': 'list', 'data': [
+                {'id': 'mock-model', 'object': 'model', 'created': 0, 'owned_by': 'mock'}]})
+        else:
+            self._send_json(404, {'error': {'message': 'Not found'}})
+
+    def do_POST(self):
+        length = int(self.headers.get('Content-Length', 0))
+        request = json.loads(self.rfile.read(length) or b'{}')
+        if not self.path.rstrip('/').endswith('/chat/completions'):
+            self._send_json(404, {'error': {'message': 'Not found'}})
+            return
+
+        settings = self.settings
+        if settings.error_rate and random.random() < settings.error_rate:
+            self._send_json(429, {'error': {'message': 'Rate limit exceeded (injected)', 'type': 'rate_limit'}},
+                            {'Retry-After': f"{settings.retry_after:g}",
+                             'retry-after-ms': str(int(settings.retry_after * 1000))})
+            return
+
+        model = request.get('model', 'mock-model')
+        prompt_tokens = sum(len(str(m.get('content', ''))) // 4 + 4 for m in request.get('messages', []))
+        tokens = [WORDS[i % len(WORDS)] + ' ' for i in range(settings.response_tokens)]
+        usage = {'prompt_tokens': prompt_tokens, 'completion_tokens': len(tokens),
+                 'total_tokens': prompt_tokens + len(tokens)}
+        completion_id = f"chatcmpl-{uuid.uuid4().hex[:12]}"
+        created = int(time.time())
+
+        time.sleep(settings.ttft)
+        if not request.get('stream'):
+            time.sleep(len(tokens) / settings.tokens_per_sec)
+            self._send_json(200, {
+                'id': completion_id, 'object': 'chat.completion', 'created': created, 'model': model,
+                'choices': [{'index': 0, 'finish_reason': 'stop',
+                             'message': {'role': 'assistant', 'content': ''.join(tokens)}}],
+                'usage': usage,
+            })
+            return
+
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/event-stream')
+        self.send_header('Transfer-Encoding', 'chunked')
+        self.end_headers()
+
+        def event(delta, finish_reason=None, extra=None):
+            chunk = {'id': completion_id, 'object': 'chat.completion.chunk', 'created': created, 'model': model,
+                     'choices': [{'index': 0, 'delta': delta, 'finish_reason': finish_reason}]}
+            chunk.update(extra or {})
+            self._write_chunk(f"data: {json.dumps(chunk)}\n\n".encode('utf-8'))
+
+        event({'role': 'assistant', 'content': ''})
+        for token in tokens:
+            event({'content': token})
+            time.sleep(1 / settings.tokens_per_sec)
+        event({}, 'stop')
+        if (request.get('stream_options') or {}).get('include_usage'):
+            chunk = {'id': completion_id, 'object': 'chat.completion.chunk', 'created': created,
+                     'model': model, 'choices': [], 'usage': usage}
+            self._write_chunk(f"data: {json.dumps(chunk)}\n\n".encode('utf-8'))
+        self._write_chunk(b"data: [DONE]\n\n")
+        self._write_chunk(b"")
+
+class MockServer:
+    """Runs the mock API on a background thread"""
+
+    def __init__(self, settings: Optional[MockSettings] = None, host: str = "127.0.0.1", port: int = 0):
+        handler = type('Handler', (_Handler,), {'settings': settings or MockSettings()})
+        self.httpd = ThreadingHTTPServer((host, port), handler)
+        self.httpd.daemon_threads = True
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def base_url(self) -> str:
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}/v1"
+
+    def start(self) -> 'MockServer':
+        self._thread = threading.Thread(target=self.httpd.serve_forever, name="mock-openai", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def __enter__(self) -> 'MockServer':
+        return self.start()
+
+    def __exit__(self, *exc) -> None:
+        self.stop()
+
+def main():
+    parser = argparse.ArgumentParser(description="Run a mock OpenAI-compatible server")
+    parser.add_argument("--port", type=int, default=8800)
+    parser.add_argument("--ttft", type=float, default=0.1)
+    parser.add_argument("--tokens-per-sec", type=float, default=500.0)
+    parser.add_argument("--response-tokens", type=int, default=64)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    args = parser.parse_args()
+
+    settings = MockSettings(args.ttft, args.tokens_per_sec, args.response_tokens, args.error_rate)
+    server = MockServer(settings, port=args.port)
+    print(f"Mock OpenAI server on {server.base_url}")
+    try:
+        server.httpd.serve_forever()
+    except KeyboardInterrupt:
+        server.stop()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+import re
+import unicodedata
+from typing import Dict, List
+
+'''
+Byte-stable prompt construction for provider-side prefix caching.
+
+Providers that cache prompt prefixes (OpenAI, Gemini, Groq, ...) only reuse
+work when the start of a request is byte-for-byte identical to an earlier
+one. Everything here exists to keep that prefix stable:
+
+- system prompts come from one template and are normalized, so "Snarky ",
+  "snarky" and "snarky." give the same text in the CLI and Streamlit;
+- every message dict has its keys in one fixed order ('role', 'content',
+  then the rest), so the JSON the SDK sends never changes key order;
+- the system prompt always comes first and the conversation is append-only,
+  so anything that changes per request belongs at the end, never the front.
+'''
+
+SYSTEM_TEMPLATE = "You are a very {behavior} helpful assistant."
+
+PERSONAS = {
+    'snarky': "snarky",
+    'polite': "polite",
+}
+
+_WHITESPACE = re.compile(r"[ \t]+")
+_BLANK_LINES = re.compile(r"\n{3,}")
+
+def normalize_text(text: str) -> str:
+    """Canonical form of prompt text: NFC, \\n line endings, no trailing spaces or blank-line runs"""
+    text = unicodedata.normalize('NFC', text or '')
+    text = text.replace('\r\n', '\n').replace('\r', '\n')
+    text = "\n".join(_WHITESPACE.sub(' ', line).rstrip() for line in text.split('\n'))
+    return _BLANK_LINES.sub('\n\n', text).strip()
+
+def normalize_behavior(behavior: str) -> str:
+    """Lowercase words separated by single spaces, without surrounding punctuation"""
+    words = re.findall(r"[\w'-]+", unicodedata.normalize('NFC', behavior or '').lower())
+    return " ".join(words)
+
+def system_prompt(behavior: str) -> str:
+    """The system prompt for a persona key or a free-form behavior ("curious", "Very Formal!")"""
+    behavior = normalize_behavior(behavior)
+    # The template already says "very"
+    behavior = re.sub(r"^very\s+", "", behavior)
+    if not behavior:
+        raise ValueError("Behavior must contain at least one word")
+    return SYSTEM_TEMPLATE.format(behavior=PERSONAS.get(behavior, behavior))
+
+def message(role: str, content: str) -> Dict[str, str]:
+    """One chat message in canonical key order; system text is normalized"""
+    content = content or ''
+    if role == 'system':
+        content = normalize_text(content)
+    return {'role': role, 'content': content}
+
+# Message keys in the order they are sent; any others follow, sorted
+_KEY_ORDER = ('role', 'content', 'name', 'tool_calls', 'tool_call_id')
+
+def canonical_messages(messages: List[Dict[str, str]]) -> List[Dict[str, str]]:
+    """messages with keys in a fixed order and system text normalized
+
+    Only the layout changes: every key is kept, and a message without a role
+    is an error rather than a guess. Already-canonical messages are kept as
+    the same objects.
+    """
+    canonical = []
+    for m in messages:
+        if 'role' not in m:
+            raise ValueError(f"Message has no role: {m!r}")
+        keys = [k for k in _KEY_ORDER if k in m] + sorted(k for k in m if k not in _KEY_ORDER)
+        content = m.get('content')
+        if m['role'] == 'system' and isinstance(content, str):
+            content = normalize_text(content)
+        if list(m) == keys and content == m.get('content'):
+            canonical.append(m)
+        else:
+            ordered = {k: m[k] for k in keys}
+            if 'content' in ordered:
+                ordered['content'] = content
+            canonical.append(ordered)
+    return canonical
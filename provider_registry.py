@@ -0,0 +1,217 @@
+import logging
+import os
+import threading
+import time
+from collections.abc import Mapping
+from dataclasses import dataclass
+from typing import Dict, Iterator, List, Optional
+
+try:
+    import tomllib
+except ImportError: # Python < 3.11
+    try:
+        import tomli as tomllib
+    except ImportError:
+        tomllib = None
+
+'''
+Model providers loaded from a TOML (or YAML) file instead of code.
+
+ProviderRegistry reads providers.toml, validates every entry once into
+ModelConfig objects and serves them as a read-only mapping of menu key to
+config. The file's mtime is checked at most once per check_interval, so
+edits take effect in running processes; an edit that fails validation is
+logged and the last good set of providers stays in use.
+'''
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'providers.toml')
+
+@dataclass
+class ModelConfig:
+    '''Configuration for AI models'''
+    name: str
+    api_key_env: str
+    model_name: str
+    base_url: str
+    max_context_tokens: int = 8192
+    # Client-side rate limits; None means unlimited
+    requests_per_minute: Optional[int] = None
+    tokens_per_minute: Optional[int] = None
+    max_in_flight: Optional[int] = None
+    # Request a final usage chunk when streaming (stream_options.include_usage)
+    stream_usage: bool = True
+    # USD per million tokens; None when unknown
+    input_cost_per_mtok: Optional[float] = None
+    output_cost_per_mtok: Optional[float] = None
+
+class ProviderConfigError(ValueError):
+    """The provider file is missing, unparsable or has an invalid entry"""
+
+# File field -> (ModelConfig field, accepted types, required)
+_FIELDS = {
+    'name': ('name', (str,), True),
+    'api_key_env': ('api_key_env', (str,), True),
+    'model': ('model_name', (str,), True),
+    'base_url': ('base_url', (str,), True),
+    'context_tokens': ('max_context_tokens', (int,), False),
+    'requests_per_minute': ('requests_per_minute', (int,), False),
+    'tokens_per_minute': ('tokens_per_minute', (int,), False),
+    'max_in_flight': ('max_in_flight', (int,), False),
+    'input_cost_per_mtok': ('input_cost_per_mtok', (int, float), False),
+    'output_cost_per_mtok': ('output_cost_per_mtok', (int, float), False),
+    'stream_usage': ('stream_usage', (bool,), False),
+}
+
+def _read(path: str) -> dict:
+    if path.endswith(('.yaml', '.yml')):
+        try:
+            import yaml # Optional: only needed for YAML provider files
+        except ImportError:
+            raise ProviderConfigError(f"{path}: install PyYAML to use a YAML provider file")
+        with open(path, 'r', encoding='utf-8') as f:
+            return yaml.safe_load(f) or {}
+    if tomllib is None:
+        raise ProviderConfigError(f"{path}: TOML needs Python 3.11+ or the tomli package")
+    with open(path, 'rb') as f:
+        return tomllib.load(f)
+
+def _parse_entry(position: int, entry) -> tuple:
+    where = f"provider #{position}"
+    if not isinstance(entry, dict):
+        raise ProviderConfigError(f"{where}: expected a table, got {type(entry).__name__}")
+    unknown = set(entry) - set(_FIELDS) - {'key'}
+    if unknown:
+        raise ProviderConfigError(f"{where}: unknown field(s) {sorted(unknown)}")
+
+    values = {}
+    for field_name, (attribute, types_, required) in _FIELDS.items():
+        if field_name not in entry:
+            if required:
+                raise ProviderConfigError(f"{where}: missing required field '{field_name}'")
+            continue
+        value = entry[field_name]
+        # bool is an int subclass; don't accept true as a token limit
+        if not isinstance(value, types_) or (isinstance(value, bool) and bool not in types_):
+            raise ProviderConfigError(f"{where}: '{field_name}' must be {'/'.join(t.__name__ for t in types_)}")
+        if isinstance(value, str) and not value.strip():
+            raise ProviderConfigError(f"{where}: '{field_name}' must not be empty")
+        if isinstance(value, (int, float)) and not isinstance(value, bool) and value < 0:
+            raise ProviderConfigError(f"{where}: '{field_name}' must not be negative")
+        values[attribute] = value
+
+    if not values['base_url'].startswith(('http://', 'https://')):
+        raise ProviderConfigError(f"{where}: base_url must be an http(s) URL")
+    for field_name in ('context_tokens', 'requests_per_minute', 'tokens_per_minute', 'max_in_flight'):
+        if entry.get(field_name) == 0:
+            raise ProviderConfigError(f"{where}: '{field_name}' must be positive; omit it for no limit")
+
+    key = str(entry.get('key', position))
+    return key, ModelConfig(**values)
+
+def parse_providers(data: dict, source: str = '<providers>') -> Dict[str, ModelConfig]:
+    """Validate a decoded provider file into {key: ModelConfig}, keeping file order"""
+    entries = data.get('providers') if isinstance(data, dict) else None
+    if not isinstance(entries, list) or not entries:
+        raise ProviderConfigError(f"{source}: expected a non-empty [[providers]] list")
+    models: Dict[str, ModelConfig] = {}
+    names = set()
+    for position, entry in enumerate(entries, start=1):
+        try:
+            key, config = _parse_entry(position, entry)
+        except ProviderConfigError as e:
+            raise ProviderConfigError(f"{source}: {e}") from None
+        if key in models:
+            raise ProviderConfigError(f"{source}: duplicate provider key '{key}'")
+        if config.name in names:
+            raise ProviderConfigError(f"{source}: duplicate provider name '{config.name}'")
+        names.add(config.name)
+        models[key] = config
+    return models
+
+class ProviderRegistry(Mapping):
+    """Read-only {key: ModelConfig} view of a provider file that reloads when the file changes"""
+
+    def __init__(self, path: str, check_interval: float = 2.0):
+        self.path = path
+        self.check_interval = check_interval
+        self._lock = threading.Lock()
+        self._models: Dict[str, ModelConfig] = {}
+        self._mtime: Optional[int] = None
+        self._checked_at = 0.0
+        # Fail loudly at startup; later bad edits only log and keep the last good config
+        self._load(self._stat())
+
+    def _stat(self) -> int:
+        try:
+            return os.stat(self.path).st_mtime_ns
+        except OSError as e:
+            raise ProviderConfigError(f"Cannot read provider file {self.path}: {e}") from None
+
+    def _load(self, mtime: int) -> None:
+        try:
+            data = _read(self.path)
+        except ProviderConfigError:
+            raise
+        except Exception as e:
+            raise ProviderConfigError(f"{self.path}: {e}") from None
+        models = parse_providers(data, self.path)
+        # Keep the existing objects for unchanged entries so identity checks and caches stay valid
+        for key, config in models.items():
+            if self._models.get(key) == config:
+                models[key] = self._models[key]
+        self._models = models
+        self._mtime = mtime
+        logger.info(f"Loaded {len(models)} providers from {self.path}")
+
+    def refresh(self, force: bool = False) -> Dict[str, ModelConfig]:
+        """Reload if the file changed since the last check; returns the current providers"""
+        now = time.monotonic()
+        if not force and now - self._checked_at < self.check_interval:
+            return self._models
+        with self._lock:
+            self._checked_at = now
+            try:
+                mtime = self._stat()
+                if force or mtime != self._mtime:
+                    self._load(mtime)
+            except ProviderConfigError as e:
+                logger.error(f"Provider file not reloaded, keeping the previous providers: {e}")
+        return self._models
+
+    def __getitem__(self, key: str) -> ModelConfig:
+        return self.refresh()[key]
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(list(self.refresh()))
+
+    def __len__(self) -> int:
+        return len(self.refresh())
+
+    # One snapshot per call, so a reload can't change the providers mid-iteration
+    def keys(self):
+        return self.refresh().keys()
+
+    def values(self):
+        return self.refresh().values()
+
+    def items(self):
+        return self.refresh().items()
+
+    def by_name(self, name: str) -> Optional[ModelConfig]:
+        return next((c for c in self.refresh().values() if c.name == name), None)
+
+    def configs(self) -> List[ModelConfig]:
+        return list(self.refresh().values())
+
+_default_registry: Optional[ProviderRegistry] = None
+_default_lock = threading.Lock()
+
+def default_registry() -> ProviderRegistry:
+    """Process-wide registry at PROVIDERS_FILE (default providers.toml next to this module)"""
+    global _default_registry
+    with _default_lock:
+        if _default_registry is None:
+            _default_registry = ProviderRegistry(os.getenv('PROVIDERS_FILE', DEFAULT_PATH))
+        return _default_registry
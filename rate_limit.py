@@ -0,0 +1,272 @@
+import asyncio
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections import deque
+from contextlib import asynccontextmanager, contextmanager
+from typing import Deque, Dict, Optional, Tuple
+
+'''
+Client-side rate limiting per provider.
+
+Each provider gets a ProviderLimiter built from its ModelConfig: a token
+bucket for requests/minute, one for tokens/minute and a cap on requests in
+flight. Limiters are process-wide, so every thread, manager and event loop
+in the process shares them. Set RATE_LIMIT_DB to a SQLite path to also share
+the buckets between worker processes on the same host.
+'''
+
+logger = logging.getLogger(__name__)
+
+# Shortest sleep between bucket checks
+POLL_INTERVAL = 0.05
+
+class SQLiteBucketStore:
+    """Bucket state in a SQLite file so several processes draw from one budget"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._local = threading.local()
+        conn = self._conn()
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS buckets ("
+            "name TEXT PRIMARY KEY, tokens REAL NOT NULL, updated_at REAL NOT NULL)"
+        )
+        conn.commit()
+
+    def _conn(self) -> sqlite3.Connection:
+        # sqlite3 connections are per thread; isolation_level=None so we control transactions
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+        return conn
+
+    def take(self, name: str, capacity: float, rate: float, amount: float, force: bool = False) -> float:
+        """Atomically refill and try to take amount; returns seconds to wait (0 when taken)"""
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            now = time.time()
+            row = conn.execute("SELECT tokens, updated_at FROM buckets WHERE name = ?", (name,)).fetchone()
+            tokens = capacity if row is None else min(capacity, row[0] + (now - row[1]) * rate)
+            if tokens >= amount or force:
+                tokens -= amount
+                wait = 0.0
+            else:
+                wait = (amount - tokens) / rate
+            conn.execute(
+                "INSERT OR REPLACE INTO buckets (name, tokens, updated_at) VALUES (?, ?, ?)",
+                (name, tokens, now),
+            )
+            conn.execute("COMMIT")
+            return wait
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+class TokenBucket:
+    """Token bucket refilling at rate per second up to capacity"""
+
+    def __init__(self, name: str, capacity: float, rate: float, store: Optional[SQLiteBucketStore] = None):
+        self.name = name
+        self.capacity = capacity
+        self.rate = rate
+        self.store = store
+        self._tokens = capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _take(self, amount: float, force: bool = False) -> float:
+        # A request bigger than the whole bucket could never run, so cap it
+        amount = min(amount, self.capacity)
+        if self.store is not None:
+            return self.store.take(self.name, self.capacity, self.rate, amount, force)
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            if self._tokens >= amount or force:
+                self._tokens -= amount
+                return 0.0
+            return (amount - self._tokens) / self.rate
+
+    def acquire(self, amount: float = 1) -> float:
+        """Block until amount is available; returns seconds spent waiting"""
+        waited = 0.0
+        while True:
+            wait = self._take(amount)
+            if wait <= 0:
+                return waited
+            wait = max(wait, POLL_INTERVAL)
+            time.sleep(wait)
+            waited += wait
+
+    async def _atake(self, amount: float, force: bool = False) -> float:
+        if self.store is not None:
+            # SQLite may wait on another process's lock (BEGIN IMMEDIATE); keep that off the event loop
+            return await asyncio.to_thread(self._take, amount, force)
+        return self._take(amount, force)
+
+    async def aacquire(self, amount: float = 1) -> float:
+        """Async acquire; waits on the event loop instead of blocking a thread"""
+        waited = 0.0
+        while True:
+            wait = await self._atake(amount)
+            if wait <= 0:
+                return waited
+            wait = max(wait, POLL_INTERVAL)
+            await asyncio.sleep(wait)
+            waited += wait
+
+    def debit(self, amount: float) -> None:
+        """Charge usage found out after the fact; may leave the bucket in debt"""
+        if amount > 0:
+            self._take(amount, force=True)
+
+    async def adebit(self, amount: float) -> None:
+        if amount > 0:
+            await self._atake(amount, force=True)
+
+class InFlightCap:
+    """Process-wide cap on concurrent requests for threads and event loops alike
+
+    Threads wait on a condition variable; coroutines wait on a future that
+    release() resolves through their own loop, so neither side polls.
+    """
+
+    def __init__(self, limit: int):
+        self.limit = limit
+        self._active = 0
+        self._cond = threading.Condition()
+        self._waiters: Deque[Tuple[asyncio.AbstractEventLoop, asyncio.Future]] = deque()
+
+    def acquire(self) -> None:
+        with self._cond:
+            self._cond.wait_for(lambda: self._active < self.limit)
+            self._active += 1
+
+    async def aacquire(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            with self._cond:
+                if self._active < self.limit:
+                    self._active += 1
+                    return
+                waiter = loop.create_future()
+                self._waiters.append((loop, waiter))
+            try:
+                await waiter
+            except asyncio.CancelledError:
+                with self._cond:
+                    if (loop, waiter) in self._waiters:
+                        self._waiters.remove((loop, waiter))
+                    elif self._active < self.limit:
+                        # We were woken for a free slot we won't take; pass it on
+                        self._wake_one()
+                raise
+
+    def release(self) -> None:
+        with self._cond:
+            self._active -= 1
+            self._wake_one()
+
+    def _wake_one(self) -> None:
+        # Called with the lock held: wake one thread and one coroutine; whoever loses re-waits
+        self._cond.notify()
+        while self._waiters:
+            loop, waiter = self._waiters.popleft()
+            if not loop.is_closed():
+                loop.call_soon_threadsafe(lambda waiter=waiter: waiter.done() or waiter.set_result(None))
+                return
+
+class ProviderLimiter:
+    """Requests/minute, tokens/minute and in-flight cap for one provider"""
+
+    def __init__(self, name: str, requests_per_minute: Optional[int] = None,
+                 tokens_per_minute: Optional[int] = None, max_in_flight: Optional[int] = None,
+                 store: Optional[SQLiteBucketStore] = None):
+        self.name = name
+        self.requests = TokenBucket(f"{name}:rpm", requests_per_minute, requests_per_minute / 60, store) \
+            if requests_per_minute else None
+        self.tokens = TokenBucket(f"{name}:tpm", tokens_per_minute, tokens_per_minute / 60, store) \
+            if tokens_per_minute else None
+        # Shared by threads and by every event loop in the process
+        self.in_flight = InFlightCap(max_in_flight) if max_in_flight else None
+
+    @contextmanager
+    def limit(self, tokens: int = 0):
+        """Wait for rate budget and an in-flight slot for one request"""
+        waited = 0.0
+        if self.requests is not None:
+            waited += self.requests.acquire(1)
+        if self.tokens is not None and tokens:
+            waited += self.tokens.acquire(tokens)
+        if self.in_flight is not None:
+            self.in_flight.acquire()
+        if waited:
+            logger.info(f"{self.name}: throttled for {waited:.2f}s by client-side rate limit")
+        try:
+            yield
+        finally:
+            if self.in_flight is not None:
+                self.in_flight.release()
+
+    @asynccontextmanager
+    async def alimit(self, tokens: int = 0):
+        """Async version of limit()"""
+        waited = 0.0
+        if self.requests is not None:
+            waited += await self.requests.aacquire(1)
+        if self.tokens is not None and tokens:
+            waited += await self.tokens.aacquire(tokens)
+        if self.in_flight is not None:
+            await self.in_flight.aacquire()
+        if waited:
+            logger.info(f"{self.name}: throttled for {waited:.2f}s by client-side rate limit")
+        try:
+            yield
+        finally:
+            if self.in_flight is not None:
+                self.in_flight.release()
+
+    def record_usage(self, estimated: int, actual: int) -> None:
+        """Charge the difference when the real token count exceeds the estimate"""
+        if self.tokens is not None and actual > estimated:
+            self.tokens.debit(actual - estimated)
+
+    async def arecord_usage(self, estimated: int, actual: int) -> None:
+        """Async record_usage, for callers on an event loop"""
+        if self.tokens is not None and actual > estimated:
+            await self.tokens.adebit(actual - estimated)
+
+_limiters: Dict[str, Tuple[tuple, ProviderLimiter]] = {}
+_limiters_lock = threading.Lock()
+_store: Optional[SQLiteBucketStore] = None
+
+def limiter_for(config) -> ProviderLimiter:
+    """Process-wide limiter for a ModelConfig, created from its limit fields"""
+    global _store
+    limits = (getattr(config, 'requests_per_minute', None),
+              getattr(config, 'tokens_per_minute', None),
+              getattr(config, 'max_in_flight', None))
+    with _limiters_lock:
+        cached = _limiters.get(config.name)
+        # Rebuilt when the provider file changes a limit; calls already holding the old limiter finish on it
+        if cached is None or cached[0] != limits:
+            path = os.getenv('RATE_LIMIT_DB')
+            if path and _store is None:
+                _store = SQLiteBucketStore(path)
+            limiter = ProviderLimiter(
+                config.name,
+                requests_per_minute=limits[0],
+                tokens_per_minute=limits[1],
+                max_in_flight=limits[2],
+                store=_store,
+            )
+            cached = (limits, limiter)
+            _limiters[config.name] = cached
+        return cached[1]
@@ -0,0 +1,237 @@
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from dataclasses import dataclass, asdict
+from typing import Dict, List, Optional
+
+'''
+Exact-match response cache for chat completions.
+
+Keys are a canonical hash of the model config and the full message list, so
+only byte-for-byte identical requests to the same model are served from the
+cache. Two tiers are provided: an in-memory LRU with TTL, and an optional
+SQLite file that survives restarts. TieredCache stacks them.
+'''
+
+logger = logging.getLogger(__name__)
+
+def cache_key(config, messages: List[Dict[str, str]]) -> str:
+    """Canonical hash of (model config, messages)"""
+    payload = {
+        'base_url': config.base_url,
+        'model': config.model_name,
+        'messages': messages,
+    }
+    canonical = json.dumps(payload, sort_keys=True, separators=(',', ':'), ensure_ascii=False)
+    return hashlib.sha256(canonical.encode('utf-8')).hexdigest()
+
+@dataclass
+class CacheStats:
+    '''Hit/miss counters for a cache tier'''
+    hits: int = 0
+    misses: int = 0
+    evictions: int = 0
+    expirations: int = 0
+
+    @property
+    def hit_rate(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+class ResponseCache(ABC):
+    """Interface for response caches; subclass and implement _get/_set/clear"""
+
+    def __init__(self):
+        self._stats = CacheStats()
+        self._stats_lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[str]:
+        value = self._get(key)
+        with self._stats_lock:
+            if value is None:
+                self._stats.misses += 1
+            else:
+                self._stats.hits += 1
+        return value
+
+    def set(self, key: str, value: str) -> None:
+        self._set(key, value)
+
+    @abstractmethod
+    def _get(self, key: str) -> Optional[str]:
+        ...
+
+    @abstractmethod
+    def _set(self, key: str, value: str) -> None:
+        ...
+
+    @abstractmethod
+    def clear(self) -> None:
+        ...
+
+    def stats(self) -> Dict[str, float]:
+        with self._stats_lock:
+            snapshot = asdict(self._stats)
+            snapshot['hit_rate'] = self._stats.hit_rate
+            return snapshot
+
+class MemoryCache(ResponseCache):
+    """In-memory LRU cache with per-entry TTL"""
+
+    def __init__(self, max_entries: int = 1024, ttl: Optional[float] = 3600.0):
+        super().__init__()
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries: 'OrderedDict[str, tuple]' = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _get(self, key: str) -> Optional[str]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            value, expires_at = entry
+            if expires_at is not None and expires_at < time.monotonic():
+                del self._entries[key]
+                self._stats.expirations += 1
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def _set(self, key: str, value: str) -> None:
+        expires_at = time.monotonic() + self.ttl if self.ttl else None
+        with self._lock:
+            self._entries[key] = (value, expires_at)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self._stats.evictions += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+class SQLiteCache(ResponseCache):
+    """Disk-backed cache in a SQLite file, shared across restarts and processes"""
+
+    def __init__(self, path: str, ttl: Optional[float] = 7 * 24 * 3600.0, max_entries: int = 100_000):
+        super().__init__()
+        self.path = path
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS responses ("
+            "key TEXT PRIMARY KEY, value TEXT NOT NULL, created_at REAL NOT NULL)"
+        )
+        self._conn.commit()
+        self._writes = 0
+
+    def _get(self, key: str) -> Optional[str]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value, created_at FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            value, created_at = row
+            if self.ttl is not None and created_at + self.ttl < time.time():
+                self._conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+                self._conn.commit()
+                self._stats.expirations += 1
+                return None
+            return value
+
+    def _set(self, key: str, value: str) -> None:
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO responses (key, value, created_at) VALUES (?, ?, ?)",
+                (key, value, time.time()),
+            )
+            self._conn.commit()
+            self._writes += 1
+            # Pruning scans the table, so only do it every so often
+            if self._writes % 100 == 0:
+                self._prune()
+
+    def _prune(self) -> None:
+        if self.ttl is not None:
+            self._conn.execute("DELETE FROM responses WHERE created_at < ?", (time.time() - self.ttl,))
+        cursor = self._conn.execute(
+            "DELETE FROM responses WHERE key IN ("
+            "SELECT key FROM responses ORDER BY created_at DESC LIMIT -1 OFFSET ?)",
+            (self.max_entries,),
+        )
+        self._stats.evictions += max(cursor.rowcount, 0)
+        self._conn.commit()
+
+    def clear(self) -> None:
+        with self._lock:
+            self._conn.execute("DELETE FROM responses")
+            self._conn.commit()
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+class TieredCache(ResponseCache):
+    """Memory tier in front of an optional disk tier; disk hits are promoted"""
+
+    def __init__(self, memory: MemoryCache, disk: Optional[ResponseCache] = None):
+        super().__init__()
+        self.memory = memory
+        self.disk = disk
+
+    def _get(self, key: str) -> Optional[str]:
+        value = self.memory.get(key)
+        if value is None and self.disk is not None:
+            value = self.disk.get(key)
+            if value is not None:
+                self.memory.set(key, value)
+        return value
+
+    def _set(self, key: str, value: str) -> None:
+        self.memory.set(key, value)
+        if self.disk is not None:
+            self.disk.set(key, value)
+
+    def clear(self) -> None:
+        self.memory.clear()
+        if self.disk is not None:
+            self.disk.clear()
+
+    def stats(self) -> Dict[str, float]:
+        snapshot = super().stats()
+        snapshot['memory'] = self.memory.stats()
+        if self.disk is not None:
+            snapshot['disk'] = self.disk.stats()
+        return snapshot
+
+_shared_cache: Optional[TieredCache] = None
+_shared_lock = threading.Lock()
+
+def shared_cache() -> TieredCache:
+    """Process-wide cache; set RESPONSE_CACHE_PATH to add the SQLite tier"""
+    global _shared_cache
+    with _shared_lock:
+        if _shared_cache is None:
+            memory = MemoryCache(
+                max_entries=int(os.getenv('RESPONSE_CACHE_MAX_ENTRIES', '1024')),
+                ttl=float(os.getenv('RESPONSE_CACHE_TTL', '3600')),
+            )
+            path = os.getenv('RESPONSE_CACHE_PATH')
+            disk = SQLiteCache(path) if path else None
+            _shared_cache = TieredCache(memory, disk)
+            logger.info(f"Response cache enabled (disk tier: {path or 'off'})")
+        return _shared_cache
@@ -0,0 +1,412 @@
+import asyncio
+import logging
+import os
+import random
+import threading
+import time
+from dataclasses import dataclass
+from typing import AsyncIterator, Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+from adaptive_routing import health_table
+from client_registry import get_async_client, get_client
+from context_window import MESSAGE_OVERHEAD, count_tokens
+from metrics import CallMetrics, record as record_metrics
+from rate_limit import limiter_for
+
+'''
+Provider routing with retries, circuit breakers and failover.
+
+ProviderRouter takes ModelConfigs in preference order. Each call tries the
+first provider whose circuit is closed, retrying 429/5xx/timeouts with
+jittered exponential backoff (honouring Retry-After), then fails over to the
+next provider. When everything fails a RoutingError is raised carrying one
+structured CompletionError per attempt, instead of an "Error: ..." string.
+Every attempt first waits on the provider's client-side rate limiter.
+An optional selector (see adaptive_routing) reorders the providers per request.
+'''
+
+logger = logging.getLogger(__name__)
+
+RETRYABLE_STATUS = {408, 409, 429, 500, 502, 503, 504}
+
+class CompletionError(Exception):
+    """One failed attempt against one provider"""
+
+    def __init__(self, provider: str, message: str, status_code: Optional[int] = None,
+                 retryable: bool = False, retry_after: Optional[float] = None):
+        super().__init__(message)
+        self.provider = provider
+        self.message = message
+        self.status_code = status_code
+        self.retryable = retryable
+        self.retry_after = retry_after
+
+    def __str__(self) -> str:
+        status = f" [{self.status_code}]" if self.status_code else ""
+        return f"{self.provider}{status}: {self.message}"
+
+class RoutingError(Exception):
+    """Raised when every provider (and every retry) failed"""
+
+    def __init__(self, attempts: List[CompletionError]):
+        self.attempts = attempts
+        # Text already streamed to the caller before the failure, if any
+        self.partial_response = ""
+        last = attempts[-1] if attempts else "no providers available"
+        super().__init__(f"All providers failed after {len(attempts)} attempt(s); last error: {last}")
+
+    @property
+    def last(self) -> Optional[CompletionError]:
+        return self.attempts[-1] if self.attempts else None
+
+def _retry_after(headers) -> Optional[float]:
+    if not headers:
+        return None
+    value = headers.get('retry-after-ms')
+    if value:
+        try:
+            return float(value) / 1000
+        except ValueError:
+            pass
+    value = headers.get('retry-after')
+    if value:
+        try:
+            return float(value)
+        except ValueError:
+            return None
+    return None
+
+def classify(error: Exception, provider: str) -> CompletionError:
+    """Turn an SDK exception into a structured CompletionError"""
+    import openai
+
+    if isinstance(error, CompletionError):
+        return error
+    if isinstance(error, openai.APIStatusError):
+        status = error.status_code
+        return CompletionError(
+            provider, str(error.message), status,
+            retryable=status in RETRYABLE_STATUS or status >= 500,
+            retry_after=_retry_after(error.response.headers),
+        )
+    if isinstance(error, (openai.APITimeoutError, openai.APIConnectionError)):
+        return CompletionError(provider, str(error), retryable=True)
+    return CompletionError(provider, str(error))
+
+@dataclass
+class RetryPolicy:
+    '''How long to keep trying one provider before failing over'''
+    max_attempts: int = 3
+    base_delay: float = 0.5
+    max_delay: float = 20.0
+
+    def delay(self, attempt: int, error: CompletionError) -> Optional[float]:
+        """Seconds to wait before retrying, or None to stop retrying this provider"""
+        if not error.retryable or attempt + 1 >= self.max_attempts:
+            return None
+        if error.retry_after is not None:
+            # A provider asking for a long pause is better served by failing over
+            return error.retry_after if error.retry_after <= self.max_delay else None
+        # Full jitter: spread retries out so clients don't stampede together
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+
+class CircuitBreaker:
+    """Stops sending traffic to a provider after repeated failures"""
+
+    def __init__(self, failure_threshold: int = 5, recovery_timeout: float = 30.0):
+        self.failure_threshold = failure_threshold
+        self.recovery_timeout = recovery_timeout
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at >= self.recovery_timeout:
+            return "half_open"
+        return "open"
+
+    def allow(self) -> bool:
+        """Closed and half-open circuits let a request through"""
+        return self.state != "open"
+
+    def record_success(self) -> None:
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self.failures += 1
+            # A failed probe in half-open state re-opens immediately
+            if self.failures >= self.failure_threshold or self.opened_at is not None:
+                self.opened_at = time.monotonic()
+
+_breakers: Dict[str, CircuitBreaker] = {}
+_breakers_lock = threading.Lock()
+
+def breaker_for(provider: str) -> CircuitBreaker:
+    """Process-wide circuit breaker per provider, shared by every router"""
+    with _breakers_lock:
+        if provider not in _breakers:
+            _breakers[provider] = CircuitBreaker()
+        return _breakers[provider]
+
+class _RouterBase:
+    def __init__(self, configs: Sequence, retry_policy: Optional[RetryPolicy] = None,
+                 selector: Optional[Callable[[Sequence, int], List]] = None):
+        if not configs:
+            raise ValueError("ProviderRouter needs at least one model config")
+        self.configs = list(configs)
+        self.retry_policy = retry_policy or RetryPolicy()
+        # selector(configs, prompt_tokens) -> configs in the order to try; None keeps preference order
+        self.selector = selector
+        self.last_provider: Optional[str] = None
+        self.last_metrics: Optional[CallMetrics] = None
+
+    def _candidates(self, attempts: List[CompletionError], prompt_tokens: int = 0) -> Iterator[Tuple[object, str]]:
+        """Yield (config, api_key) for providers that are configured and not tripped"""
+        configs = self.selector(self.configs, prompt_tokens) if self.selector is not None else self.configs
+        for config in configs:
+            api_key = os.getenv(config.api_key_env)
+            if not api_key:
+                attempts.append(CompletionError(config.name, f"API key {config.api_key_env} not set"))
+                continue
+            if not breaker_for(config.name).allow():
+                attempts.append(CompletionError(config.name, "Circuit open, skipping provider"))
+                continue
+            yield config, api_key
+
+    def _failed(self, config, error: Exception, attempt: int, attempts: List[CompletionError]) -> Optional[float]:
+        """Record a failure; return the retry delay or None to move to the next provider"""
+        failure = classify(error, config.name)
+        attempts.append(failure)
+        # Only provider-side trouble counts against the circuit, not bad requests
+        if failure.retryable:
+            breaker_for(config.name).record_failure()
+            health_table().record_failure(config.name)
+        delay = self.retry_policy.delay(attempt, failure)
+        logger.warning(f"{failure} (attempt {attempt + 1}, "
+                       f"{'retrying in %.2fs' % delay if delay is not None else 'failing over'})")
+        return delay
+
+    @staticmethod
+    def _estimate_tokens(messages: List[Dict[str, str]]) -> int:
+        """Prompt size charged against the tokens/minute bucket before sending"""
+        return sum(count_tokens(m.get('content') or '') + MESSAGE_OVERHEAD for m in messages)
+
+    @staticmethod
+    def _usage_tokens(usage) -> int:
+        return getattr(usage, 'total_tokens', 0) or 0
+
+    @staticmethod
+    def _cached_tokens(usage) -> Optional[int]:
+        """Prompt tokens the provider served from its prefix cache, when it reports them"""
+        details = getattr(usage, 'prompt_tokens_details', None)
+        cached = getattr(details, 'cached_tokens', None) if details is not None else None
+        if cached is None:
+            # DeepSeek-style field name
+            cached = getattr(usage, 'prompt_cache_hit_tokens', None)
+        return cached
+
+    @staticmethod
+    def _stream_kwargs(config, kwargs: Dict) -> Dict:
+        """Ask for a final usage chunk on providers that support it"""
+        if getattr(config, 'stream_usage', False) and 'stream_options' not in kwargs:
+            return {**kwargs, 'stream_options': {'include_usage': True}}
+        return kwargs
+
+    def _emit(self, config, stream: bool, start: float, retries: int, usage=None,
+              ttft: Optional[float] = None, error: Optional[str] = None) -> None:
+        """Record metrics for one routed call"""
+        metrics = CallMetrics(
+            provider=config.name if config is not None else "none",
+            model=config.model_name if config is not None else "none",
+            stream=stream,
+            latency=time.perf_counter() - start,
+            ttft=ttft,
+            prompt_tokens=getattr(usage, 'prompt_tokens', None),
+            completion_tokens=getattr(usage, 'completion_tokens', None),
+            cached_prompt_tokens=self._cached_tokens(usage),
+            retries=retries,
+            error=error,
+        )
+        self.last_metrics = metrics
+        record_metrics(metrics)
+
+    def _succeeded(self, config) -> None:
+        breaker_for(config.name).record_success()
+        self.last_provider = config.name
+
+    def _exhausted(self, attempts: List[CompletionError], stream: bool, start: float, retries: int) -> RoutingError:
+        error = RoutingError(attempts)
+        last_config = self.configs[-1] if not attempts else next(
+            (c for c in self.configs if c.name == attempts[-1].provider), self.configs[-1])
+        self._emit(last_config, stream, start, retries, error=str(error))
+        return error
+
+class ProviderRouter(_RouterBase):
+    """Synchronous routing over ModelConfigs in preference order"""
+
+    @staticmethod
+    def _client(config, api_key: str):
+        # The router does its own retries, so turn off the SDK's built-in ones
+        return get_client(config.base_url, api_key).with_options(max_retries=0)
+
+    def complete(self, messages: List[Dict[str, str]], **kwargs) -> str:
+        """Return the first successful completion text, or raise RoutingError"""
+        attempts: List[CompletionError] = []
+        estimate = self._estimate_tokens(messages)
+        start = time.perf_counter()
+        retries = 0
+        for config, api_key in self._candidates(attempts, estimate):
+            client = self._client(config, api_key)
+            limiter = limiter_for(config)
+            for attempt in range(self.retry_policy.max_attempts):
+                try:
+                    with limiter.limit(estimate):
+                        response = client.chat.completions.create(
+                            model=config.model_name, messages=messages, **kwargs)
+                except Exception as e:
+                    retries += 1
+                    delay = self._failed(config, e, attempt, attempts)
+                    if delay is None:
+                        break
+                    time.sleep(delay)
+                else:
+                    # Outside the try: a failing metrics hook is not a provider failure
+                    limiter.record_usage(estimate, self._usage_tokens(response.usage))
+                    self._succeeded(config)
+                    self._emit(config, False, start, retries, usage=response.usage)
+                    return response.choices[0].message.content
+        raise self._exhausted(attempts, False, start, retries)
+
+    def stream(self, messages: List[Dict[str, str]], **kwargs) -> Iterator:
+        """Yield raw stream chunks; failover is only possible before the first chunk"""
+        attempts: List[CompletionError] = []
+        estimate = self._estimate_tokens(messages)
+        start = time.perf_counter()
+        retries = 0
+        for config, api_key in self._candidates(attempts, estimate):
+            client = self._client(config, api_key)
+            limiter = limiter_for(config)
+            for attempt in range(self.retry_policy.max_attempts):
+                started = False
+                ttft, usage = None, None
+                try:
+                    # Hold the in-flight slot until the stream is fully read
+                    with limiter.limit(estimate):
+                        stream = client.chat.completions.create(
+                            model=config.model_name, messages=messages, stream=True,
+                            **self._stream_kwargs(config, kwargs))
+                        try:
+                            for chunk in stream:
+                                if getattr(chunk, 'usage', None):
+                                    usage = chunk.usage
+                                if ttft is None and chunk.choices and chunk.choices[0].delta.content:
+                                    ttft = time.perf_counter() - start
+                                if not started:
+                                    started = True
+                                    self.last_provider = config.name
+                                yield chunk
+                        finally:
+                            # Also runs when the consumer stops early, returning the connection to the pool
+                            stream.close()
+                except Exception as e:
+                    retries += 1
+                    delay = self._failed(config, e, attempt, attempts)
+                    if started:
+                        raise self._exhausted(attempts, True, start, retries) from e
+                    if delay is None:
+                        break
+                    time.sleep(delay)
+                else:
+                    limiter.record_usage(estimate, self._usage_tokens(usage))
+                    self._succeeded(config)
+                    self._emit(config, True, start, retries, usage=usage, ttft=ttft)
+                    return
+        raise self._exhausted(attempts, True, start, retries)
+
+class AsyncProviderRouter(_RouterBase):
+    """Async routing over ModelConfigs in preference order"""
+
+    @staticmethod
+    def _client(config, api_key: str):
+        return get_async_client(config.base_url, api_key).with_options(max_retries=0)
+
+    async def complete(self, messages: List[Dict[str, str]], **kwargs) -> str:
+        """Return the first successful completion text, or raise RoutingError"""
+        attempts: List[CompletionError] = []
+        estimate = self._estimate_tokens(messages)
+        start = time.perf_counter()
+        retries = 0
+        for config, api_key in self._candidates(attempts, estimate):
+            client = self._client(config, api_key)
+            limiter = limiter_for(config)
+            for attempt in range(self.retry_policy.max_attempts):
+                try:
+                    async with limiter.alimit(estimate):
+                        response = await client.chat.completions.create(
+                            model=config.model_name, messages=messages, **kwargs)
+                except asyncio.CancelledError:
+                    raise
+                except Exception as e:
+                    retries += 1
+                    delay = self._failed(config, e, attempt, attempts)
+                    if delay is None:
+                        break
+                    await asyncio.sleep(delay)
+                else:
+                    await limiter.arecord_usage(estimate, self._usage_tokens(response.usage))
+                    self._succeeded(config)
+                    self._emit(config, False, start, retries, usage=response.usage)
+                    return response.choices[0].message.content
+        raise self._exhausted(attempts, False, start, retries)
+
+    async def stream(self, messages: List[Dict[str, str]], **kwargs) -> AsyncIterator:
+        """Yield raw stream chunks; failover is only possible before the first chunk"""
+        attempts: List[CompletionError] = []
+        estimate = self._estimate_tokens(messages)
+        start = time.perf_counter()
+        retries = 0
+        for config, api_key in self._candidates(attempts, estimate):
+            client = self._client(config, api_key)
+            limiter = limiter_for(config)
+            for attempt in range(self.retry_policy.max_attempts):
+                started = False
+                ttft, usage = None, None
+                try:
+                    async with limiter.alimit(estimate):
+                        stream = await client.chat.completions.create(
+                            model=config.model_name, messages=messages, stream=True,
+                            **self._stream_kwargs(config, kwargs))
+                        try:
+                            async for chunk in stream:
+                                if getattr(chunk, 'usage', None):
+                                    usage = chunk.usage
+                                if ttft is None and chunk.choices and chunk.choices[0].delta.content:
+                                    ttft = time.perf_counter() - start
+                                if not started:
+                                    started = True
+                                    self.last_provider = config.name
+                                yield chunk
+                        finally:
+                            await stream.close()
+                except asyncio.CancelledError:
+                    raise
+                except Exception as e:
+                    retries += 1
+                    delay = self._failed(config, e, attempt, attempts)
+                    if started:
+                        raise self._exhausted(attempts, True, start, retries) from e
+                    if delay is None:
+                        break
+                    await asyncio.sleep(delay)
+                else:
+                    await limiter.arecord_usage(estimate, self._usage_tokens(usage))
+                    self._succeeded(config)
+                    self._emit(config, True, start, retries, usage=usage, ttft=ttft)
+                    return
+        raise self._exhausted(attempts, True, start, retries)
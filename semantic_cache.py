@@ -0,0 +1,285 @@
+import hashlib
+import json
+import logging
+import os
+import re
+import threading
+import time
+from typing import Callable, Dict, List, Optional
+
+from response_cache import CacheStats
+
+
+'''
+Semantic response cache for near-duplicate prompts.
+
+The exact-match cache in response_cache only helps when a conversation is
+byte-for-byte identical. SemanticCache embeds the last user turn and looks
+for a previous question to the same model, asked after exactly the same
+system prompt and earlier turns, whose embedding is at least `threshold`
+cosine-similar; if one is found its answer is reused. Similarity alone
+can't tell "Convert 10 miles to km" from "Convert 20 miles to km" or
+"Should I take ibuprofen" from "Should I not take ibuprofen", so only
+questions with the same numbers and the same negations are compared at all.
+
+Embeddings are computed locally. The default HashingEmbedder hashes words,
+word pairs and character trigrams into a fixed-size vector, which catches
+rewordings that share most of their words and needs nothing beyond NumPy.
+Set SEMANTIC_CACHE_MODEL to a sentence-transformers model name to use that
+instead. Search is brute force over the matching entries; with hnswlib
+installed, a scope holding more than ann_threshold entries gets its own
+approximate index.
+'''
+
+logger = logging.getLogger(__name__)
+
+# numpy, imported only once a semantic cache is actually built, so that
+# importing this module (every CLI and Streamlit start) stays cheap
+np = None
+
+def _require_numpy():
+    global np
+    if np is None:
+        try:
+            import numpy
+        except ImportError: # The semantic cache is optional
+            raise ImportError("SemanticCache needs numpy: pip install numpy") from None
+        np = numpy
+    return np
+
+Embedder = Callable[[str], 'np.ndarray']
+
+_TOKEN = re.compile(r"\w+", re.UNICODE)
+_NUMBER = re.compile(r"\d+(?:[.,]\d+)*")
+_NEGATION = re.compile(r"\b(?:not|no|never|nor|none|nothing|nobody|neither|without|cannot)\b|n't\b", re.IGNORECASE)
+
+class HashingEmbedder:
+    """Feature-hashed bag of words, word pairs and character trigrams, L2-normalized"""
+
+    def __init__(self, dim: int = 1024):
+        _require_numpy()
+        self.dim = dim
+
+    def _bucket(self, feature: str) -> tuple:
+        digest = hashlib.blake2b(feature.encode('utf-8'), digest_size=8).digest()
+        value = int.from_bytes(digest, 'little')
+        # The top bit picks the sign, so colliding features tend to cancel out
+        return value % self.dim, 1.0 if value >> 63 else -1.0
+
+    def __call__(self, text: str) -> 'np.ndarray':
+        vector = np.zeros(self.dim, dtype=np.float32)
+        words = _TOKEN.findall(text.lower())
+        features = [f"w:{w}" for w in words]
+        features += [f"b:{a} {b}" for a, b in zip(words, words[1:])]
+        for word in words:
+            padded = f"#{word}#"
+            features += [f"c:{padded[i:i + 3]}" for i in range(len(padded) - 2)]
+        for feature in features:
+            index, sign = self._bucket(feature)
+            vector[index] += sign
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+def sentence_transformer_embedder(model_name: str) -> Embedder:
+    """Embedder backed by a local sentence-transformers model"""
+    from sentence_transformers import SentenceTransformer # Optional: better paraphrase matching
+
+    _require_numpy()
+    model = SentenceTransformer(model_name)
+    return lambda text: model.encode(text, normalize_embeddings=True).astype(np.float32)
+
+def _last_user_index(messages: List[Dict[str, str]]) -> Optional[int]:
+    for index in range(len(messages) - 1, -1, -1):
+        if messages[index].get('role') == 'user':
+            return index
+    return None
+
+def _scope(config, messages: List[Dict[str, str]], last_user: int) -> int:
+    """Answers are only shared between requests to the same model with the same conversation so far
+
+    Everything before the last user turn (system prompt and earlier turns)
+    must match exactly; only that last turn is compared by similarity.
+    Otherwise "Can you explain that in more detail?" would get the same
+    answer whatever "that" was. The last turn's numbers and number of
+    negations must match too, since swapping either barely moves the
+    embedding but changes the answer.
+    """
+    text = messages[last_user].get('content') or ''
+    history = json.dumps([[m.get('role'), m.get('content') or ''] for m in messages[:last_user]],
+                         ensure_ascii=False, separators=(',', ':'))
+    guard = f"{_NUMBER.findall(text)}|{len(_NEGATION.findall(text))}"
+    digest = hashlib.sha256(f"{config.base_url}\n{config.model_name}\n{history}\n{guard}".encode('utf-8')).digest()
+    return int.from_bytes(digest[:8], 'little', signed=True)
+
+class SemanticCache:
+    """Embedding-similarity cache of answers, bounded by max_entries with TTL and LRU eviction"""
+
+    def __init__(self, embedder: Optional[Embedder] = None, threshold: float = 0.85,
+                 max_entries: int = 10_000, ttl: Optional[float] = 24 * 3600.0,
+                 min_words: int = 3, ann_threshold: int = 20_000):
+        _require_numpy()
+        self.embedder = embedder or HashingEmbedder()
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.ttl = ttl
+        # "thanks" or "go on" depend entirely on the conversation; never answer those from the cache
+        self.min_words = min_words
+        self.ann_threshold = ann_threshold
+        self._lock = threading.Lock()
+        self._stats = CacheStats()
+        self._vectors: Optional['np.ndarray'] = None   # (max_entries, dim), allocated on first store
+        self._scopes = np.zeros(max_entries, dtype=np.int64)
+        self._expires = np.full(max_entries, np.inf)
+        self._last_used = np.zeros(max_entries)
+        self._occupied = np.zeros(max_entries, dtype=bool)
+        self._responses: List[Optional[str]] = [None] * max_entries
+        # scope -> approximate index over that scope's slots, for scopes past ann_threshold entries
+        self._ann: Dict[int, object] = {}
+
+    def _query(self, config, messages: List[Dict[str, str]]):
+        last_user = _last_user_index(messages)
+        if last_user is None:
+            return None, None
+        text = messages[last_user].get('content') or ''
+        if len(_TOKEN.findall(text)) < self.min_words:
+            return None, None
+        return _scope(config, messages, last_user), self.embedder(text)
+
+    def lookup(self, config, messages: List[Dict[str, str]]) -> Optional[str]:
+        """Cached answer to a similar enough question, or None"""
+        scope, vector = self._query(config, messages)
+        if vector is None:
+            return None
+        with self._lock:
+            slot = self._best_match(scope, vector)
+            if slot is None:
+                self._stats.misses += 1
+                return None
+            self._stats.hits += 1
+            self._last_used[slot] = time.monotonic()
+            return self._responses[slot]
+
+    def store(self, config, messages: List[Dict[str, str]], response: str) -> None:
+        """Remember response as the answer to the last user turn in messages"""
+        if not response:
+            return
+        scope, vector = self._query(config, messages)
+        if vector is None:
+            return
+        with self._lock:
+            if self._vectors is None:
+                self._vectors = np.zeros((self.max_entries, vector.shape[0]), dtype=np.float32)
+            slot = self._free_slot()
+            now = time.monotonic()
+            self._vectors[slot] = vector
+            self._scopes[slot] = scope
+            self._expires[slot] = now + self.ttl if self.ttl else np.inf
+            self._last_used[slot] = now
+            self._occupied[slot] = True
+            self._responses[slot] = response
+            self._index(slot)
+
+    def _best_match(self, scope: int, vector: 'np.ndarray') -> Optional[int]:
+        if self._vectors is None:
+            return None
+        now = time.monotonic()
+        expired = self._occupied & (self._expires <= now)
+        if expired.any():
+            self._release(np.flatnonzero(expired), expirations=True)
+
+        candidates = np.flatnonzero(self._occupied & (self._scopes == scope))
+        if candidates.size == 0:
+            return None
+        ann = self._ann.get(scope)
+        if ann is not None:
+            # Released slots are marked deleted, so every neighbour is a live slot of this scope
+            labels, _ = ann.knn_query(vector, k=min(16, int(candidates.size)))
+            candidates = labels[0].astype(np.int64)
+        similarities = self._vectors[candidates] @ vector
+        best = int(np.argmax(similarities))
+        return int(candidates[best]) if similarities[best] >= self.threshold else None
+
+    def _free_slot(self) -> int:
+        free = np.flatnonzero(~self._occupied)
+        if free.size:
+            return int(free[0])
+        # Full: evict the least recently used entry
+        slot = int(np.argmin(self._last_used))
+        self._release(np.array([slot]), expirations=False)
+        return slot
+
+    def _release(self, slots: 'np.ndarray', expirations: bool) -> None:
+        self._occupied[slots] = False
+        for slot in slots:
+            self._responses[slot] = None
+            ann = self._ann.get(int(self._scopes[slot]))
+            if ann is not None:
+                ann.mark_deleted(int(slot))
+        if expirations:
+            self._stats.expirations += len(slots)
+        else:
+            self._stats.evictions += len(slots)
+
+    def _index(self, slot: int) -> None:
+        """Keep the slot's scope index in step once that scope is big enough to need one"""
+        scope = int(self._scopes[slot])
+        ann = self._ann.get(scope)
+        if ann is None:
+            slots = np.flatnonzero(self._occupied & (self._scopes == scope))
+            if slots.size < self.ann_threshold:
+                return
+            try:
+                import hnswlib # Optional: approximate search for large stores
+            except ImportError:
+                return
+            ann = self._ann[scope] = hnswlib.Index(space='ip', dim=self._vectors.shape[1])
+            ann.init_index(max_elements=min(2 * slots.size, self.max_entries), ef_construction=200, M=16)
+            ann.set_ef(64)
+            ann.add_items(self._vectors[slots], slots)
+            logger.info(f"Semantic cache switched a scope to an approximate index at {slots.size} entries")
+            return
+        if ann.get_current_count() >= ann.get_max_elements():
+            ann.resize_index(min(2 * ann.get_max_elements(), self.max_entries))
+        # Labels are slots; re-adding a reused (deleted) slot replaces its old vector and undeletes it
+        ann.add_items(self._vectors[slot:slot + 1], [slot])
+
+    def clear(self) -> None:
+        with self._lock:
+            self._occupied[:] = False
+            self._responses = [None] * self.max_entries
+            self._ann = {}
+
+    def stats(self) -> Dict[str, float]:
+        with self._lock:
+            return {
+                'hits': self._stats.hits,
+                'misses': self._stats.misses,
+                'evictions': self._stats.evictions,
+                'expirations': self._stats.expirations,
+                'hit_rate': self._stats.hit_rate,
+                'entries': int(self._occupied.sum()),
+            }
+
+    def __len__(self) -> int:
+        return int(self._occupied.sum())
+
+_shared_semantic: Optional[SemanticCache] = None
+_shared_lock = threading.Lock()
+
+def shared_semantic_cache() -> Optional[SemanticCache]:
+    """Process-wide semantic cache when SEMANTIC_CACHE=1, otherwise None"""
+    global _shared_semantic
+    if os.getenv('SEMANTIC_CACHE', '0').lower() not in ('1', 'true', 'yes'):
+        return None
+    with _shared_lock:
+        if _shared_semantic is None:
+            model_name = os.getenv('SEMANTIC_CACHE_MODEL')
+            embedder = sentence_transformer_embedder(model_name) if model_name else None
+            _shared_semantic = SemanticCache(
+                embedder=embedder,
+                threshold=float(os.getenv('SEMANTIC_CACHE_THRESHOLD', '0.85')),
+                max_entries=int(os.getenv('SEMANTIC_CACHE_MAX_ENTRIES', '10000')),
+                ttl=float(os.getenv('SEMANTIC_CACHE_TTL', '86400')),
+            )
+            logger.info(f"Semantic cache enabled (embedder: {model_name or 'hashing'})")
+        return _shared_semantic
@@ -0,0 +1,528 @@
+import argparse
+import asyncio
+import hashlib
+import itertools
+import json
+import logging
+import multiprocessing
+import os
+import queue
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from dataclasses import dataclass
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional, Tuple
+
+from mainV02 import AIModelManager, AsyncAIModelManager, ModelConfig, configured_fallbacks, load_dotenv
+from prompt_builder import normalize_text, system_prompt
+from routing import RoutingError
+from client_registry import run_and_close
+from conversation_store import default_store
+from response_cache import shared_cache
+from semantic_cache import shared_semantic_cache
+
+'''
+Headless OpenAI-compatible gateway over AsyncAIModelManager.
+
+A front process serves POST /v1/chat/completions (streaming and not) and
+GET /v1/models, and hands each request to one of several worker processes,
+each running its own event loop of AsyncAIModelManagers. Other services
+can point any OpenAI SDK at it:
+
+    python serve.py --port 8000 --workers 4 --model 1
+    client = OpenAI(base_url="http://127.0.0.1:8000/v1", api_key="unused")
+
+Without a session the request is stateless: the messages sent are the whole
+conversation and any worker may answer it. With an X-Session-Id header the
+conversation lives on the gateway. The session id is hashed to a fixed
+worker, which keeps that session's context (and its trimming, caching and
+optional persistence) across requests. The client then only needs to send
+the new user message; sending a different system prompt starts the session
+over with the history given in that request.
+
+"model" may be a providers.toml key, provider name or model id; other
+OpenAI parameters (temperature, tools, ...) are not forwarded.
+'''
+
+logger = logging.getLogger(__name__)
+
+@dataclass
+class ServeSettings:
+    '''Gateway configuration, shared by the front process and every worker'''
+    default_model: str = '1'
+    workers: int = os.cpu_count() or 1
+    max_sessions: int = 1000         # per worker; least recently used sessions are dropped
+    session_ttl: float = 3600.0      # seconds a session may sit idle
+    max_in_flight: int = 64          # concurrent provider calls per worker
+    request_timeout: float = 600.0   # front process gives up waiting on a worker after this
+    persist: bool = False            # keep sessions in the conversation store across restarts
+
+class RequestError(ValueError):
+    """The client sent something the gateway can't serve (HTTP 400)"""
+
+def resolve_model(name: Optional[str], default: str) -> ModelConfig:
+    """Find a provider by providers.toml key, provider name or model id"""
+    models = AIModelManager.MODELS
+    name = name or default
+    if name in models:
+        return models[name]
+    for config in models.values():
+        if name.lower() == config.name.lower() or name == config.model_name:
+            return config
+    raise RequestError(f"Unknown model '{name}'")
+
+def session_worker(session_id: str, workers: int) -> int:
+    """Stable worker index for a session, the same in every process and across restarts"""
+    digest = hashlib.sha256(session_id.encode('utf-8')).digest()
+    return int.from_bytes(digest[:8], 'big') % workers
+
+def _validate_messages(messages) -> List[Dict[str, str]]:
+    if not isinstance(messages, list) or not messages:
+        raise RequestError("'messages' must be a non-empty list")
+    for m in messages:
+        if not isinstance(m, dict) or m.get('role') not in ('system', 'user', 'assistant'):
+            raise RequestError("Each message needs a role of system, user or assistant")
+        if not isinstance(m.get('content'), str):
+            raise RequestError("Only plain-text message content is supported")
+    return [{'role': m['role'], 'content': m['content']} for m in messages]
+
+# ---------------------------------------------------------------- worker side
+
+class _Worker:
+    """One worker process: an event loop serving jobs from the front process"""
+
+    def __init__(self, index: int, settings: ServeSettings, outbox):
+        self.index = index
+        self.settings = settings
+        self.outbox = outbox
+        # session id -> (manager, lock serializing that session's turns, last used)
+        self.sessions: 'OrderedDict[str, Tuple[AsyncAIModelManager, asyncio.Lock, float]]' = OrderedDict()
+        # Idle managers for stateless requests, per provider; each serves one request at a time
+        self.idle: Dict[str, List[AsyncAIModelManager]] = {}
+        self.semaphore = asyncio.Semaphore(settings.max_in_flight)
+        self.tasks = set()
+        self.store = None
+        self.cache = None
+        self.semantic_cache = None
+
+    async def run(self, inbox) -> None:
+        self.cache, self.semantic_cache = shared_cache(), shared_semantic_cache()
+        self.store = default_store() if self.settings.persist else None
+        loop = asyncio.get_running_loop()
+        logger.info(f"Worker {self.index} ready (pid {os.getpid()})")
+        while True:
+            job = await loop.run_in_executor(None, inbox.get)
+            if job is None:
+                break
+            task = asyncio.create_task(self.handle(job))
+            self.tasks.add(task)
+            task.add_done_callback(self.tasks.discard)
+        if self.tasks:
+            await asyncio.wait(self.tasks)
+
+    def _manager(self, config: ModelConfig, session_id: Optional[str] = None) -> AsyncAIModelManager:
+        store = self.store if session_id is not None else None
+        return AsyncAIModelManager(config, cache=self.cache, fallbacks=configured_fallbacks(config),
+                                   store=store, session_id=session_id if store is not None else None,
+                                   semantic_cache=self.semantic_cache)
+
+    def _checkout(self, config: ModelConfig) -> AsyncAIModelManager:
+        """An idle stateless manager for config, or a new one"""
+        idle = self.idle.get(config.name, [])
+        while idle:
+            manager = idle.pop()
+            # Dropped when the provider file changed this provider's config
+            if manager.config is config:
+                return manager
+        return self._manager(config)
+
+    def _checkin(self, manager: AsyncAIModelManager) -> None:
+        idle = self.idle.setdefault(manager.config.name, [])
+        if len(idle) < self.settings.max_in_flight:
+            idle.append(manager)
+
+    def _session(self, session_id: str, config: ModelConfig) -> Tuple[AsyncAIModelManager, asyncio.Lock]:
+        """The session's manager and lock, created (or resumed from the store) on first use"""
+        now = time.monotonic()
+        for stale in [sid for sid, (*_, used) in self.sessions.items() if now - used > self.settings.session_ttl]:
+            del self.sessions[stale]
+
+        entry = self.sessions.pop(session_id, None)
+        if entry is not None and entry[0].config is config:
+            manager, lock = entry[:2]
+        else:
+            manager = self._manager(config, session_id)
+            lock = entry[1] if entry is not None else asyncio.Lock()
+            if entry is not None and self.store is None:
+                # Switching models mid-session keeps the conversation
+                manager.context = entry[0].context
+        self.sessions[session_id] = (manager, lock, now)
+        while len(self.sessions) > self.settings.max_sessions:
+            self.sessions.popitem(last=False)
+        return manager, lock
+
+    def _sync_context(self, manager: AsyncAIModelManager, messages: List[Dict[str, str]]) -> None:
+        """Start the session over when it is new or the client changed the system prompt"""
+        system = messages[0]['content'] if messages[0]['role'] == 'system' else None
+        current = manager.context[0]['content'] if manager.context and manager.context[0]['role'] == 'system' else None
+        if current is None or (system is not None and normalize_text(system) != current):
+            manager.reset_context(system or system_prompt('polite'))
+            manager.add_turns(messages[1 if system is not None else 0:-1])
+
+    def _send(self, request_id: str, kind: str, payload) -> None:
+        self.outbox.put((request_id, kind, payload))
+
+    async def _run(self, request_id: str, manager: AsyncAIModelManager, job: Dict) -> Dict:
+        """Answer one job with manager, streaming deltas out; returns the 'done' payload"""
+        messages = job['messages']
+        content = None
+        # Usage is whatever this call appends to call_metrics; coalesced calls never touch the router
+        previous = manager.call_metrics[-1] if manager.call_metrics else None
+        if job['session']:
+            self._sync_context(manager, messages)
+            if job['stream']:
+                async for delta in manager.stream_response(messages[-1]['content']):
+                    self._send(request_id, 'delta', delta)
+            else:
+                content = await manager.get_response(messages[-1]['content'])
+        elif job['stream']:
+            async for delta in manager.stream_complete(messages):
+                self._send(request_id, 'delta', delta)
+        else:
+            content = await manager.complete(messages)
+
+        metrics = manager.call_metrics[-1] if manager.call_metrics else None
+        if metrics is previous:
+            metrics = None
+        return {
+            'content': content,
+            'usage': {
+                'prompt_tokens': metrics.prompt_tokens or 0,
+                'completion_tokens': metrics.completion_tokens or 0,
+                'total_tokens': (metrics.prompt_tokens or 0) + (metrics.completion_tokens or 0),
+            } if metrics is not None and not (metrics.cache_hit or metrics.coalesced) else None,
+        }
+
+    async def handle(self, job: Dict) -> None:
+        request_id = job['id']
+        try:
+            config = resolve_model(job['model'], self.settings.default_model)
+            if job['messages'][-1]['role'] != 'user':
+                raise RequestError("The last message must be from the user")
+            if job['session']:
+                manager, lock = self._session(job['session'], config)
+                # Wait for the session's turn before taking a slot, so a busy
+                # session's queued turns don't hold slots other sessions need
+                async with lock:
+                    async with self.semaphore:
+                        done = await self._run(request_id, manager, job)
+            else:
+                manager = self._checkout(config)
+                try:
+                    async with self.semaphore:
+                        done = await self._run(request_id, manager, job)
+                finally:
+                    self._checkin(manager)
+            self._send(request_id, 'done', done)
+        except RequestError as e:
+            self._send(request_id, 'error', (400, 'invalid_request_error', str(e)))
+        except RoutingError as e:
+            self._send(request_id, 'error', (502, 'upstream_error', str(e)))
+        except Exception as e:
+            logger.exception(f"Worker {self.index}: request {request_id} failed")
+            self._send(request_id, 'error', (500, 'server_error', str(e)))
+
+def _worker_main(index: int, settings: ServeSettings, inbox, outbox) -> None:
+    logging.basicConfig(level=logging.INFO, format=f"%(asctime)s worker-{index} %(levelname)s %(message)s")
+    load_dotenv()
+    try:
+        asyncio.run(run_and_close(_Worker(index, settings, outbox).run(inbox)))
+    except KeyboardInterrupt:
+        pass
+
+# ----------------------------------------------------------------- front side
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    gateway: 'Gateway' = None
+
+    def log_message(self, format, *args):
+        logger.debug(format % args)
+
+    def _send_json(self, status: int, payload: dict, headers: Optional[dict] = None) -> None:
+        body = json.dumps(payload).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _send_error(self, status: int, error_type: str, message: str) -> None:
+        self._send_json(status, {'error': {'message': message, 'type': error_type, 'code': status}})
+
+    def _write_chunk(self, data: bytes) -> None:
+        self.wfile.write(f"{len(data):X}\r\n".encode() + data + b"\r\n")
+        self.wfile.flush()
+
+    def do_GET(self):
+        path = self.path.rstrip('/')
+        if path.endswith('/models'):
+            self._send_json(200, {'object': 'list', 'data': [
+                {'id': config.model_name, 'object': 'model', 'created': 0, 'owned_by': config.name}
+                for config in AIModelManager.MODELS.values()]})
+        elif path == '/healthz':
+            alive = self.gateway.alive_workers()
+            self._send_json(200 if alive else 503, {'workers': len(self.gateway.processes), 'alive': alive})
+        else:
+            self._send_error(404, 'not_found', 'Not found')
+
+    def do_POST(self):
+        if not self.path.rstrip('/').endswith('/chat/completions'):
+            self._send_error(404, 'not_found', 'Not found')
+            return
+        try:
+            length = int(self.headers.get('Content-Length', 0))
+            request = json.loads(self.rfile.read(length) or b'{}')
+            messages = _validate_messages(request.get('messages'))
+            model = resolve_model(request.get('model'), self.gateway.settings.default_model).model_name
+        except (ValueError, json.JSONDecodeError) as e:
+            self._send_error(400, 'invalid_request_error', str(e))
+            return
+
+        session_id = self.headers.get('X-Session-Id') or None
+        stream = bool(request.get('stream'))
+        request_id, worker, replies = self.gateway.submit(session_id, request.get('model'), messages, stream)
+        headers = {'X-Worker': str(worker)}
+        if session_id:
+            headers['X-Session-Id'] = session_id
+        try:
+            if stream:
+                self._stream(request_id, replies, headers, request, model)
+            else:
+                self._complete(request_id, replies, headers, model)
+        finally:
+            self.gateway.forget(request_id)
+
+    def _next(self, replies: queue.Queue):
+        try:
+            return replies.get(timeout=self.gateway.settings.request_timeout)
+        except queue.Empty:
+            return 'error', (504, 'timeout', 'Worker did not answer in time')
+
+    def _complete(self, request_id: str, replies: queue.Queue, headers: dict, model: str) -> None:
+        kind, payload = self._next(replies)
+        if kind == 'error':
+            self._send_error(*payload)
+            return
+        self._send_json(200, {
+            'id': f"chatcmpl-{request_id}", 'object': 'chat.completion', 'created': int(time.time()),
+            'model': model,
+            'choices': [{'index': 0, 'finish_reason': 'stop',
+                         'message': {'role': 'assistant', 'content': payload['content']}}],
+            'usage': payload['usage'],
+        }, headers)
+
+    def _stream(self, request_id: str, replies: queue.Queue, headers: dict, request: dict, model: str) -> None:
+        kind, payload = self._next(replies)
+        if kind == 'error':
+            # Nothing streamed yet, so the client still gets a proper status code
+            self._send_error(*payload)
+            return
+
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/event-stream')
+        self.send_header('Transfer-Encoding', 'chunked')
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.end_headers()
+
+        created = int(time.time())
+
+        def event(choices, **extra):
+            chunk = {'id': f"chatcmpl-{request_id}", 'object': 'chat.completion.chunk', 'created': created,
+                     'model': model, 'choices': choices, **extra}
+            self._write_chunk(f"data: {json.dumps(chunk)}\n\n".encode('utf-8'))
+
+        event([{'index': 0, 'delta': {'role': 'assistant', 'content': ''}, 'finish_reason': None}])
+        while kind == 'delta':
+            event([{'index': 0, 'delta': {'content': payload}, 'finish_reason': None}])
+            kind, payload = self._next(replies)
+        if kind == 'error':
+            # Mid-stream failure: report it in-band, as OpenAI-compatible servers do
+            self._write_chunk(f"data: {json.dumps({'error': {'message': payload[2], 'type': payload[1]}})}\n\n".encode('utf-8'))
+        else:
+            event([{'index': 0, 'delta': {}, 'finish_reason': 'stop'}])
+            if (request.get('stream_options') or {}).get('include_usage') and payload['usage']:
+                event([], usage=payload['usage'])
+        self._write_chunk(b"data: [DONE]\n\n")
+        self._write_chunk(b"")
+
+class Gateway:
+    """Front HTTP server plus the worker processes behind it"""
+
+    # How often the dispatcher checks for dead workers while no replies arrive
+    HEALTH_CHECK_SECONDS = 1.0
+
+    def __init__(self, settings: Optional[ServeSettings] = None, host: str = "127.0.0.1", port: int = 8000):
+        self.settings = settings or ServeSettings()
+        # spawn: workers start clean, without the front's threads or client pools
+        self._mp = multiprocessing.get_context('spawn')
+        self.inboxes = [self._mp.Queue() for _ in range(self.settings.workers)]
+        self.outbox = self._mp.Queue()
+        self.processes: List[multiprocessing.Process] = [None] * self.settings.workers
+        self._generations = [0] * self.settings.workers
+        self._spawn_lock = threading.RLock()
+        # request id -> (worker index, worker generation, reply queue)
+        self._pending: Dict[str, Tuple[int, int, queue.Queue]] = {}
+        self._pending_lock = threading.Lock()
+        self._round_robin = itertools.count()
+        self._dispatcher: Optional[threading.Thread] = None
+        handler = type('Handler', (_Handler,), {'gateway': self})
+        self.httpd = ThreadingHTTPServer((host, port), handler)
+        self.httpd.daemon_threads = True
+
+    @property
+    def base_url(self) -> str:
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}/v1"
+
+    def _spawn(self, index: int) -> None:
+        self._generations[index] += 1
+        if self._generations[index] > 1:
+            # A killed worker can die holding the inbox's read lock; start the new one on a fresh queue.
+            # Jobs still in the old one were failed by _fail_pending.
+            self.inboxes[index].close()
+            self.inboxes[index] = self._mp.Queue()
+        process = self._mp.Process(target=_worker_main, name=f"gateway-worker-{index}", daemon=True,
+                                   args=(index, self.settings, self.inboxes[index], self.outbox))
+        process.start()
+        self.processes[index] = process
+
+    def _ensure_alive(self, index: int) -> int:
+        """Restart worker index if it died; returns its current generation"""
+        with self._spawn_lock:
+            process = self.processes[index]
+            if process is not None and not process.is_alive():
+                logger.warning(f"Worker {index} died (exit code {process.exitcode}); restarting it, "
+                               f"its in-memory sessions are lost")
+                self._fail_pending(index, self._generations[index])
+                self._spawn(index)
+            return self._generations[index]
+
+    def _fail_pending(self, index: int, generation: int) -> None:
+        """Answer every request waiting on a dead worker instead of letting it time out"""
+        with self._pending_lock:
+            lost = [replies for worker, gen, replies in self._pending.values() if (worker, gen) == (index, generation)]
+        for replies in lost:
+            replies.put(('error', (502, 'worker_died', "The worker handling this request exited")))
+
+    def alive_workers(self) -> int:
+        return sum(1 for p in self.processes if p is not None and p.is_alive())
+
+    def _dispatch(self) -> None:
+        """Route worker replies to the waiting request threads, and watch for dead workers"""
+        while True:
+            try:
+                item = self.outbox.get(timeout=self.HEALTH_CHECK_SECONDS)
+            except queue.Empty:
+                for index in range(self.settings.workers):
+                    self._ensure_alive(index)
+                continue
+            if item is None:
+                return
+            request_id, kind, payload = item
+            with self._pending_lock:
+                entry = self._pending.get(request_id)
+            if entry is not None:
+                entry[2].put((kind, payload))
+
+    def submit(self, session_id: Optional[str], model: Optional[str], messages: List[Dict[str, str]],
+               stream: bool) -> Tuple[str, int, queue.Queue]:
+        """Send a request to its worker; returns (request id, worker index, reply queue)"""
+        workers = self.settings.workers
+        worker = session_worker(session_id, workers) if session_id else next(self._round_robin) % workers
+        request_id = uuid.uuid4().hex[:24]
+        replies: queue.Queue = queue.Queue()
+        # Under the spawn lock, so a restart can't swap the inbox between registering and sending
+        with self._spawn_lock:
+            generation = self._ensure_alive(worker)
+            with self._pending_lock:
+                self._pending[request_id] = (worker, generation, replies)
+            self.inboxes[worker].put({'id': request_id, 'session': session_id, 'model': model,
+                                      'messages': messages, 'stream': stream})
+        return request_id, worker, replies
+
+    def forget(self, request_id: str) -> None:
+        with self._pending_lock:
+            self._pending.pop(request_id, None)
+
+    def start(self) -> 'Gateway':
+        """Start the workers and the reply dispatcher; call serve_forever() to accept requests"""
+        for index in range(self.settings.workers):
+            self._spawn(index)
+        self._dispatcher = threading.Thread(target=self._dispatch, name="gateway-dispatch", daemon=True)
+        self._dispatcher.start()
+        return self
+
+    def serve_forever(self) -> None:
+        self.httpd.serve_forever()
+
+    def stop(self) -> None:
+        self.httpd.shutdown()
+        self.httpd.server_close()
+        # Workers first (they finish in-flight jobs), then the dispatcher, then the queues
+        with self._spawn_lock:
+            for inbox in self.inboxes:
+                inbox.put(None)
+            for process in self.processes:
+                if process is not None:
+                    process.join(timeout=5)
+                    if process.is_alive():
+                        process.terminate()
+                        process.join()
+            self.processes = [None] * self.settings.workers
+        if self._dispatcher is not None:
+            self.outbox.put(None)
+            self._dispatcher.join()
+            self._dispatcher = None
+        for q in self.inboxes + [self.outbox]:
+            q.close()
+            q.join_thread()
+
+    def __enter__(self) -> 'Gateway':
+        self.start()
+        threading.Thread(target=self.serve_forever, name="gateway-http", daemon=True).start()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.stop()
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve AIModelManager conversations over an OpenAI-compatible API")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--model", default='1', help="Default model: providers.toml key, provider name or model id")
+    parser.add_argument("--max-sessions", type=int, default=1000, help="Sessions kept per worker")
+    parser.add_argument("--session-ttl", type=float, default=3600.0)
+    parser.add_argument("--max-in-flight", type=int, default=64, help="Concurrent provider calls per worker")
+    parser.add_argument("--persist", action="store_true", help="Keep sessions in the conversation store (CONVERSATION_DB)")
+    args = parser.parse_args()
+
+    load_dotenv()
+    resolve_model(args.model, args.model)
+    settings = ServeSettings(args.model, max(args.workers, 1), args.max_sessions, args.session_ttl,
+                             args.max_in_flight, persist=args.persist)
+    gateway = Gateway(settings, args.host, args.port).start()
+    print(f"Serving on {gateway.base_url} with {settings.workers} workers")
+    try:
+        gateway.serve_forever()
+    except KeyboardInterrupt:
+        gateway.stop()
+
+if __name__ == "__main__":
+    main()
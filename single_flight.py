@@ -0,0 +1,277 @@
+import asyncio
+import copy
+import logging
+import threading
+import weakref
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, Hashable, Iterator, List, Optional, Tuple
+
+'''
+Request coalescing ("single flight") for identical in-flight completions.
+
+When several sessions or batch workers send the same context to the same
+model at the same moment, only the first request goes upstream; the others
+wait for it and get the same answer. Streams are shared too: one upstream
+stream feeds every subscriber, and a subscriber that joins late first gets
+the deltas it missed. Once a call finishes its key is free again, so later
+requests are the response cache's job, not this module's.
+
+Keys come from response_cache.cache_key, so only byte-identical requests to
+the same model are coalesced. SingleFlight serves the threaded managers;
+AsyncSingleFlight serves the async ones and belongs to one event loop.
+'''
+
+logger = logging.getLogger(__name__)
+
+def _fresh(error: BaseException) -> BaseException:
+    """A copy of error for one caller, so attributes a caller sets on it (partial_response) stay its own"""
+    # Built without calling __init__: RoutingError and the SDK errors can't be rebuilt from their args
+    clone = type(error).__new__(type(error))
+    clone.args = error.args
+    clone.__dict__.update(copy.copy(error.__dict__))
+    clone.__cause__, clone.__context__ = error.__cause__, error.__context__
+    return clone.with_traceback(error.__traceback__)
+
+class _Flight:
+    '''State of one shared upstream call'''
+
+    def __init__(self):
+        self.items: List[Any] = []          # streamed items so far, in order
+        self.result: Any = None
+        self.error: Optional[BaseException] = None
+        self.done = False
+        self.abandoned = False              # the upstream call stopped without a result or error
+        self.subscribers = 0
+
+class SingleFlight:
+    """Coalesces identical concurrent calls made from different threads"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls: Dict[Hashable, Tuple[_Flight, threading.Condition]] = {}
+        self._streams: Dict[Hashable, Tuple[_Flight, threading.Condition]] = {}
+        self.coalesced = 0   # calls answered by another caller's upstream call
+
+    def do(self, key: Hashable, fn: Callable[[], Any]) -> Tuple[Any, bool]:
+        """Run fn() once per key at a time; returns (result, shared)
+
+        shared is False for the caller whose fn() actually ran. Exceptions
+        from fn() are raised in every caller waiting on it, each getting its
+        own copy.
+        """
+        with self._lock:
+            entry = self._calls.get(key)
+            leader = entry is None
+            if leader:
+                entry = self._calls[key] = (_Flight(), threading.Condition(self._lock))
+            else:
+                self.coalesced += 1
+        flight, cond = entry
+
+        if leader:
+            try:
+                flight.result = fn()
+            except Exception as e:
+                # Copied before the leader's handlers can annotate e
+                flight.error = _fresh(e)
+                raise
+            except BaseException:
+                # e.g. KeyboardInterrupt in the leader; the waiters run their own call instead
+                flight.abandoned = True
+                raise
+            finally:
+                with cond:
+                    flight.done = True
+                    del self._calls[key]
+                    cond.notify_all()
+            return flight.result, False
+
+        with cond:
+            cond.wait_for(lambda: flight.done)
+        if flight.abandoned:
+            return fn(), False
+        if flight.error is not None:
+            raise _fresh(flight.error)
+        return flight.result, True
+
+    def stream(self, key: Hashable, factory: Callable[[], Iterator]) -> Tuple[Iterator, bool]:
+        """Subscribe to the shared stream for key, starting factory() if none is running
+
+        Returns (items, shared). The upstream iterator runs on a background
+        thread, so a slow subscriber never stalls the others; it is closed
+        early once every subscriber has gone.
+        """
+        with self._lock:
+            entry = self._streams.get(key)
+            shared = entry is not None
+            if shared:
+                self.coalesced += 1
+            else:
+                entry = self._streams[key] = (_Flight(), threading.Condition(self._lock))
+                threading.Thread(target=self._pump, args=(key, entry, factory),
+                                 name="single-flight-stream", daemon=True).start()
+            entry[0].subscribers += 1
+        return self._follow(key, entry), shared
+
+    def _pump(self, key: Hashable, entry: Tuple[_Flight, threading.Condition], factory: Callable[[], Iterator]) -> None:
+        flight, cond = entry
+        iterator = None
+        try:
+            iterator = factory()
+            for item in iterator:
+                with cond:
+                    flight.items.append(item)
+                    cond.notify_all()
+                    if flight.subscribers == 0:
+                        break
+        except Exception as e:
+            flight.error = e
+        finally:
+            if iterator is not None and hasattr(iterator, 'close'):
+                iterator.close()
+            with cond:
+                flight.done = True
+                if self._streams.get(key) is entry:
+                    del self._streams[key]
+                cond.notify_all()
+
+    def _follow(self, key: Hashable, entry: Tuple[_Flight, threading.Condition]) -> Iterator:
+        flight, cond = entry
+        position = 0
+        try:
+            while True:
+                with cond:
+                    cond.wait_for(lambda: position < len(flight.items) or flight.done)
+                    items = flight.items[position:]
+                    done = flight.done
+                position += len(items)
+                yield from items
+                if done:
+                    if flight.error is not None:
+                        raise _fresh(flight.error)
+                    return
+        finally:
+            with cond:
+                flight.subscribers -= 1
+                if flight.subscribers == 0 and self._streams.get(key) is entry:
+                    # Nobody is listening: let the pump stop and new requests start afresh
+                    del self._streams[key]
+
+class AsyncSingleFlight:
+    """Coalesces identical concurrent calls on one event loop"""
+
+    def __init__(self):
+        self._calls: Dict[Hashable, Tuple[asyncio.Task, _Flight]] = {}
+        self._streams: Dict[Hashable, Tuple[asyncio.Task, _Flight, List[asyncio.Event]]] = {}
+        self.coalesced = 0
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable]) -> Tuple[Any, bool]:
+        """Await fn() once per key at a time; returns (result, shared)
+
+        The call runs as its own task, so a caller being cancelled (a client
+        disconnecting) doesn't fail the others; it is cancelled only when
+        every caller has gone.
+        """
+        entry = self._calls.get(key)
+        shared = entry is not None
+        if shared:
+            self.coalesced += 1
+        else:
+            task = asyncio.ensure_future(fn())
+            entry = self._calls[key] = (task, _Flight())
+            task.add_done_callback(lambda _, key=key, entry=entry: self._calls.pop(key, None)
+                                   if self._calls.get(key) is entry else None)
+        task, flight = entry
+        flight.subscribers += 1
+        try:
+            return await asyncio.shield(task), shared
+        except asyncio.CancelledError:
+            if flight.subscribers == 1:
+                task.cancel()
+            raise
+        except Exception as e:
+            # Every caller, the one that started the task included, gets its own copy
+            raise _fresh(e) from e.__cause__
+        finally:
+            flight.subscribers -= 1
+
+    def stream(self, key: Hashable, factory: Callable[[], AsyncIterator]) -> Tuple[AsyncIterator, bool]:
+        """Subscribe to the shared stream for key, starting factory() if none is running
+
+        Returns (items, shared); call it from the loop's thread. The upstream
+        iterator runs as a separate task and is cancelled once every
+        subscriber has gone.
+        """
+        entry = self._streams.get(key)
+        shared = entry is not None
+        if shared:
+            self.coalesced += 1
+        else:
+            flight, wakeups = _Flight(), [asyncio.Event()]
+            task = asyncio.ensure_future(self._pump(key, flight, wakeups, factory))
+            entry = self._streams[key] = (task, flight, wakeups)
+        entry[1].subscribers += 1
+        return self._follow(key, entry), shared
+
+    async def _pump(self, key: Hashable, flight: _Flight, wakeups: List[asyncio.Event],
+                    factory: Callable[[], AsyncIterator]) -> None:
+        def wake():
+            # Every waiter holds the current event; replace it so the next item needs a new set()
+            wakeups.append(asyncio.Event())
+            wakeups.pop(0).set()
+
+        iterator = factory()
+        try:
+            async for item in iterator:
+                flight.items.append(item)
+                wake()
+        except asyncio.CancelledError:
+            flight.abandoned = True
+            raise
+        except Exception as e:
+            flight.error = e
+        finally:
+            if hasattr(iterator, 'aclose'):
+                await iterator.aclose()
+            flight.done = True
+            entry = self._streams.get(key)
+            if entry is not None and entry[1] is flight:
+                del self._streams[key]
+            wake()
+
+    async def _follow(self, key: Hashable, entry) -> AsyncIterator:
+        task, flight, wakeups = entry
+        position = 0
+        try:
+            while True:
+                while position < len(flight.items):
+                    item = flight.items[position]
+                    position += 1
+                    yield item
+                if flight.done:
+                    if flight.error is not None:
+                        raise _fresh(flight.error)
+                    if flight.abandoned:
+                        raise RuntimeError("Shared stream was cancelled before it finished")
+                    return
+                await wakeups[0].wait()
+        finally:
+            flight.subscribers -= 1
+            if flight.subscribers == 0 and not task.done():
+                if self._streams.get(key) is entry:
+                    del self._streams[key]
+                task.cancel()
+
+_shared = SingleFlight()
+_async_shared: 'weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, AsyncSingleFlight]' = weakref.WeakKeyDictionary()
+
+def shared_flight() -> SingleFlight:
+    """Process-wide group for the threaded managers"""
+    return _shared
+
+def shared_async_flight() -> AsyncSingleFlight:
+    """The group for the running event loop; asyncio tasks can't be awaited across loops"""
+    loop = asyncio.get_running_loop()
+    group = _async_shared.get(loop)
+    if group is None:
+        group = _async_shared[loop] = AsyncSingleFlight()
+    return group
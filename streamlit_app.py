@@ -1,7 +1,13 @@
 import streamlit as st
 import time
 from typing import Optional
-from mainV02 import AIModelManager, load_dotenv
+from mainV02 import AIModelManager, configured_fallbacks, load_dotenv
+from routing import RoutingError
+from response_cache import shared_cache
+from semantic_cache import shared_semantic_cache
+from prompt_builder import system_prompt
+from warmup import start_warmup, warmup_status
+from conversation_store import default_store
 import logging
 
 # Configure page
@@ -12,8 +18,21 @@ st.set_page_config(
     initial_sidebar_state="expanded"
 )
 
-# Load environment variables
-load_dotenv()
+@st.cache_resource(show_spinner=False)
+def init_environment():
+    """Load environment variables once per server process instead of on every rerun"""
+    load_dotenv()
+    return True
+
+@st.cache_resource(show_spinner=False)
+def shared_resources():
+    """Response caches and conversation store shared by every browser session
+
+    The semantic cache is None unless SEMANTIC_CACHE=1.
+    """
+    return shared_cache(), shared_semantic_cache(), default_store()
+
+init_environment()
 
 # Custom CSS for modern styling
 st.markdown("""
@@ -92,18 +111,43 @@ st.markdown("""
 </style>
 """, unsafe_allow_html=True)
 
+# Messages per history page; only the newest page is shown until more are requested
+HISTORY_PAGE_SIZE = 30
+
 def initialize_session_state():
     """Initialize session state variables"""
-    if 'messages' not in st.session_state:
-        st.session_state.messages = []
     if 'model_manager' not in st.session_state:
         st.session_state.model_manager = None
     if 'selected_model' not in st.session_state:
         st.session_state.selected_model = None
     if 'system_prompt_set' not in st.session_state:
         st.session_state.system_prompt_set = False
+    if 'history_pages' not in st.session_state:
+        st.session_state.history_pages = 1
     if 'chat_started' not in st.session_state:
         st.session_state.chat_started = False
+        resume_session()
+
+def resume_session():
+    """Reopen the conversation named in the URL, e.g. after a reload or server restart"""
+    session_id = st.query_params.get("session")
+    if not session_id:
+        return
+    response_cache, semantic_cache, store = shared_resources()
+    session = store.session(session_id)
+    config = next((c for c in AIModelManager.MODELS.values() if session and c.name == session['model']), None)
+    if config is None:
+        return
+    try:
+        manager = AIModelManager(config, cache=response_cache, fallbacks=configured_fallbacks(config),
+                                 store=store, session_id=session_id, semantic_cache=semantic_cache)
+    except Exception as e:
+        st.warning(f"Could not resume previous chat: {e}")
+        return
+    st.session_state.model_manager = manager
+    st.session_state.selected_model = config.name
+    st.session_state.system_prompt_set = True
+    st.session_state.chat_started = True
 
 def display_model_info(config):
     """Display model information in a card format"""
@@ -133,6 +177,12 @@ def setup_model_selection():
     selected_key = model_options[selected_display]
     selected_config = AIModelManager.MODELS[selected_key]
     
+    # Open the connection and check the key in the background while the user picks a personality
+    start_warmup([selected_config])
+    status = warmup_status(selected_config.name)
+    if status is not None and status.key_valid is False:
+        st.sidebar.warning(f"{selected_config.name}: {status.error}")
+    
     # Display selected model info
     display_model_info(selected_config)
     
@@ -142,9 +192,10 @@ def setup_system_prompt():
     """Handle system prompt setup"""
     st.sidebar.markdown("## 🎭 AI Personality")
     
+    # Built by prompt_builder so equivalent choices give byte-identical prompts (and cached prefixes)
     prompt_options = {
-        "🔥 Snarky": "You are a very snarky helpfull assistant.",
-        "😊 Polite": "You are a very polite helpfull assistant.",
+        "🔥 Snarky": system_prompt('snarky'),
+        "😊 Polite": system_prompt('polite'),
         "🎨 Custom": "custom"
     }
     
@@ -159,8 +210,8 @@ def setup_system_prompt():
             "Enter custom behavior:",
             placeholder="e.g., helpful, creative, analytical"
         )
-        if custom_behavior:
-            return f"You are a very {custom_behavior.strip()} helpfull assistant."
+        if any(c.isalnum() for c in custom_behavior):
+            return system_prompt(custom_behavior)
         else:
             st.sidebar.warning("Please enter a custom behavior")
             return None
@@ -168,38 +219,134 @@ def setup_system_prompt():
         return prompt_options[selected_behavior]
 
 def create_model_manager(config, system_prompt):
-    """Create and configure model manager"""
+    """Create and configure model manager
+
+    The manager lives for the browser session: starting a new chat with the
+    same model reuses it (and its pooled client) and only resets the context.
+    """
+    manager = st.session_state.model_manager
+    if manager is not None and manager.config is config:
+        manager.reset_context(system_prompt)
+        return manager
     try:
-        manager = AIModelManager(config)
-        # Set system prompt manually
-        manager.context = [{'role': 'system', 'content': system_prompt}]
+        # Demo traffic replays the same prompts, so share one response cache
+        response_cache, semantic_cache, store = shared_resources()
+        manager = AIModelManager(config, cache=response_cache, fallbacks=configured_fallbacks(config),
+                                 store=store, semantic_cache=semantic_cache)
+        manager.reset_context(system_prompt)
+        # Keep the session id in the URL so the chat can be resumed later
+        st.query_params["session"] = manager.session_id
         return manager
     except Exception as e:
         st.error(f"Error creating model manager: {e}")
         return None
 
-def display_chat_message(role, content, avatar=None):
-    """Display a chat message with styling"""
+def build_message_html(role, content):
+    """HTML for one chat message with styling"""
     if role == "user":
-        st.markdown(f"""
-        <div class="chat-message user-message">
-            <strong>👤 You:</strong><br>
-            {content}
-        </div>
-        """, unsafe_allow_html=True)
+        return f'''<div class="chat-message user-message">
+<strong>👤 You:</strong><br>
+{content}
+</div>'''
     elif role == "assistant":
-        st.markdown(f"""
-        <div class="chat-message ai-message">
-            <strong>🤖 AI:</strong><br>
-            {content}
-        </div>
-        """, unsafe_allow_html=True)
+        return f'''<div class="chat-message ai-message">
+<strong>🤖 AI:</strong><br>
+{content}
+</div>'''
     elif role == "system":
-        st.markdown(f"""
-        <div class="chat-message system-message">
-            <strong>⚙️ System:</strong> {content}
-        </div>
-        """, unsafe_allow_html=True)
+        return f'''<div class="chat-message system-message">
+<strong>⚙️ System:</strong> {content}
+</div>'''
+    return ""
+
+# Finished messages never change, so their HTML is built once per process
+cached_message_html = st.cache_data(max_entries=5000, show_spinner=False)(build_message_html)
+
+def display_chat_message(role, content, avatar=None, container=None, cached=True):
+    """Display a chat message with styling"""
+    # Render into the given placeholder/container, or the page itself.
+    # Partial streamed text is rendered uncached so it doesn't flood the cache.
+    target = container if container is not None else st
+    html = cached_message_html(role, content) if cached else build_message_html(role, content)
+    if html:
+        target.markdown(html, unsafe_allow_html=True)
+
+def display_history(manager):
+    """Render the latest page of messages individually and earlier pages as one block"""
+    limit = HISTORY_PAGE_SIZE * st.session_state.history_pages
+    # Read one extra row to know whether there is anything older
+    messages = manager.store.recent(manager.session_id, limit=limit + 1)
+    if len(messages) > limit:
+        messages = messages[1:]
+        if st.button("⬆️ Load earlier messages"):
+            st.session_state.history_pages += 1
+            st.rerun()
+    
+    older, latest = messages[:-HISTORY_PAGE_SIZE], messages[-HISTORY_PAGE_SIZE:]
+    if older:
+        # One element for all earlier pages keeps the page's element count flat
+        st.markdown("\n".join(cached_message_html(m["role"], m["content"]) for m in older),
+                    unsafe_allow_html=True)
+    for message in latest:
+        display_chat_message(message["role"], message["content"])
+
+def stream_reply(manager, user_input, on_update):
+    """Stream the reply to user_input, calling on_update with the text so far
+
+    Returns the full reply. Raises RoutingError when the providers failed;
+    any text streamed before the failure is on its partial_response.
+    """
+    response = ""
+    try:
+        for delta in manager.stream_response(user_input):
+            response += delta
+            on_update(response)
+    except RoutingError as e:
+        e.partial_response = response
+        raise
+    return response
+
+def display_chat_stats(manager):
+    """Show message counts and call metrics for the current chat"""
+    user_messages = manager.store.count(manager.session_id, 'user') if manager else 0
+    if not user_messages:
+        return
+    st.markdown("## 📊 Chat Stats")
+    ai_messages = manager.store.count(manager.session_id, 'assistant')
+    
+    col1, col2 = st.columns(2)
+    with col1:
+        st.metric("Your Messages", user_messages)
+    with col2:
+        st.metric("AI Responses", ai_messages)
+    
+    display_call_metrics(manager)
+
+def display_call_metrics(manager):
+    """Show latency and token usage of the session's completion calls"""
+    if not manager or not manager.call_metrics:
+        return
+    calls = list(manager.call_metrics)
+    last = calls[-1]
+    
+    col1, col2 = st.columns(2)
+    with col1:
+        st.metric("First Token", f"{last.ttft:.2f}s" if last.ttft is not None else "—")
+        st.metric("Tokens/sec", f"{last.tokens_per_sec:.0f}" if last.tokens_per_sec else "—")
+    with col2:
+        st.metric("Latency", f"{last.latency:.2f}s")
+        st.metric("Cache Hits", sum(1 for m in calls if m.cache_hit))
+    
+    prompt_tokens = sum(m.prompt_tokens or 0 for m in calls)
+    completion_tokens = sum(m.completion_tokens or 0 for m in calls)
+    cached_tokens = sum(m.cached_prompt_tokens or 0 for m in calls)
+    retries = sum(m.retries for m in calls)
+    coalesced = sum(1 for m in calls if m.coalesced)
+    st.caption(f"Tokens: {prompt_tokens} prompt ({cached_tokens} cached by the provider) / "
+               f"{completion_tokens} completion · Retries: {retries} · Shared with identical requests: {coalesced}")
+    if manager.semantic_cache is not None:
+        stats = manager.semantic_cache.stats()
+        st.caption(f"Semantic cache: {stats['hit_rate']:.0%} hit rate · {stats['entries']} answers stored")
 
 def main():
     """Main Streamlit application"""
@@ -237,30 +384,21 @@ def main():
                     st.session_state.selected_model = selected_config.name
                     st.session_state.system_prompt_set = True
                     st.session_state.chat_started = True
-                    st.session_state.messages = []
+                    st.session_state.history_pages = 1
                     st.rerun()
         
         # Clear chat button
         if st.session_state.chat_started:
             if st.button("🗑️ Clear Chat", use_container_width=True):
-                st.session_state.messages = []
-                if st.session_state.model_manager:
+                manager = st.session_state.model_manager
+                if manager:
                     # Reset context with system prompt
-                    system_msg = st.session_state.model_manager.context[0]
-                    st.session_state.model_manager.context = [system_msg]
+                    manager.reset_context(manager.context[0]['content'])
+                st.session_state.history_pages = 1
                 st.rerun()
         
-        # Chat statistics
-        if st.session_state.messages:
-            st.markdown("## 📊 Chat Stats")
-            user_messages = len([m for m in st.session_state.messages if m["role"] == "user"])
-            ai_messages = len([m for m in st.session_state.messages if m["role"] == "assistant"])
-            
-            col1, col2 = st.columns(2)
-            with col1:
-                st.metric("Your Messages", user_messages)
-            with col2:
-                st.metric("AI Responses", ai_messages)
+        # Chat statistics are filled in at the end of the run, after any new reply
+        stats_area = st.container()
     
     # Main chat interface
     if not st.session_state.chat_started:
@@ -287,27 +425,35 @@ def main():
         chat_container = st.container()
         
         with chat_container:
-            # Display chat history
-            for message in st.session_state.messages:
-                display_chat_message(message["role"], message["content"])
+            # Display chat history, read lazily from the conversation store
+            display_history(st.session_state.model_manager)
         
         # Chat input
         user_input = st.chat_input("Type your message here...", key="chat_input")
         
         if user_input:
-            # Add user message to chat
-            st.session_state.messages.append({"role": "user", "content": user_input})
+            # Show the user message; the manager persists it with the reply
+            with chat_container:
+                display_chat_message("user", user_input)
+                placeholder = st.empty()
             
-            # Get AI response
-            with st.spinner("🤔 AI is thinking..."):
-                response = st.session_state.model_manager.get_response(user_input)
-            
-            if response and not response.startswith("Error:"):
-                st.session_state.messages.append({"role": "assistant", "content": response})
-            else:
-                st.error(f"Failed to get response: {response}")
-            
-            st.rerun()
+            # Stream AI response into the placeholder as tokens arrive
+            placeholder.markdown("🤔 AI is thinking...")
+            try:
+                response = stream_reply(
+                    st.session_state.model_manager, user_input,
+                    lambda text: display_chat_message("assistant", text, container=placeholder, cached=False)
+                )
+                # The reply is already on the page, so there is no need to rerun
+                # the whole script (and re-render the history) just to show it
+                display_chat_message("assistant", response, container=placeholder)
+            except RoutingError as e:
+                st.error(f"Failed to get response: {e}")
+                for attempt in e.attempts:
+                    st.caption(f"• {attempt}")
+        
+        with stats_area:
+            display_chat_stats(st.session_state.model_manager)
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -0,0 +1,63 @@
+import io
+
+import pytest
+
+Image = pytest.importorskip("PIL.Image")
+
+import image_preprocessing
+from image_preprocessing import MAX_SIDE, prepare_image
+
+
+@pytest.fixture(autouse=True)
+def _empty_prepared_cache():
+    image_preprocessing._prepared.clear()
+    yield
+    image_preprocessing._prepared.clear()
+
+
+def _noisy_jpeg(path, size, quality, exif=None):
+    """A JPEG whose raw bytes are hard to beat by re-encoding at a higher quality"""
+    image = Image.effect_noise(size, 64).convert('RGB')
+    kwargs = {'exif': exif} if exif is not None else {}
+    image.save(path, format='JPEG', quality=quality, **kwargs)
+
+
+def test_large_exif_jpeg_is_resized_and_stripped(tmp_path):
+    exif = Image.Exif()
+    exif[0x010F] = "CameraMaker"                 # Make
+    exif[0x8825] = {0x0001: 'N', 0x0002: (1.0, 2.0, 3.0)}  # GPS IFD
+    path = tmp_path / "large.jpg"
+    _noisy_jpeg(path, (MAX_SIDE + 800, 1200), quality=20, exif=exif)
+    raw_size = path.stat().st_size
+
+    prepared = prepare_image(str(path))
+
+    # Re-encoding at quality 90 is bigger than the quality-20 original, but resize and strip still win
+    assert max(prepared.size) <= MAX_SIDE
+    assert prepared.data != path.read_bytes()
+    with Image.open(io.BytesIO(prepared.data)) as result:
+        assert max(result.size) <= MAX_SIDE
+        assert not result.getexif()
+        assert 'exif' not in result.info
+    assert prepared.original_size == raw_size
+
+
+def test_small_clean_jpeg_is_sent_unchanged(tmp_path):
+    path = tmp_path / "small.jpg"
+    _noisy_jpeg(path, (400, 300), quality=20)
+
+    prepared = prepare_image(str(path))
+
+    assert prepared.data == path.read_bytes()
+
+
+def test_small_jpeg_with_exif_is_stripped(tmp_path):
+    exif = Image.Exif()
+    exif[0x010F] = "CameraMaker"
+    path = tmp_path / "tagged.jpg"
+    _noisy_jpeg(path, (400, 300), quality=20, exif=exif)
+
+    prepared = prepare_image(str(path))
+
+    with Image.open(io.BytesIO(prepared.data)) as result:
+        assert not result.getexif()
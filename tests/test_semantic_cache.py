@@ -0,0 +1,98 @@
+import os
+import sys
+from types import SimpleNamespace
+
+import pytest
+
+pytest.importorskip("numpy")
+
+from semantic_cache import SemanticCache
+
+CONFIG = SimpleNamespace(base_url="https://api.example.com/v1", model_name="example-model")
+SYSTEM = {'role': 'system', 'content': "You are a very polite helpful assistant."}
+FOLLOW_UP = "Can you explain that in more detail?"
+
+
+def _conversation(question, answer):
+    return [
+        SYSTEM,
+        {'role': 'user', 'content': question},
+        {'role': 'assistant', 'content': answer},
+        {'role': 'user', 'content': FOLLOW_UP},
+    ]
+
+
+def test_follow_up_is_not_shared_between_conversations():
+    cache = SemanticCache()
+    sourdough = _conversation("How do I keep a sourdough starter alive?", "Feed it flour and water daily.")
+    kubernetes = _conversation("What does a Kubernetes operator do?", "It automates running an application.")
+
+    cache.store(CONFIG, sourdough, "Sourdough starters are colonies of yeast and bacteria...")
+
+    assert cache.lookup(CONFIG, kubernetes) is None
+    assert cache.lookup(CONFIG, sourdough) == "Sourdough starters are colonies of yeast and bacteria..."
+
+
+def test_reworded_first_question_hits():
+    cache = SemanticCache()
+    cache.store(CONFIG, [SYSTEM, {'role': 'user', 'content': "What is the capital city of France?"}], "Paris.")
+
+    assert cache.lookup(CONFIG, [SYSTEM, {'role': 'user', 'content': "what is the capital city of France"}]) == "Paris."
+
+
+@pytest.mark.parametrize("stored, answer, asked", [
+    ("Convert 10 miles to km", "16.09 km", "Convert 20 miles to km"),
+    ("What is 2 + 2", "4", "What is 3 + 2"),
+    ("Should I take ibuprofen", "yes", "Should I not take ibuprofen"),
+    ("Is it safe to swim here", "yes", "Isn't it safe to swim here"),
+])
+def test_changed_numbers_or_negations_miss(stored, answer, asked):
+    cache = SemanticCache()
+    cache.store(CONFIG, [SYSTEM, {'role': 'user', 'content': stored}], answer)
+
+    assert cache.lookup(CONFIG, [SYSTEM, {'role': 'user', 'content': asked}]) is None
+    assert cache.lookup(CONFIG, [SYSTEM, {'role': 'user', 'content': stored + "?"}]) == answer
+
+
+def _topic(i):
+    # Distinct words rather than numbers, which would put every question in its own scope
+    return "".join(chr(ord('a') + int(d)) for d in str(i))
+
+
+def test_approximate_index_only_searches_the_scope():
+    pytest.importorskip("hnswlib")
+    cache = SemanticCache(max_entries=400, ann_threshold=50)
+    other = {'role': 'system', 'content': "You answer in French."}
+    for i in range(150):
+        cache.store(CONFIG, [other, {'role': 'user', 'content': f"What is the capital city of {_topic(i)}?"}], "non")
+    for i in range(60):
+        cache.store(CONFIG, [SYSTEM, {'role': 'user', 'content': f"Describe the history of {_topic(i)} in detail"}], "history")
+    cache.store(CONFIG, [SYSTEM, {'role': 'user', 'content': "What is the capital city of France?"}], "Paris.")
+
+    assert len(cache._ann) == 2
+    assert cache.lookup(CONFIG, [SYSTEM, {'role': 'user', 'content': "what is the capital city of France"}]) == "Paris."
+
+
+def test_released_slots_leave_the_approximate_index():
+    pytest.importorskip("hnswlib")
+    cache = SemanticCache(max_entries=60, ann_threshold=20)
+    other = {'role': 'system', 'content': "You answer in French."}
+    for i in range(40):
+        cache.store(CONFIG, [SYSTEM, {'role': 'user', 'content': f"Describe the history of {_topic(i)} in detail"}], "history")
+    # Evicts the oldest half of those to make room
+    for i in range(40):
+        cache.store(CONFIG, [other, {'role': 'user', 'content': f"Describe the food of {_topic(i)} in detail"}], "cuisine")
+
+    scope = int(cache._scopes[39])   # the newest history question is still cached
+    live = {s for s in range(60) if cache._occupied[s] and int(cache._scopes[s]) == scope}
+    assert len(live) == 20
+    labels, _ = cache._ann[scope].knn_query(cache._vectors[39], k=len(live))
+    assert set(labels[0].tolist()) == live
+
+
+def test_import_does_not_load_numpy():
+    import subprocess
+    code = "import sys, semantic_cache; print('numpy' in sys.modules)"
+    result = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True,
+                            cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    assert result.stdout.strip() == "False"
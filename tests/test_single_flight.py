@@ -0,0 +1,34 @@
+import asyncio
+
+from routing import CompletionError, RoutingError
+from single_flight import AsyncSingleFlight, _fresh
+
+
+def _routing_error():
+    return RoutingError([CompletionError("groq", "rate limited", status_code=429, retryable=True)])
+
+
+def test_fresh_copy_keeps_message_and_attempts():
+    error = _routing_error()
+    clone = _fresh(error)
+
+    assert clone is not error
+    assert str(clone) == str(error)
+    assert clone.attempts == error.attempts
+    clone.partial_response = "mine"
+    assert error.partial_response == ""
+
+
+def test_async_callers_get_their_own_intact_error():
+    async def run():
+        flight = AsyncSingleFlight()
+
+        async def fail():
+            await asyncio.sleep(0.01)
+            raise _routing_error()
+
+        return await asyncio.gather(*(flight.do('key', fail) for _ in range(3)), return_exceptions=True)
+
+    errors = asyncio.run(run())
+    assert len({id(e) for e in errors}) == 3
+    assert {str(e) for e in errors} == {str(_routing_error())}
@@ -0,0 +1,123 @@
+import logging
+import os
+import socket
+import threading
+import time
+from dataclasses import dataclass
+from typing import Dict, Iterable, List, Optional
+from urllib.parse import urlparse
+
+from client_registry import get_client
+
+'''
+Background warmup of provider connections.
+
+Without it the first message of a session pays DNS, TCP and TLS setup on top
+of the model's own latency. start_warmup() runs, per provider and in daemon
+threads, a DNS lookup and one cheap authenticated request (GET /models)
+through the shared client from client_registry. That leaves a keep-alive
+connection in the pool the first real request will use, and tells us
+whether the API key works, without blocking the caller.
+
+Set WARMUP=0 to turn it off.
+'''
+
+logger = logging.getLogger(__name__)
+
+# Re-warming sooner than this is skipped; kept under the pool's 60s keep-alive expiry
+REWARM_AFTER = 45.0
+
+@dataclass
+class WarmupResult:
+    '''Outcome of warming one provider'''
+    provider: str
+    ok: bool                          # a connection to the provider is open and pooled
+    key_valid: Optional[bool] = None  # None when the provider's answer didn't tell
+    dns_seconds: Optional[float] = None
+    request_seconds: Optional[float] = None
+    error: Optional[str] = None
+    finished_at: float = 0.0          # time.monotonic()
+
+def warm_provider(config, timeout: float = 10.0) -> WarmupResult:
+    """Resolve, connect and validate the key for one provider; never raises"""
+    import openai
+
+    api_key = os.getenv(config.api_key_env)
+    if not api_key:
+        return WarmupResult(config.name, False, False, error=f"{config.api_key_env} not set",
+                            finished_at=time.monotonic())
+    result = WarmupResult(config.name, False)
+    try:
+        url = urlparse(config.base_url)
+        start = time.perf_counter()
+        socket.getaddrinfo(url.hostname, url.port or (443 if url.scheme == 'https' else 80),
+                           type=socket.SOCK_STREAM)
+        result.dns_seconds = time.perf_counter() - start
+
+        # with_options shares the registry client's connection pool
+        client = get_client(config.base_url, api_key).with_options(max_retries=0, timeout=timeout)
+        start = time.perf_counter()
+        try:
+            client.models.list()
+            result.key_valid = True
+        except (openai.AuthenticationError, openai.PermissionDeniedError) as e:
+            result.key_valid = False
+            result.error = f"API key rejected: {e.message}"
+        except openai.APIStatusError as e:
+            # Some providers don't serve /models; the connection is still warm
+            result.error = f"/models returned {e.status_code}"
+        result.request_seconds = time.perf_counter() - start
+        result.ok = True
+    except Exception as e:
+        result.error = str(e)
+    result.finished_at = time.monotonic()
+    return result
+
+_results: Dict[str, WarmupResult] = {}
+_running: Dict[str, threading.Thread] = {}
+_lock = threading.Lock()
+
+def _run(config, timeout: float) -> None:
+    result = warm_provider(config, timeout)
+    with _lock:
+        _results[config.name] = result
+        _running.pop(config.name, None)
+    if result.key_valid is False:
+        logger.warning(f"Warmup: {config.name}: {result.error}")
+    elif result.ok:
+        logger.debug(f"Warmup: {config.name} ready (dns {result.dns_seconds * 1000:.0f} ms, "
+                    f"first request {result.request_seconds * 1000:.0f} ms)")
+    else:
+        logger.warning(f"Warmup: {config.name} unreachable: {result.error}")
+
+def enabled() -> bool:
+    return os.getenv('WARMUP', '1').lower() not in ('0', 'false', 'no')
+
+def start_warmup(configs: Iterable, timeout: float = 10.0) -> List[threading.Thread]:
+    """Warm each provider in the background; returns the threads started (possibly none)
+
+    Providers that are already warming, or finished warming less than
+    REWARM_AFTER seconds ago, are skipped, so this is cheap to call on every
+    Streamlit rerun.
+    """
+    if not enabled():
+        return []
+    started = []
+    now = time.monotonic()
+    with _lock:
+        for config in configs:
+            previous = _results.get(config.name)
+            if config.name in _running or (previous is not None and now - previous.finished_at < REWARM_AFTER):
+                continue
+            thread = threading.Thread(target=_run, args=(config, timeout),
+                                      name=f"warmup-{config.name}", daemon=True)
+            _running[config.name] = thread
+            started.append(thread)
+    for thread in started:
+        thread.start()
+    return started
+
+def warmup_status(provider: str) -> Optional[WarmupResult]:
+    """The latest finished warmup for a provider, or None if none has finished"""
+    with _lock:
+        return _results.get(provider)